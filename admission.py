@@ -0,0 +1,180 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+
+from config import settings
+
+class AdmissionRejected(Exception):
+    """执行请求被拒绝（排队已满或排队超时）"""
+    
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+class ConcurrencyGate:
+    """
+    并发闸门：最多limit个同时执行，其余请求在有界队列中按先后顺序等待
+    释放时直接把名额交给队首的等待者，避免新请求插队
+    """
+    
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.rejected = 0
+        self.timed_out = 0
+    
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+    
+    @property
+    def idle(self) -> bool:
+        return self.active == 0 and not self._waiters
+    
+    async def acquire(self, timeout: Optional[float], full_status: int, label: str):
+        """获取执行名额；limit<=0表示不限制，timeout为空表示一直等待"""
+        if self.limit <= 0 or (self.active < self.limit and not self._waiters):
+            self.active += 1
+            return
+        if timeout is not None and len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected(full_status, f"{label}并发已满，请稍后重试")
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # 名额已经交给了本请求，转交给下一个等待者
+                self.release()
+            else:
+                waiter.cancel()
+                self._remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise AdmissionRejected(503, f"{label}排队超时，请稍后重试")
+            raise
+    
+    def release(self):
+        """释放名额：有等待者时直接交给队首"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+    
+    def _remove(self, waiter: asyncio.Future):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out
+        }
+
+class AdmissionController:
+    """
+    执行准入控制：按API定义和全局两级限制并发
+    在启动任何进程或请求之前获取名额，排队已满时快速返回429/503
+    """
+    
+    def __init__(self, global_limit: int, global_queue: int, default_queue: int,
+                 default_timeout: float):
+        self.default_queue = default_queue
+        self.default_timeout = default_timeout
+        self._global = ConcurrencyGate(global_limit, global_queue)
+        self._gates: Dict[int, ConcurrencyGate] = {}
+    
+    def _gate(self, api_def) -> ConcurrencyGate:
+        gate = self._gates.get(api_def.id)
+        if gate is None:
+            gate = self._gates[api_def.id] = ConcurrencyGate(0, 0)
+        # 定义修改后缓存快照会更新，这里同步最新的限制
+        gate.limit = api_def.max_concurrency or 0
+        gate.max_queue = api_def.max_queue if api_def.max_queue is not None else self.default_queue
+        return gate
+    
+    def _queue_timeout(self, api_def) -> float:
+        return api_def.queue_timeout if api_def.queue_timeout else self.default_timeout
+    
+    async def acquire(self, api_def, wait: bool = False) -> "AdmissionTicket":
+        """
+        获取执行名额，返回需要释放的凭证
+        wait=True时不限制排队长度和等待时间（用于已排队的异步任务）
+        """
+        timeout = None if wait else self._queue_timeout(api_def)
+        loop = asyncio.get_running_loop()
+        # 两级排队共用一个截止时间，总等待时间不超过排队超时
+        deadline = None if timeout is None else loop.time() + timeout
+        gate = self._gate(api_def)
+        await gate.acquire(timeout, 429, "该API")
+        try:
+            remaining = None if deadline is None else max(deadline - loop.time(), 0)
+            await self._global.acquire(remaining, 503, "服务")
+        except BaseException:
+            self._release_gate(api_def.id, gate)
+            raise
+        return AdmissionTicket(self, api_def.id, gate)
+    
+    @asynccontextmanager
+    async def slot(self, api_def, wait: bool = False):
+        """在名额内执行"""
+        ticket = await self.acquire(api_def, wait=wait)
+        try:
+            yield
+        finally:
+            ticket.release()
+    
+    def _release_gate(self, definition_id: int, gate: ConcurrencyGate):
+        gate.release()
+        # 空闲的闸门不再保留，避免定义删除后残留
+        if gate.idle and self._gates.get(definition_id) is gate:
+            del self._gates[definition_id]
+    
+    def stats(self) -> Dict[str, Any]:
+        """准入统计信息"""
+        return {
+            "global": self._global.stats(),
+            "definitions": {
+                definition_id: gate.stats() for definition_id, gate in self._gates.items()
+            }
+        }
+
+class AdmissionTicket:
+    """已获取的执行名额，release可重复调用"""
+    
+    __slots__ = ("_controller", "_definition_id", "_gate", "_released")
+    
+    def __init__(self, controller: AdmissionController, definition_id: int, gate: ConcurrencyGate):
+        self._controller = controller
+        self._definition_id = definition_id
+        self._gate = gate
+        self._released = False
+    
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._controller._global.release()
+        self._controller._release_gate(self._definition_id, self._gate)
+
+# 全局准入控制器
+admission = AdmissionController(
+    global_limit=settings.GLOBAL_MAX_CONCURRENCY,
+    global_queue=settings.GLOBAL_MAX_QUEUE,
+    default_queue=settings.ADMISSION_MAX_QUEUE,
+    default_timeout=settings.ADMISSION_QUEUE_TIMEOUT
+)
\ No newline at end of file
@@ -7,6 +7,7 @@ from typing import Optional
 import secrets
 
 from config import settings
+from session_store import session_store
 
 # 密码加密
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -22,9 +23,6 @@ DEFAULT_ADMIN = {
     "email": "admin@api-system.com"
 }
 
-# Session存储（生产环境建议使用Redis）
-active_sessions = {}
-
 class AuthManager:
     @staticmethod
     def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -78,57 +76,37 @@ class AuthManager:
         return False
     
     @staticmethod
-    def create_session(username: str, request: Request) -> str:
+    async def create_session(username: str, request: Request) -> str:
         """创建会话"""
         session_id = secrets.token_urlsafe(32)
+        now = datetime.utcnow()
         session_data = {
             "username": username,
-            "created_at": datetime.utcnow(),
-            "last_activity": datetime.utcnow(),
+            "created_at": now,
+            "last_activity": now,
             "ip_address": request.client.host if request.client else "unknown",
-            "user_agent": request.headers.get("user-agent", "unknown")
+            "user_agent": request.headers.get("user-agent", "unknown")[:500]
         }
-        active_sessions[session_id] = session_data
+        await session_store.create(session_id, session_data)
         return session_id
     
     @staticmethod
-    def validate_session(session_id: str, request: Request) -> dict:
-        """验证会话"""
-        if session_id not in active_sessions:
-            raise HTTPException(status_code=401, detail="会话不存在，请重新登录")
-        
-        session = active_sessions[session_id]
-        now = datetime.utcnow()
-        
-        # 检查会话是否过期（15分钟）
-        if now - session["last_activity"] > timedelta(minutes=15):
-            del active_sessions[session_id]
-            raise HTTPException(status_code=401, detail="会话已过期，请重新登录")
-        
-        # 更新最后活动时间
-        session["last_activity"] = now
-        active_sessions[session_id] = session
-        
+    async def validate_session(session_id: str, request: Request) -> dict:
+        """验证会话并更新最后活动时间（超过SESSION_TTL_MINUTES没有活动的会话已过期）"""
+        session = await session_store.touch(session_id)
+        if session is None:
+            raise HTTPException(status_code=401, detail="会话不存在或已过期，请重新登录")
         return session
     
     @staticmethod
-    def logout_session(session_id: str):
+    async def logout_session(session_id: str):
         """登出会话"""
-        if session_id in active_sessions:
-            del active_sessions[session_id]
+        await session_store.delete(session_id)
     
     @staticmethod
-    def cleanup_expired_sessions():
-        """清理过期会话"""
-        now = datetime.utcnow()
-        expired_sessions = []
-        
-        for session_id, session in active_sessions.items():
-            if now - session["last_activity"] > timedelta(minutes=15):
-                expired_sessions.append(session_id)
-        
-        for session_id in expired_sessions:
-            del active_sessions[session_id]
+    async def cleanup_expired_sessions() -> int:
+        """清理过期会话，返回清理的数量"""
+        return await session_store.purge_expired()
 
 # 依赖函数：验证当前用户
 async def get_current_user(request: Request):
@@ -137,7 +115,7 @@ async def get_current_user(request: Request):
     if not session_id:
         raise HTTPException(status_code=401, detail="未登录，请先登录")
     
-    session = AuthManager.validate_session(session_id, request)
+    session = await AuthManager.validate_session(session_id, request)
     return session
 
 # 可选的依赖函数：验证当前用户（允许未登录）
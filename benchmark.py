@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+性能基准测试 - 测量执行器和 /execute 接口的延迟、吞吐量、数据库往返次数和内存占用
+
+在进程内启动应用（不经过网络）和本地HTTP桩服务，结果以JSON输出，可保存后与其它版本对比：
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 对比时关注的指标：名称 -> 数值越小越好(True)/越大越好(False)
+COMPARED_METRICS = {
+    "p50_ms": True,
+    "p95_ms": True,
+    "p99_ms": True,
+    "throughput_rps": False,
+    "db_statements_per_request": True,
+    "peak_bytes": True,
+    "retained_bytes_per_execution": True
+}
+
+class StubHandler(BaseHTTPRequestHandler):
+    """本地HTTP桩服务：GET和POST都返回固定的小JSON"""
+    
+    # 保持连接，测量的是连接池复用后的开销
+    protocol_version = "HTTP/1.1"
+    
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    do_GET = _reply
+    do_POST = _reply
+    
+    def log_message(self, format, *args):
+        pass
+
+class StubServer(ThreadingHTTPServer):
+    # 默认的监听队列只有5，并发连接时会因SYN重传产生1秒的延迟
+    request_queue_size = 1024
+    daemon_threads = True
+
+def start_stub_server() -> StubServer:
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def action_definitions(stub_url: str) -> dict:
+    """每种操作类型的基准定义（尽量轻量，测量的是框架本身的开销）"""
+    return {
+        "shell": "echo benchmark",
+        "python": "print('benchmark')",
+        "http": json.dumps({"url": stub_url, "method": "GET"}),
+        "webhook": json.dumps({"url": stub_url, "payload": {"event": "benchmark"}})
+    }
+
+def percentile(values: list, percent: float) -> float:
+    """线性插值百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def latency_summary(latencies_ms: list) -> dict:
+    return {
+        "count": len(latencies_ms),
+        "mean_ms": round(statistics.fmean(latencies_ms), 3) if latencies_ms else 0,
+        "p50_ms": round(percentile(latencies_ms, 50), 3),
+        "p95_ms": round(percentile(latencies_ms, 95), 3),
+        "p99_ms": round(percentile(latencies_ms, 99), 3),
+        "max_ms": round(max(latencies_ms), 3) if latencies_ms else 0
+    }
+
+class StatementCounter:
+    """统计数据库语句执行次数（同步引擎和异步引擎）"""
+    
+    def __init__(self, engines):
+        from sqlalchemy import event
+        self.count = 0
+        self._lock = threading.Lock()
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._on_execute)
+    
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+async def bench_executor(action_type: str, content: str, iterations: int, warmup: int) -> dict:
+    """直接调用执行器：单次执行延迟"""
+    from executor import APIExecutor
+    from templating import compile_action
+    
+    template = compile_action(action_type, content, {})
+    for _ in range(warmup):
+        await APIExecutor.execute_action(action_type, content, {}, template=template)
+    
+    latencies = []
+    errors = 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        _, success, _ = await APIExecutor.execute_action(action_type, content, {}, template=template)
+        latencies.append((time.perf_counter() - start) * 1000)
+        errors += 0 if success else 1
+    return dict(latency_summary(latencies), errors=errors)
+
+async def bench_memory(action_type: str, content: str, iterations: int) -> dict:
+    """
+    执行器内存占用（tracemalloc，只统计本进程的Python分配）
+    peak_bytes为顺序执行期间相对起点的峰值，retained_bytes_per_execution为执行后仍未释放的平均字节数
+    """
+    from executor import APIExecutor
+    from templating import compile_action
+    
+    template = compile_action(action_type, content, {})
+    await APIExecutor.execute_action(action_type, content, {}, template=template)
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for _ in range(iterations):
+            await APIExecutor.execute_action(action_type, content, {}, template=template)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "iterations": iterations,
+        "peak_bytes": peak - baseline,
+        "retained_bytes_per_execution": round((current - baseline) / iterations, 1)
+    }
+
+async def wait_background_writes(timeout: float = 30):
+    """等待执行日志和执行计数写入数据库，使后台写入也计入数据库往返次数"""
+    from execution_counters import execution_counters
+    from log_writer import log_writer
+    
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = log_writer.stats()
+        if stats["pending"] == 0 and stats["queue_size"] == 0 and stats["running"] == 0:
+            break
+        await asyncio.sleep(0.05)
+    await execution_counters.flush()
+
+async def bench_endpoint(client, counter: StatementCounter, api_key: str,
+                         requests: int, concurrency: int, warmup: int) -> dict:
+    """并发调用 /execute：端到端延迟、吞吐量和每个请求的数据库往返次数"""
+    for _ in range(warmup):
+        await client.get("/execute", params={"key": api_key})
+    await wait_background_writes()
+    
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+    statements_before = counter.count
+    
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await client.get("/execute", params={"key": api_key})
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200 or not response.json().get("success"):
+                errors += 1
+    
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    request_statements = counter.count - statements_before
+    await wait_background_writes()
+    total_statements = counter.count - statements_before
+    
+    return dict(
+        latency_summary(latencies),
+        errors=errors,
+        concurrency=concurrency,
+        duration_s=round(elapsed, 3),
+        throughput_rps=round(requests / elapsed, 2) if elapsed else 0,
+        # 请求处理中直接执行的语句，以及包含日志/计数批量写入在内的总数
+        db_statements_per_request=round(total_statements / requests, 3),
+        db_statements_in_request_path=round(request_statements / requests, 3)
+    )
+
+async def run_benchmarks(args) -> dict:
+    import httpx
+    import main
+    from database import async_engine, engine
+    
+    stub = start_stub_server()
+    stub_url = f"http://127.0.0.1:{stub.server_address[1]}/stub"
+    counter = StatementCounter([engine, async_engine.sync_engine])
+    results = {"executor": {}, "endpoint": {}, "memory": {}}
+    actions = {
+        action_type: content
+        for action_type, content in action_definitions(stub_url).items()
+        if action_type in args.actions
+    }
+    
+    try:
+        async with main.lifespan(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+                response = await client.post("/login", data={
+                    "username": main.settings.ADMIN_USERNAME,
+                    "password": main.settings.ADMIN_PASSWORD
+                })
+                response.raise_for_status()
+                client.cookies.set("session_id", response.cookies.get("session_id"))
+                
+                for action_type, content in actions.items():
+                    print(f"⏱️ {action_type}: 执行器...", file=sys.stderr)
+                    results["executor"][action_type] = await bench_executor(
+                        action_type, content, args.iterations, args.warmup
+                    )
+                    
+                    response = await client.post("/api/definitions", data={
+                        "name": f"benchmark-{action_type}",
+                        "endpoint_path": f"/benchmark/{action_type}",
+                        "action_type": action_type,
+                        "action_content": content,
+                        "parameters": "{}"
+                    })
+                    response.raise_for_status()
+                    definition = response.json()
+                    print(f"⏱️ {action_type}: /execute 并发 {args.concurrency}...", file=sys.stderr)
+                    results["endpoint"][action_type] = await bench_endpoint(
+                        client, counter, definition["api_key"], args.requests, args.concurrency, args.warmup
+                    )
+                    await client.delete(f"/api/definitions/{definition['id']}")
+                    
+                    if not args.skip_memory:
+                        print(f"⏱️ {action_type}: 内存...", file=sys.stderr)
+                        results["memory"][action_type] = await bench_memory(
+                            action_type, content, args.memory_iterations
+                        )
+    finally:
+        stub.shutdown()
+    return results
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5
+        ).stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+def compare(current: dict, previous: dict) -> list:
+    """对比两次结果中的关键指标，返回 (指标路径, 之前, 现在, 变化百分比, 是否变差)"""
+    rows = []
+    for section in ("executor", "endpoint", "memory"):
+        for action_type, metrics in current.get(section, {}).items():
+            old_metrics = previous.get(section, {}).get(action_type, {})
+            for name, lower_is_better in COMPARED_METRICS.items():
+                if name not in metrics or name not in old_metrics:
+                    continue
+                old, new = old_metrics[name], metrics[name]
+                change = (new - old) / old * 100 if old else 0.0
+                worse = change > 0 if lower_is_better else change < 0
+                rows.append((f"{section}.{action_type}.{name}", old, new, round(change, 1), worse))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description='性能基准测试')
+    parser.add_argument('--database-url', type=str,
+                        help='测试数据库地址 (默认: 临时SQLite文件；也可指定本地PostgreSQL)')
+    parser.add_argument('--actions', nargs='+', default=["shell", "python", "http", "webhook"],
+                        choices=["shell", "python", "http", "webhook"], help='测试的操作类型')
+    parser.add_argument('--iterations', type=int, default=200, help='执行器测试次数 (默认: 200)')
+    parser.add_argument('--requests', type=int, default=500, help='/execute 请求总数 (默认: 500)')
+    parser.add_argument('--concurrency', '-c', type=int, default=20, help='/execute 并发数 (默认: 20)')
+    parser.add_argument('--warmup', type=int, default=10, help='预热次数 (默认: 10)')
+    parser.add_argument('--memory-iterations', type=int, default=50, help='内存测试次数 (默认: 50)')
+    parser.add_argument('--skip-memory', action='store_true', help='跳过内存测试')
+    parser.add_argument('--output', '-o', type=str, help='结果保存到JSON文件 (默认输出到标准输出)')
+    parser.add_argument('--compare', type=str, help='与之前保存的JSON结果对比')
+    
+    args = parser.parse_args()
+    
+    # 应用模块读取环境变量，必须在导入之前设置
+    temp_dir = None
+    if args.database_url:
+        os.environ["SUPABASE_URL"] = args.database_url
+    else:
+        # 默认的临时SQLite数据库由异步引擎通过aiosqlite访问（requirements.txt中已包含）
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            parser.error("默认的临时SQLite数据库需要aiosqlite，请先执行 pip install -r requirements.txt，或使用 --database-url 指定PostgreSQL")
+        temp_dir = tempfile.mkdtemp(prefix="api-benchmark-")
+        os.environ["SUPABASE_URL"] = f"sqlite:///{os.path.join(temp_dir, 'benchmark.db')}"
+    os.environ.setdefault("LOG_SPILL_PATH", os.path.join(tempfile.gettempdir(), "benchmark.spill.jsonl"))
+    # 基准测试不应受限流和并发限制影响
+    os.environ["GLOBAL_MAX_CONCURRENCY"] = str(max(args.concurrency, 1) * 2)
+    os.environ["LOG_RETENTION_DAYS"] = "0"
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    
+    started_at = datetime.utcnow()
+    try:
+        # 应用的运行日志输出到标准错误，标准输出只保留JSON结果
+        with contextlib.redirect_stdout(sys.stderr):
+            results = asyncio.run(run_benchmarks(args))
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "started_at": started_at.isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": os.environ["SUPABASE_URL"].split("://", 1)[0],
+            "iterations": args.iterations,
+            "requests": args.requests,
+            "concurrency": args.concurrency
+        },
+        **results
+    }
+    
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"✅ 结果已保存到 {args.output}", file=sys.stderr)
+    else:
+        print(output)
+    
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        print(f"\n📊 与 {args.compare} ({previous.get('meta', {}).get('revision', 'unknown')}) 对比:", file=sys.stderr)
+        for path, old, new, change, worse in compare(report, previous):
+            marker = "🔺" if worse and abs(change) >= 5 else "  "
+            print(f"{marker} {path:<48} {old:>12} -> {new:<12} {change:+.1f}%", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
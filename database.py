@@ -1,14 +1,63 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, JSON
+from sqlalchemy import create_engine, inspect, text, Column, Integer, BigInteger, Float, String, Text, DateTime, Boolean, JSON, LargeBinary, UniqueConstraint, Index
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import deferred, sessionmaker
 from datetime import datetime
 from config import settings
 import uuid
 
-# 创建数据库引擎
-engine = create_engine(settings.DATABASE_URL)
+# 同步驱动对应的异步驱动
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def pool_options(url) -> dict:
+    """连接池配置（SQLite使用默认连接池）"""
+    if url.get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING
+    }
+
+def async_engine_options(database_url: str):
+    """
+    异步引擎的连接地址和参数
+    使用同步驱动的地址（如 postgresql://）时换成对应的异步驱动，已指定异步驱动时保持不变
+    """
+    url = make_url(database_url)
+    driver = ASYNC_DRIVERS.get(url.drivername)
+    if driver is not None:
+        url = url.set(drivername=driver)
+    if url.drivername == "sqlite+aiosqlite":
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            raise RuntimeError("使用SQLite数据库需要安装aiosqlite (pip install aiosqlite)")
+    options = pool_options(url)
+    if url.drivername == "postgresql+asyncpg":
+        query = dict(url.query)
+        # asyncpg不支持psycopg2的sslmode参数，转换为ssl连接参数
+        sslmode = query.pop("sslmode", None)
+        query["prepared_statement_cache_size"] = str(settings.DB_STATEMENT_CACHE_SIZE)
+        url = url.set(query=query)
+        connect_args = {"statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+        if sslmode and sslmode != "disable":
+            connect_args["ssl"] = sslmode
+        options["connect_args"] = connect_args
+    return url, options
+
+# 创建数据库引擎（同步引擎用于建表和后台任务，请求处理使用异步引擎）
+engine = create_engine(settings.DATABASE_URL, **pool_options(make_url(settings.DATABASE_URL)))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+_async_url, _async_options = async_engine_options(settings.DATABASE_URL)
+async_engine = create_async_engine(_async_url, **_async_options)
+# 提交后不过期对象，返回响应时读取属性不会再次查询数据库
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 class APIDefinition(Base):
@@ -27,20 +76,103 @@ class APIDefinition(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     execution_count = Column(Integer, default=0)
+    success_count = Column(Integer, default=0, server_default="0")
+    error_count = Column(Integer, default=0, server_default="0")
+    total_duration_ms = Column(BigInteger, default=0, server_default="0")  # 累计执行时长(毫秒)
+    cache_hit_count = Column(Integer, default=0, server_default="0")  # 命中结果缓存的次数
+    max_output_bytes = Column(Integer)  # 结果上限(字节)，为空时使用全局默认值
+    timeout_seconds = Column(Float)  # 执行超时(秒)，为空时使用全局默认值
+    job_priority = Column(Integer, default=0, server_default="0")  # 异步任务优先级，数值越大越先执行
+    max_concurrency = Column(Integer)  # 最大并发执行数，为空表示不限制
+    max_queue = Column(Integer)  # 并发已满时的最大排队数，为空时使用全局默认值
+    queue_timeout = Column(Float)  # 排队超时(秒)，为空时使用全局默认值
+    key_rate_limit = Column(Float)  # 每个API密钥每分钟最多请求数，为空表示不限制
+    ip_rate_limit = Column(Float)  # 每个客户端IP每分钟最多请求数，为空表示不限制
+    rate_limit_burst = Column(Integer)  # 允许的突发请求数，为空时等于每分钟请求数
+    result_cache_ttl = Column(Float)  # 结果缓存时间(秒)，为空表示不缓存
+    retention_days = Column(Integer)  # 执行日志保留天数，为空使用全局设置，0表示永久保留
+    cpu_limit_seconds = Column(Integer)  # Shell/Python子进程CPU时间上限(秒)，为空时使用全局默认值，0表示不限制
+    memory_limit_mb = Column(Integer)  # 子进程地址空间上限(MB)，为空时使用全局默认值，0表示不限制
+    max_open_files = Column(Integer)  # 子进程最多打开文件数，为空时使用全局默认值，0表示不限制
+    max_processes = Column(Integer)  # 运行用户的最大进程数，为空时使用全局默认值，0表示不限制
+    schedule = Column(String(100))  # 定时执行表达式（cron、@daily等简写或 @every 5m），为空表示不定时执行
+    schedule_parameters = Column(JSON)  # 定时执行使用的参数
+    schedule_jitter = Column(Float)  # 定时执行的随机延迟上限(秒)
+    schedule_misfire = Column(String(20))  # 错过执行时间的处理方式: skip(默认), run_once
 
 class APIExecution(Base):
     __tablename__ = "api_executions"
+    # 执行记录列表按 (execution_time, id) 倒序分页，以下复合索引覆盖全部、按API定义和按API密钥的查询
+    __table_args__ = (
+        Index("ix_api_executions_time_id", "execution_time", "id"),
+        Index("ix_api_executions_definition_time_id", "api_definition_id", "execution_time", "id"),
+        Index("ix_api_executions_key_time_id", "api_key", "execution_time", "id"),
+        Index("ix_api_executions_status_time_id", "status", "execution_time", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     api_definition_id = Column(Integer, nullable=False, index=True)
     api_key = Column(String(50), nullable=False, index=True)
     parameters = Column(JSON, default={})
-    result = Column(Text)
-    status = Column(String(20), nullable=False)  # success, error, running
+    result = Column(Text)  # 结果较大时只保存预览，完整结果压缩后存入result_blob
+    result_blob = deferred(Column(LargeBinary))  # 压缩后的完整结果（列表查询不加载）
+    result_encoding = Column(String(10))  # 压缩格式: zstd, gzip
+    result_size = Column(Integer)  # 完整结果大小(字节)
+    status = Column(String(20), nullable=False)  # success, error, running, queued(异步任务排队中)
     execution_time = Column(DateTime, default=datetime.utcnow)
     duration_ms = Column(Integer)  # 执行时长(毫秒)
+    cpu_user_ms = Column(Integer)  # 子进程用户态CPU时间(毫秒)
+    cpu_system_ms = Column(Integer)  # 子进程内核态CPU时间(毫秒)
+    max_rss_kb = Column(Integer)  # 子进程峰值内存(KB)，无法单独统计时为空
     error_message = Column(Text)
     request_ip = Column(String(50))
+    job_owner = Column(String(200))  # 异步任务所在的进程（主机名:进程号:随机串）
+    job_heartbeat = Column(DateTime)  # 异步任务最近一次心跳时间(UTC)，长时间没有心跳的未完成任务视为中断
+
+class APIExecutionStat(Base):
+    """执行统计汇总：按API定义和时间桶（分钟/小时）增量累加，统计查询不扫描执行日志"""
+    __tablename__ = "api_execution_stats"
+    __table_args__ = (
+        UniqueConstraint("api_definition_id", "bucket_size", "bucket_start", name="uq_execution_stats_bucket"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    api_definition_id = Column(Integer, nullable=False)
+    bucket_size = Column(String(10), nullable=False)  # minute, hour
+    bucket_start = Column(DateTime, nullable=False, index=True)  # 时间桶开始时间(UTC)
+    execution_count = Column(Integer, default=0, server_default="0")
+    success_count = Column(Integer, default=0, server_default="0")
+    error_count = Column(Integer, default=0, server_default="0")
+    cache_hit_count = Column(Integer, default=0, server_default="0")
+    total_duration_ms = Column(BigInteger, default=0, server_default="0")
+    max_duration_ms = Column(Integer, default=0, server_default="0")
+
+class AdminSession(Base):
+    """管理员登录会话（SESSION_BACKEND=database时使用，多个worker/副本共享）"""
+    __tablename__ = "admin_sessions"
+    
+    session_id = Column(String(64), primary_key=True)
+    username = Column(String(100), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_activity = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)  # 过期时间(UTC)，每次活动时延长
+    ip_address = Column(String(50))
+    user_agent = Column(String(500))
+
+class ScheduleState(Base):
+    """定时执行的上次触发时间（重启或主节点切换后据此处理错过的执行）"""
+    __tablename__ = "schedule_states"
+    
+    api_definition_id = Column(Integer, primary_key=True)
+    last_tick = Column(DateTime, nullable=False)  # 上次触发的计划时间(UTC)
+
+class SchedulerLease(Base):
+    """定时调度主节点租约（未配置Redis时使用，多个worker/副本中只有持有者触发定时执行）"""
+    __tablename__ = "scheduler_leases"
+    
+    name = Column(String(50), primary_key=True)
+    owner = Column(String(200), nullable=False)
+    expires_at = Column(DateTime, nullable=False)  # 租约到期时间(UTC)，持有者定期延长
 
 # 数据库依赖
 def get_db():
@@ -50,9 +182,61 @@ def get_db():
     finally:
         db.close()
 
+# 异步数据库依赖（请求处理中使用，查询不阻塞事件循环）
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # 创建表
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    upgrade_schema()
+
+# 为已存在的表补充新增字段（create_all不会修改已有表）
+def upgrade_schema():
+    inspector = inspect(engine)
+    added_columns = set()
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                conn.execute(text(ddl))
+                print(f"✓ 已添加字段 {table.name}.{column.name}")
+                added_columns.add((table.name, column.name))
+            # 补充新增的索引：PostgreSQL上建索引会锁住整张表（执行日志表可能很大），
+            # 启动时不创建，提示执行 scripts/add_execution_indexes.sql（CREATE INDEX CONCURRENTLY）
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                if engine.dialect.name == "postgresql":
+                    print(f"⚠️ 缺少索引 {table.name}.{index.name}，请执行 scripts/add_execution_indexes.sql 在线创建")
+                    continue
+                index.create(bind=conn)
+                print(f"✓ 已添加索引 {table.name}.{index.name}")
+        if ("api_definitions", "success_count") in added_columns:
+            backfill_counters(conn)
+
+# 旧版本数据库只有execution_count，按已有执行日志补齐成功/失败次数和总耗时（只在添加字段时执行一次）
+def backfill_counters(conn):
+    conn.execute(text("""
+        UPDATE api_definitions SET
+            success_count = (SELECT COUNT(*) FROM api_executions e
+                             WHERE e.api_definition_id = api_definitions.id AND e.status = 'success'),
+            error_count = (SELECT COUNT(*) FROM api_executions e
+                           WHERE e.api_definition_id = api_definitions.id AND e.status = 'error'),
+            total_duration_ms = (SELECT COALESCE(SUM(e.duration_ms), 0) FROM api_executions e
+                                 WHERE e.api_definition_id = api_definitions.id)
+    """))
+    print("✓ 已根据执行日志补齐执行统计")
 
 # 生成API密钥
 def generate_api_key():
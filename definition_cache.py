@@ -0,0 +1,211 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from config import settings
+from resource_limits import ResourceLimits
+from result_cache import result_cache
+from shared_backend import get_redis, redis_key
+from templating import TemplateError, compile_action
+
+# 跨进程失效通知频道
+INVALIDATION_CHANNEL = "definition-invalidate"
+# 清空全部缓存的通知内容
+INVALIDATE_ALL = "*"
+
+class CachedDefinition:
+    """API定义快照，脱离数据库会话，可在请求之间安全复用"""
+    
+    __slots__ = (
+        "id", "name", "api_key", "action_type", "action_content",
+        "parameters", "is_active", "enable_logging", "max_output_bytes", "timeout_seconds",
+        "job_priority", "max_concurrency", "max_queue", "queue_timeout",
+        "key_rate_limit", "ip_rate_limit", "rate_limit_burst", "result_cache_ttl",
+        "cpu_limit_seconds", "memory_limit_mb", "max_open_files", "max_processes", "template", "limits"
+    )
+    
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+        # 加载时预编译操作模板；内容有误时留空，执行时返回具体错误
+        if self.template is None and self.action_type:
+            try:
+                self.template = compile_action(self.action_type, self.action_content, self.parameters)
+            except TemplateError:
+                self.template = None
+        # 资源限制（未设置的项使用全局默认值）
+        if self.limits is None:
+            self.limits = ResourceLimits.for_definition(self)
+    
+    @classmethod
+    def from_model(cls, api_def) -> "CachedDefinition":
+        """从ORM对象创建快照"""
+        return cls(
+            id=api_def.id,
+            name=api_def.name,
+            api_key=api_def.api_key,
+            action_type=api_def.action_type,
+            action_content=api_def.action_content,
+            parameters=dict(api_def.parameters or {}),
+            is_active=api_def.is_active,
+            enable_logging=getattr(api_def, 'enable_logging', True),
+            max_output_bytes=api_def.max_output_bytes,
+            timeout_seconds=api_def.timeout_seconds,
+            job_priority=api_def.job_priority or 0,
+            max_concurrency=api_def.max_concurrency,
+            max_queue=api_def.max_queue,
+            queue_timeout=api_def.queue_timeout,
+            key_rate_limit=api_def.key_rate_limit,
+            ip_rate_limit=api_def.ip_rate_limit,
+            rate_limit_burst=api_def.rate_limit_burst,
+            result_cache_ttl=api_def.result_cache_ttl,
+            cpu_limit_seconds=api_def.cpu_limit_seconds,
+            memory_limit_mb=api_def.memory_limit_mb,
+            max_open_files=api_def.max_open_files,
+            max_processes=api_def.max_processes
+        )
+
+class DefinitionCache:
+    """按api_key缓存API定义（LRU + TTL），定义变更时失效"""
+    
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 失效代数：加载期间发生失效时不写入加载结果（全部清空时递增全局代数）
+        self._generations: Dict[str, int] = {}
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+    
+    def get(self, api_key: str):
+        """
+        读取缓存
+        返回: (是否命中, 定义)，定义为None表示已缓存的"不存在"结果
+        """
+        with self._lock:
+            entry = self._entries.get(api_key)
+            if entry is None:
+                self._misses += 1
+                return False, None
+            
+            expires_at, definition = entry
+            if expires_at < time.monotonic():
+                del self._entries[api_key]
+                self._misses += 1
+                return False, None
+            
+            self._entries.move_to_end(api_key)
+            self._hits += 1
+            return True, definition
+    
+    def generation(self, api_key: str) -> tuple:
+        """当前失效代数，加载前读取，写入时传给put"""
+        with self._lock:
+            return self._generation, self._generations.get(api_key, 0)
+    
+    def put(self, api_key: str, definition: Optional[CachedDefinition], generation: Optional[tuple] = None):
+        """
+        写入缓存，超出容量时淘汰最久未使用的条目
+        generation与当前失效代数不同（加载期间已失效）时不写入，避免旧数据在失效后重新进入缓存
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is not None and generation != (self._generation, self._generations.get(api_key, 0)):
+                return
+            self._entries[api_key] = (time.monotonic() + self.ttl, definition)
+            self._entries.move_to_end(api_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def invalidate_local(self, api_key: Optional[str] = None):
+        """失效本进程缓存（同时清除对应的执行结果缓存），api_key为空时清空全部"""
+        if api_key == INVALIDATE_ALL:
+            api_key = None
+        with self._lock:
+            if api_key is None:
+                self._entries.clear()
+                self._generations.clear()
+                self._generation += 1
+            else:
+                self._entries.pop(api_key, None)
+                self._generations[api_key] = self._generations.get(api_key, 0) + 1
+        result_cache.invalidate(api_key)
+    
+    async def invalidate(self, api_key: Optional[str] = None):
+        """失效缓存并通知其他进程"""
+        self.invalidate_local(api_key)
+        redis = get_redis()
+        if redis is not None:
+            try:
+                await redis.publish(redis_key(INVALIDATION_CHANNEL), api_key or INVALIDATE_ALL)
+            except Exception as e:
+                print(f"✗ 发布缓存失效通知失败: {e}")
+    
+    async def get_or_load(self, api_key: str, loader: Callable[[], Any]) -> Optional[CachedDefinition]:
+        """
+        读穿缓存：命中直接返回，未命中时调用loader（异步函数，返回ORM对象或None）加载
+        加载期间缓存被失效时本次结果只返回给调用方，不写入缓存
+        """
+        hit, definition = self.get(api_key)
+        if hit:
+            return definition
+        
+        generation = self.generation(api_key)
+        api_def = await loader()
+        definition = CachedDefinition.from_model(api_def) if api_def is not None else None
+        self.put(api_key, definition, generation)
+        return definition
+    
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / total * 100, 2) if total else 0
+            }
+    
+    async def listen_invalidations(self):
+        """订阅跨进程失效通知（需要配置REDIS_URL），断线后自动重连"""
+        redis = get_redis()
+        if redis is None:
+            return
+        
+        while True:
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(redis_key(INVALIDATION_CHANNEL))
+                # 重新订阅期间可能错过通知，清空本地缓存保证一致
+                self.invalidate_local()
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self.invalidate_local(message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"✗ 缓存失效订阅中断，5秒后重连: {e}")
+                await asyncio.sleep(5)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+# 全局定义缓存
+definition_cache = DefinitionCache(
+    max_size=settings.DEFINITION_CACHE_SIZE,
+    ttl=settings.DEFINITION_CACHE_TTL
+)
\ No newline at end of file
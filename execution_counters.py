@@ -0,0 +1,273 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, case, func, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from config import settings
+from database import SessionLocal, APIDefinition, APIExecutionStat
+from executor import run_sync
+
+# 时间桶大小
+BUCKET_SIZES = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1)}
+
+def bucket_start(moment: datetime, bucket_size: str) -> datetime:
+    """时间所在时间桶的开始时间"""
+    if bucket_size == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(second=0, microsecond=0)
+
+class ExecutionCounters:
+    """
+    执行计数聚合器
+    在内存中累加每个API定义的执行次数、成功/失败次数和总耗时，
+    定期以 execution_count = execution_count + :n 的批量UPDATE写入数据库，
+    避免并发请求读改写丢失计数，也去掉了每次请求的一次写操作；
+    同时按分钟累加时间桶增量，写入时合并到api_execution_stats的分钟和小时汇总
+    """
+    
+    # 每个定义累加的字段，与APIDefinition的列名一致
+    FIELDS = ("execution_count", "success_count", "error_count", "total_duration_ms", "cache_hit_count")
+    # 时间桶累加的字段，与APIExecutionStat的列名一致（max_duration_ms取最大值，其余相加）
+    BUCKET_FIELDS = FIELDS + ("max_duration_ms",)
+    
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._deltas: Dict[int, List[int]] = {}
+        # (定义ID, 分钟开始时间) -> 增量
+        self._buckets: Dict[Tuple[int, datetime], List[int]] = {}
+        # 正在写入数据库的增量，提交成功后才清除，写入期间仍计入未写入的增量
+        self._flushing_deltas: Dict[int, List[int]] = {}
+        self._flushing_buckets: Dict[Tuple[int, datetime], List[int]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        # 成功写入数据库的次数，统计缓存据此判断数据库中的计数是否已变化
+        self.generation = 0
+    
+    def record(self, definition_id: int, success: bool, duration_ms: int, cache_hit: bool = False):
+        """记录一次执行"""
+        duration_ms = duration_ms or 0
+        minute = bucket_start(datetime.utcnow(), "minute")
+        with self._lock:
+            delta = self._deltas.get(definition_id)
+            if delta is None:
+                delta = self._deltas[definition_id] = [0] * len(self.FIELDS)
+            bucket = self._buckets.get((definition_id, minute))
+            if bucket is None:
+                bucket = self._buckets[(definition_id, minute)] = [0] * len(self.BUCKET_FIELDS)
+            for values in (delta, bucket):
+                values[0] += 1
+                values[1 if success else 2] += 1
+                values[3] += duration_ms
+                if cache_hit:
+                    values[4] += 1
+            bucket[5] = max(bucket[5], duration_ms)
+    
+    def pending(self, definition_id: int) -> Dict[str, int]:
+        """尚未写入数据库的增量（包括正在写入的）"""
+        with self._lock:
+            totals = [0] * len(self.FIELDS)
+            for deltas in (self._deltas, self._flushing_deltas):
+                self._add_delta(totals, deltas.get(definition_id))
+            return dict(zip(self.FIELDS, totals))
+    
+    def pending_totals(self) -> Dict[str, int]:
+        """所有定义尚未写入数据库的增量合计（包括正在写入的）"""
+        with self._lock:
+            totals = [0] * len(self.FIELDS)
+            for deltas in (self._deltas, self._flushing_deltas):
+                for delta in deltas.values():
+                    self._add_delta(totals, delta)
+            return dict(zip(self.FIELDS, totals))
+    
+    def pending_buckets(self, bucket_size: str, since: datetime,
+                        definition_id: Optional[int] = None) -> Dict[Tuple[int, datetime], List[int]]:
+        """尚未写入数据库的时间桶增量（按BUCKET_FIELDS顺序），分钟增量按需合并为小时"""
+        with self._lock:
+            items = [
+                (key, list(values))
+                for buckets in (self._buckets, self._flushing_buckets)
+                for key, values in buckets.items()
+            ]
+        return self._merge_buckets(items, bucket_size, since, definition_id)
+    
+    @staticmethod
+    def _add_delta(target: List[int], delta: Optional[List[int]]):
+        """累加定义增量"""
+        if delta:
+            for index, value in enumerate(delta):
+                target[index] += value
+    
+    @staticmethod
+    def _add_bucket(target: List[int], values: List[int]):
+        """累加时间桶增量（max_duration_ms取最大值）"""
+        for index in range(5):
+            target[index] += values[index]
+        target[5] = max(target[5], values[5])
+    
+    @classmethod
+    def _merge_buckets(cls, items, bucket_size: str, since: Optional[datetime] = None,
+                       definition_id: Optional[int] = None) -> Dict[Tuple[int, datetime], List[int]]:
+        merged: Dict[Tuple[int, datetime], List[int]] = {}
+        for (bucket_definition_id, minute), values in items:
+            if definition_id is not None and bucket_definition_id != definition_id:
+                continue
+            start = bucket_start(minute, bucket_size)
+            if since is not None and start < since:
+                continue
+            current = merged.get((bucket_definition_id, start))
+            if current is None:
+                merged[(bucket_definition_id, start)] = list(values)
+                continue
+            cls._add_bucket(current, values)
+        return merged
+    
+    def start(self):
+        """启动定期写入任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """停止定期写入并写入剩余增量"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # 停止时不中断正在进行的写入，stop()中的flush会等待其完成
+            await asyncio.shield(self.flush())
+    
+    async def flush(self):
+        """
+        将累积的增量写入数据库
+        写入期间增量移到正在写入的集合（仍计入pending），提交成功后清除，失败时合并回去等待下次写入
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            with self._lock:
+                if not self._deltas:
+                    return
+                deltas, self._deltas = self._deltas, {}
+                buckets, self._buckets = self._buckets, {}
+                self._flushing_deltas, self._flushing_buckets = deltas, buckets
+            
+            try:
+                await run_sync(self._apply_flushing, deltas, buckets)
+                self.generation += 1
+            except Exception as e:
+                print(f"✗ 写入执行计数失败: {e}")
+                with self._lock:
+                    for definition_id, delta in self._flushing_deltas.items():
+                        self._add_delta(self._deltas.setdefault(definition_id, [0] * len(self.FIELDS)), delta)
+                    for key, values in self._flushing_buckets.items():
+                        self._add_bucket(self._buckets.setdefault(key, [0] * len(self.BUCKET_FIELDS)), values)
+                    self._flushing_deltas, self._flushing_buckets = {}, {}
+    
+    def _apply_flushing(self, deltas: Dict[int, List[int]], buckets: Dict[Tuple[int, datetime], List[int]]):
+        """写入正在写入的增量，提交后立即清除（在同一线程中，缩短统计重复计入的窗口）"""
+        self._apply(deltas, buckets)
+        with self._lock:
+            if self._flushing_deltas is deltas:
+                self._flushing_deltas, self._flushing_buckets = {}, {}
+    
+    @classmethod
+    def _apply(cls, deltas: Dict[int, List[int]], buckets: Dict[Tuple[int, datetime], List[int]]):
+        """一次批量UPDATE写入所有定义的增量，并在同一事务中合并时间桶汇总"""
+        statement = (
+            update(APIDefinition)
+            .where(APIDefinition.id == bindparam("definition_id"))
+            .values(
+                # 计数更新不应修改定义的更新时间
+                updated_at=APIDefinition.updated_at,
+                **{
+                    field: func.coalesce(getattr(APIDefinition, field), 0) + bindparam(f"delta_{field}")
+                    for field in cls.FIELDS
+                }
+            )
+        )
+        rows = [
+            dict(
+                {"definition_id": definition_id},
+                **{f"delta_{field}": value for field, value in zip(cls.FIELDS, delta)}
+            )
+            for definition_id, delta in deltas.items()
+        ]
+        bucket_rows = [
+            dict(
+                {"api_definition_id": definition_id, "bucket_size": bucket_size, "bucket_start": start},
+                **dict(zip(cls.BUCKET_FIELDS, values))
+            )
+            for bucket_size in BUCKET_SIZES
+            for (definition_id, start), values in cls._merge_buckets(buckets.items(), bucket_size).items()
+        ]
+        db = SessionLocal()
+        try:
+            connection = db.connection()
+            connection.execute(statement, rows)
+            if bucket_rows:
+                cls._upsert_buckets(connection, bucket_rows)
+            db.commit()
+        finally:
+            db.close()
+    
+    @classmethod
+    def _upsert_buckets(cls, connection, rows: List[Dict]):
+        """合并时间桶汇总：已存在的桶累加计数，不存在时插入"""
+        table = APIExecutionStat.__table__
+        dialects = {"postgresql": postgresql, "sqlite": sqlite}
+        dialect = dialects.get(connection.dialect.name)
+        if dialect is not None:
+            statement = dialect.insert(table)
+            excluded = statement.excluded
+            statement = statement.on_conflict_do_update(
+                index_elements=["api_definition_id", "bucket_size", "bucket_start"],
+                set_=dict(
+                    {field: table.c[field] + excluded[field] for field in cls.FIELDS},
+                    max_duration_ms=case(
+                        (excluded.max_duration_ms > table.c.max_duration_ms, excluded.max_duration_ms),
+                        else_=table.c.max_duration_ms
+                    )
+                )
+            )
+            connection.execute(statement, rows)
+            return
+        
+        # 其它数据库：先UPDATE，桶不存在时再INSERT
+        statement = (
+            update(table)
+            .where(and_(
+                table.c.api_definition_id == bindparam("b_definition_id"),
+                table.c.bucket_size == bindparam("b_size"),
+                table.c.bucket_start == bindparam("b_start")
+            ))
+            .values(
+                max_duration_ms=case(
+                    (bindparam("b_max_duration_ms") > table.c.max_duration_ms, bindparam("b_max_duration_ms")),
+                    else_=table.c.max_duration_ms
+                ),
+                **{field: table.c[field] + bindparam(f"b_{field}") for field in cls.FIELDS}
+            )
+        )
+        for row in rows:
+            result = connection.execute(statement, {
+                "b_definition_id": row["api_definition_id"],
+                "b_size": row["bucket_size"],
+                "b_start": row["bucket_start"],
+                **{f"b_{field}": row[field] for field in cls.BUCKET_FIELDS}
+            })
+            if result.rowcount == 0:
+                connection.execute(table.insert(), row)
+
+# 全局执行计数聚合器
+execution_counters = ExecutionCounters(flush_interval=settings.COUNTER_FLUSH_INTERVAL)
\ No newline at end of file
@@ -0,0 +1,131 @@
+import base64
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import Select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+from database import APIExecution
+from result_store import result_preview
+
+# 每页最多返回的记录数
+MAX_PAGE_SIZE = 500
+# 列表接口可选的字段；result只返回预览，完整结果通过 /api/executions/{id}/result 获取
+LIST_FIELDS = (
+    "id", "api_definition_id", "api_key", "parameters", "result", "status",
+    "execution_time", "duration_ms", "cpu_user_ms", "cpu_system_ms", "max_rss_kb",
+    "error_message", "request_ip"
+)
+# 字段需要加载的列（result预览需要结果大小和压缩格式）
+FIELD_COLUMNS = {"result": ("result", "result_size", "result_encoding")}
+
+class InvalidQuery(ValueError):
+    """查询参数不合法"""
+
+def encode_cursor(execution: APIExecution) -> str:
+    """分页游标：最后一条记录的 (execution_time, id)"""
+    raw = f"{execution.execution_time.isoformat()}|{execution.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        execution_time, execution_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(execution_time), int(execution_id)
+    except Exception:
+        raise InvalidQuery("分页游标无效")
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """解析逗号分隔的返回字段，未指定时返回全部字段"""
+    if not fields:
+        return LIST_FIELDS
+    selected = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in selected if field not in LIST_FIELDS]
+    if unknown:
+        raise InvalidQuery(f"未知的字段: {', '.join(unknown)}，可选: {', '.join(LIST_FIELDS)}")
+    return selected
+
+def _utc(moment: Optional[datetime]) -> Optional[datetime]:
+    """执行时间以不带时区的UTC时间保存，带时区的参数先转换为UTC"""
+    if moment is not None and moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+async def list_executions(
+    db: AsyncSession,
+    statement: Select,
+    limit: int,
+    cursor: Optional[str] = None,
+    fields: Tuple[str, ...] = LIST_FIELDS,
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    min_duration_ms: Optional[int] = None,
+    max_duration_ms: Optional[int] = None
+) -> Tuple[List[APIExecution], Optional[str]]:
+    """
+    按 (execution_time, id) 倒序分页查询执行记录（keyset分页，翻页深度不影响查询速度）
+    返回: (本页记录, 下一页游标)
+    """
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise InvalidQuery(f"返回数量应在1到{MAX_PAGE_SIZE}之间")
+    
+    # 只加载需要的列；分页排序始终需要id和execution_time
+    columns = {"id", "execution_time"}
+    for field in fields:
+        columns.update(FIELD_COLUMNS.get(field, (field,)))
+    statement = statement.options(load_only(*[getattr(APIExecution, column) for column in sorted(columns)]))
+    
+    if status:
+        statuses = [value.strip() for value in status.split(",") if value.strip()]
+        statement = statement.where(APIExecution.status.in_(statuses))
+    if since is not None:
+        statement = statement.where(APIExecution.execution_time >= _utc(since))
+    if until is not None:
+        statement = statement.where(APIExecution.execution_time < _utc(until))
+    if min_duration_ms is not None:
+        statement = statement.where(APIExecution.duration_ms >= min_duration_ms)
+    if max_duration_ms is not None:
+        statement = statement.where(APIExecution.duration_ms <= max_duration_ms)
+    if cursor:
+        cursor_time, cursor_id = decode_cursor(cursor)
+        statement = statement.where(or_(
+            APIExecution.execution_time < cursor_time,
+            and_(APIExecution.execution_time == cursor_time, APIExecution.id < cursor_id)
+        ))
+    
+    # 多取一条判断是否还有下一页
+    executions = (await db.scalars(statement.order_by(
+        APIExecution.execution_time.desc(), APIExecution.id.desc()
+    ).limit(limit + 1))).all()
+    next_cursor = None
+    if len(executions) > limit:
+        executions = executions[:limit]
+        next_cursor = encode_cursor(executions[-1])
+    return executions, next_cursor
+
+def _result_fields(execution: APIExecution) -> Dict[str, Any]:
+    preview, truncated = result_preview(execution.result)
+    return {
+        "result": preview,
+        "result_truncated": truncated or execution.result_encoding is not None,
+        "result_size": execution.result_size if execution.result_size is not None else len((execution.result or "").encode("utf-8"))
+    }
+
+# 字段的序列化方式（未列出的字段直接返回列的值）
+FIELD_SERIALIZERS: Dict[str, Callable[[APIExecution], Dict[str, Any]]] = {
+    "result": _result_fields,
+    "execution_time": lambda e: {"execution_time": e.execution_time.isoformat()}
+}
+
+def serialize_execution(execution: APIExecution, fields: Tuple[str, ...] = LIST_FIELDS) -> Dict[str, Any]:
+    """序列化列表中的执行记录，只包含请求的字段"""
+    data: Dict[str, Any] = {}
+    for field in fields:
+        serializer = FIELD_SERIALIZERS.get(field)
+        if serializer is not None:
+            data.update(serializer(execution))
+        else:
+            data[field] = getattr(execution, field)
+    return data
\ No newline at end of file
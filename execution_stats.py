@@ -0,0 +1,145 @@
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from database import APIDefinition, APIExecutionStat
+from execution_counters import BUCKET_SIZES, bucket_start, execution_counters
+
+# 时间序列最多返回的时间桶数量
+MAX_POINTS = {"minute": 1440, "hour": 24 * 90}
+
+class StatsCache:
+    """
+    统计查询结果的短时缓存
+    执行计数写入数据库后缓存立即失效，数据库中的计数与内存增量不会重复或遗漏
+    """
+    
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[Tuple, Tuple[float, int, Any]] = {}
+        self._lock = threading.Lock()
+    
+    async def get_or_load(self, key: Tuple, load):
+        now = time.monotonic()
+        generation = execution_counters.generation
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now and entry[1] == generation:
+                return entry[2]
+        value = await load()
+        if self.ttl > 0:
+            with self._lock:
+                # 丢弃过期的条目，缓存大小与不同查询参数的数量有关
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                self._entries[key] = (now + self.ttl, generation, value)
+        return value
+
+stats_cache = StatsCache(ttl=settings.STATS_CACHE_TTL)
+
+def _rates(execution_count: int, success_count: int, error_count: int,
+           total_duration_ms: int) -> Dict[str, Any]:
+    return {
+        "success_rate": round(success_count / execution_count * 100, 2) if execution_count else 0,
+        "error_rate": round(error_count / execution_count * 100, 2) if execution_count else 0,
+        "avg_duration_ms": round(total_duration_ms / execution_count) if execution_count else 0
+    }
+
+async def summary(db: AsyncSession) -> Dict[str, Any]:
+    """总体统计：一次聚合查询API定义上的计数，加上尚未写入数据库的增量"""
+    async def load():
+        row = (await db.execute(select(
+            func.count(APIDefinition.id),
+            func.sum(case((APIDefinition.is_active == True, 1), else_=0)),
+            *[func.sum(getattr(APIDefinition, field)) for field in execution_counters.FIELDS]
+        ))).one()
+        return [value or 0 for value in row]
+    
+    total_apis, active_apis, *totals = await stats_cache.get_or_load(("summary",), load)
+    pending = execution_counters.pending_totals()
+    counts = {
+        field: int(value) + pending[field]
+        for field, value in zip(execution_counters.FIELDS, totals)
+    }
+    return dict({
+        "total_apis": int(total_apis),
+        "active_apis": int(active_apis),
+        "total_executions": counts["execution_count"],
+        "successful_executions": counts["success_count"],
+        "failed_executions": counts["error_count"],
+        "cache_hits": counts["cache_hit_count"]
+    }, **_rates(counts["execution_count"], counts["success_count"], counts["error_count"],
+                counts["total_duration_ms"]))
+
+def _bucket_values(rows, pending: Dict[Tuple[int, datetime], List[int]], key_index: int) -> Dict[Any, List[int]]:
+    """合并数据库汇总和内存增量，key_index为分组键在(定义ID, 时间桶)中的位置"""
+    merged: Dict[Any, List[int]] = {row[0]: [int(value or 0) for value in row[1:]] for row in rows}
+    for key, values in pending.items():
+        current = merged.setdefault(key[key_index], [0] * len(values))
+        for index in range(5):
+            current[index] += values[index]
+        current[5] = max(current[5], values[5])
+    return merged
+
+def _bucket_point(values: List[int]) -> Dict[str, Any]:
+    point = dict(zip(execution_counters.BUCKET_FIELDS, values))
+    point.update(_rates(values[0], values[1], values[2], values[3]))
+    return point
+
+def _bucket_columns():
+    return [
+        func.sum(getattr(APIExecutionStat, field)) for field in execution_counters.FIELDS
+    ] + [func.max(APIExecutionStat.max_duration_ms)]
+
+async def timeseries(db: AsyncSession, bucket_size: str, points: int,
+               definition_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """按时间桶的执行统计（最近points个桶，没有执行的桶补零）"""
+    step = BUCKET_SIZES[bucket_size]
+    since = bucket_start(datetime.utcnow(), bucket_size) - step * (points - 1)
+    
+    async def load():
+        statement = select(APIExecutionStat.bucket_start, *_bucket_columns()).where(
+            APIExecutionStat.bucket_size == bucket_size,
+            APIExecutionStat.bucket_start >= since
+        )
+        if definition_id is not None:
+            statement = statement.where(APIExecutionStat.api_definition_id == definition_id)
+        return (await db.execute(statement.group_by(APIExecutionStat.bucket_start))).all()
+    
+    rows = await stats_cache.get_or_load(("timeseries", bucket_size, since, definition_id), load)
+    merged = _bucket_values(rows, execution_counters.pending_buckets(bucket_size, since, definition_id), 1)
+    
+    series = []
+    for index in range(points):
+        start = since + step * index
+        values = merged.get(start) or [0] * len(execution_counters.BUCKET_FIELDS)
+        series.append(dict({"bucket_start": start.isoformat()}, **_bucket_point(values)))
+    return series
+
+async def definition_stats(db: AsyncSession, hours: int) -> List[Dict[str, Any]]:
+    """最近hours小时内每个API定义的执行统计（按执行次数降序）"""
+    since = bucket_start(datetime.utcnow(), "hour") - BUCKET_SIZES["hour"] * (hours - 1)
+    
+    async def load():
+        rows = (await db.execute(
+            select(APIExecutionStat.api_definition_id, *_bucket_columns()).where(
+                APIExecutionStat.bucket_size == "hour",
+                APIExecutionStat.bucket_start >= since
+            ).group_by(APIExecutionStat.api_definition_id)
+        )).all()
+        names = dict((await db.execute(select(APIDefinition.id, APIDefinition.name))).all())
+        return rows, names
+    
+    rows, names = await stats_cache.get_or_load(("definitions", since), load)
+    merged = _bucket_values(rows, execution_counters.pending_buckets("hour", since), 0)
+    
+    result = [
+        dict({"api_definition_id": definition_id, "api_name": names.get(definition_id)}, **_bucket_point(values))
+        for definition_id, values in merged.items()
+    ]
+    result.sort(key=lambda item: item["execution_count"], reverse=True)
+    return result
\ No newline at end of file
@@ -1,219 +1,600 @@
-import subprocess
-import requests
-import time
+import asyncio
+import codecs
+import httpx
 import json
+import keyword
 import os
-from typing import Dict, Any, Tuple
+import resource
+import signal
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Any, Tuple, List, Optional, AsyncIterator
 import tempfile
+import time
+from contextlib import contextmanager
+
+import metrics
+from config import settings
+from http_pool import http_pool
+from python_pool import python_pool
+from shell_pool import shell_pool
+from resource_limits import ResourceLimits, ResourceUsage
+from result_store import ExecutionTimeout, OutputBuffer, output_limit, truncate_output
+from templating import ActionTemplate, TemplateError, compile_action, python_literal
+
+# 有界线程池：只用于必须保持同步的操作（如同步数据库会话），避免阻塞事件循环
+_sync_executor = ThreadPoolExecutor(
+    max_workers=settings.SYNC_EXECUTOR_WORKERS,
+    thread_name_prefix="api-sync"
+)
+
+async def run_sync(func, *args, **kwargs):
+    """在有界线程池中执行同步函数"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_sync_executor, partial(func, *args, **kwargs))
+
+def shutdown_sync_executor():
+    """关闭同步线程池"""
+    _sync_executor.shutdown(wait=False)
+
+async def cancel_tasks(tasks: List[asyncio.Task]):
+    """
+    取消后台任务并等待结束
+    asyncio.wait_for在内部操作恰好完成时可能吞掉取消请求（Python 3.11及以下），未结束的任务重复取消
+    """
+    pending = [task for task in tasks if not task.done()]
+    while pending:
+        for task in pending:
+            task.cancel()
+        _, pending = await asyncio.wait(pending, timeout=1)
+
+def execution_timeout(timeout_seconds: Optional[float]) -> float:
+    """定义的执行超时，未设置时使用全局默认值"""
+    return timeout_seconds if timeout_seconds and timeout_seconds > 0 else settings.EXECUTION_TIMEOUT
+
+class ChildProcess:
+    """
+    Shell/Python子进程：独立会话（超时时可以整组终止），exec之前设置资源限制，
+    输出管道接入事件循环，结束时由wait4回收并取得CPU时间和峰值内存
+    （asyncio的子进程接口在内部回收进程，拿不到资源使用，因此直接使用Popen）
+    """
+    
+    def __init__(self, popen: subprocess.Popen, stdout: asyncio.StreamReader,
+                 stderr: Optional[asyncio.StreamReader], usage: Optional[ResourceUsage]):
+        self.popen = popen
+        self.pid = popen.pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self.usage = usage
+        # 子进程由本进程复制而来，wait4的峰值内存至少是本进程启动子进程时的峰值内存
+        self.baseline_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.returncode: Optional[int] = None
+        self._transports: List[asyncio.BaseTransport] = []
+        self._exited: Optional[asyncio.Future] = None
+    
+    @classmethod
+    async def start(cls, args: List[str], shell: bool = False, merge_stderr: bool = False,
+                    limits: Optional[ResourceLimits] = None,
+                    usage: Optional[ResourceUsage] = None) -> "ChildProcess":
+        loop = asyncio.get_running_loop()
+        kind = "shell" if shell else "exec"
+        if limits is not None and limits.enabled:
+            # 资源限制由包装程序设置后再exec目标命令（不使用preexec_fn，保留vfork/posix_spawn的快速路径，多线程时也安全）
+            args = limits.wrap(["/bin/sh", "-c", args[0]] if shell else args)
+            shell = False
+        with metrics.SUBPROCESS_SPAWN.time(kind):
+            popen = subprocess.Popen(
+                args[0] if shell else args,
+                shell=shell,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT if merge_stderr else subprocess.PIPE,
+                start_new_session=True
+            )
+        
+        stdout = asyncio.StreamReader()
+        stderr = None if merge_stderr else asyncio.StreamReader()
+        process = cls(popen, stdout, stderr, usage)
+        for reader, pipe in ((stdout, popen.stdout), (stderr, popen.stderr)):
+            if reader is not None:
+                transport, _ = await loop.connect_read_pipe(
+                    lambda reader=reader: asyncio.StreamReaderProtocol(reader), pipe
+                )
+                process._transports.append(transport)
+        
+        # 在线程中阻塞等待子进程退出（与asyncio默认的子进程监视方式相同）
+        process._exited = loop.create_future()
+        threading.Thread(target=process._reap, args=(loop,), daemon=True).start()
+        return process
+    
+    def _reap(self, loop: asyncio.AbstractEventLoop):
+        _, status, rusage = os.wait4(self.pid, 0)
+        loop.call_soon_threadsafe(self._on_exit, os.waitstatus_to_exitcode(status), rusage)
+    
+    def _on_exit(self, returncode: int, rusage):
+        self.returncode = returncode
+        # 进程已由wait4回收，同步Popen的状态，避免其再次等待
+        self.popen.returncode = returncode
+        if self.usage is not None:
+            # 不超过本进程峰值时无法区分是否为子进程自身的占用，记为空
+            max_rss_kb = rusage.ru_maxrss if rusage.ru_maxrss > self.baseline_rss_kb else None
+            self.usage.record(rusage.ru_utime, rusage.ru_stime, max_rss_kb)
+        if not self._exited.done():
+            self._exited.set_result(returncode)
+    
+    async def wait(self) -> int:
+        return await asyncio.shield(self._exited)
+    
+    async def kill(self):
+        """终止子进程所在的整个进程组（包括shell和脚本启动的孙进程），并回收子进程"""
+        if self.returncode is None:
+            try:
+                os.killpg(self.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        await self.wait()
+    
+    def close(self):
+        for transport in self._transports:
+            transport.close()
+
+async def _run_process(args: List[str], timeout: float, shell: bool = False,
+                       max_output_bytes: Optional[int] = None,
+                       limits: Optional[ResourceLimits] = None,
+                       usage: Optional[ResourceUsage] = None) -> Tuple[int, str, str]:
+    """
+    异步执行子进程（独立会话，超时时终止整个进程组），标准输出和标准错误各自最多保留max_output_bytes字节（保留开头和结尾）
+    limits为子进程的资源限制，usage用于记录子进程的资源使用
+    返回: (返回码, 标准输出, 标准错误)，超时抛出 ExecutionTimeout（带终止前的部分输出）
+    """
+    process = await ChildProcess.start(args, shell=shell, limits=limits, usage=usage)
+    
+    limit = output_limit(max_output_bytes)
+    stdout, stderr = OutputBuffer(limit), OutputBuffer(limit)
+    drained = asyncio.gather(
+        _drain(process.stdout, stdout),
+        _drain(process.stderr, stderr),
+        process.wait()
+    )
+    try:
+        await asyncio.wait_for(drained, timeout=timeout)
+    except asyncio.TimeoutError:
+        # 超时时终止整个进程组，读取管道中剩余的输出后连同已读取的部分一起返回
+        await process.kill()
+        try:
+            await asyncio.wait_for(asyncio.gather(_drain(process.stdout, stdout), _drain(process.stderr, stderr)), timeout=1)
+        except Exception:
+            pass
+        raise ExecutionTimeout(stdout.getvalue(), stderr.getvalue())
+    except asyncio.CancelledError:
+        # 请求被取消时同样终止整个进程组，避免遗留孙进程和僵尸进程
+        await process.kill()
+        raise
+    finally:
+        process.close()
+        # 超时或取消时wait_for不会读取gather的结果（取消的gather以CancelledError结束），这里读取一次，避免未读取异常的警告
+        if drained.done() and not drained.cancelled():
+            drained.exception()
+    
+    return process.returncode, stdout.getvalue(), stderr.getvalue()
+
+async def _drain(stream: asyncio.StreamReader, buffer: OutputBuffer):
+    """分块读取输出流到有上限的缓冲中"""
+    while True:
+        chunk = await stream.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer.append(chunk)
+
+async def _stream_process(args: List[str], timeout: float, state: Dict[str, Any],
+                          shell: bool = False, limits: Optional[ResourceLimits] = None,
+                          usage: Optional[ResourceUsage] = None) -> AsyncIterator[str]:
+    """
+    异步执行子进程（独立会话）并逐行产出输出（标准错误合并到标准输出）
+    结束后返回码写入state["returncode"]，超时抛出 asyncio.TimeoutError
+    """
+    process = await ChildProcess.start(args, shell=shell, merge_stderr=True, limits=limits, usage=usage)
+    
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    try:
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            chunk = await asyncio.wait_for(process.stdout.read(STREAM_CHUNK_SIZE), timeout=remaining)
+            if not chunk:
+                break
+            pending += decoder.decode(chunk)
+            lines = pending.splitlines(keepends=True)
+            pending = lines.pop() if lines and not lines[-1].endswith(("\n", "\r")) else ""
+            for line in lines:
+                yield line
+            # 超长的单行不再等待换行，直接产出
+            if len(pending) > STREAM_CHUNK_SIZE:
+                yield pending
+                pending = ""
+        
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            yield pending
+        state["returncode"] = await asyncio.wait_for(process.wait(), timeout=max(deadline - loop.time(), 0.1))
+    finally:
+        # 超时、客户端断开或其它异常时终止整个进程组；等待回收时再次被取消也要关闭管道
+        try:
+            if process.returncode is None:
+                await process.kill()
+        finally:
+            process.close()
+
+def _parse_timeout(value: Any) -> Optional[float]:
+    """解析配置中的timeout字段，无效时返回None（使用默认超时）"""
+    try:
+        timeout = float(value)
+    except (TypeError, ValueError):
+        return None
+    return timeout if timeout > 0 else None
+
+# 流式读取子进程输出的块大小
+STREAM_CHUNK_SIZE = 64 * 1024
 
 class APIExecutor:
     """API执行器，支持多种操作类型"""
     
     @staticmethod
-    def execute_action(action_type: str, action_content: str, parameters: Dict[str, Any]) -> Tuple[str, bool, str]:
+    async def execute_action(action_type: str, action_content: str, parameters: Dict[str, Any],
+                             template: Optional[ActionTemplate] = None,
+                             max_output_bytes: Optional[int] = None,
+                             timeout_seconds: Optional[float] = None,
+                             limits: Optional[ResourceLimits] = None,
+                             usage: Optional[ResourceUsage] = None) -> Tuple[str, bool, str]:
         """
         执行操作
+        template为预编译的操作模板（通常来自定义缓存），为空时现场编译
+        max_output_bytes为结果上限（字节），超出时保留开头和结尾，为空时使用全局默认值
+        timeout_seconds为执行超时（秒），为空时使用全局默认值（HTTP/Webhook配置中的timeout优先）
+        limits为Shell/Python子进程的资源限制，usage用于记录子进程的资源使用（CPU时间、峰值内存）
         返回: (结果, 是否成功, 错误信息)
         """
+        if action_type not in ("shell", "http", "python", "webhook"):
+            return "", False, f"不支持的操作类型: {action_type}"
+        
         try:
-            if action_type == "shell":
-                return APIExecutor._execute_shell(action_content, parameters)
-            elif action_type == "http":
-                return APIExecutor._execute_http(action_content, parameters)
-            elif action_type == "python":
-                return APIExecutor._execute_python(action_content, parameters)
-            elif action_type == "webhook":
-                return APIExecutor._execute_webhook(action_content, parameters)
-            else:
-                return "", False, f"不支持的操作类型: {action_type}"
+            if template is None:
+                template = compile_action(action_type, action_content)
+            values = template.validate(parameters)
+        except TemplateError as e:
+            return "", False, str(e)
+        
+        limit = output_limit(max_output_bytes)
+        run_start = time.perf_counter()
+        try:
+            with metrics.IN_FLIGHT.track(action_type):
+                if action_type == "shell":
+                    return await APIExecutor._execute_shell(template, values, limit, timeout_seconds, limits, usage)
+                elif action_type == "http":
+                    return await APIExecutor._execute_http(template, values, limit, timeout_seconds)
+                elif action_type == "python":
+                    return await APIExecutor._execute_python(template, values, limit, timeout_seconds, limits, usage)
+                else:
+                    return await APIExecutor._execute_webhook(template, values, limit, timeout_seconds)
         except Exception as e:
             return "", False, f"执行错误: {str(e)}"
+        finally:
+            metrics.observe_phase("run", run_start)
     
     @staticmethod
-    def _execute_shell(command: str, parameters: Dict[str, Any]) -> Tuple[str, bool, str]:
-        """执行Shell命令"""
+    async def stream_action(action_type: str, action_content: str, parameters: Dict[str, Any],
+                            template: Optional[ActionTemplate] = None,
+                            max_retained_bytes: int = None,
+                            timeout_seconds: Optional[float] = None,
+                            limits: Optional[ResourceLimits] = None,
+                            usage: Optional[ResourceUsage] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        流式执行操作：shell和python逐行产出输出，其它类型执行完成后一次产出
+        产出: ("output", 输出文本)，最后产出 ("done", (保留的结果, 是否成功, 错误信息))
+        保留的结果最多max_retained_bytes字节（保留开头和结尾），不影响已产出的输出
+        shell和python的超时为timeout_seconds，未设置时使用STREAM_TIMEOUT
+        """
+        if action_type not in ("shell", "python"):
+            result, success, error_msg = await APIExecutor.execute_action(
+                action_type, action_content, parameters, template=template,
+                max_output_bytes=max_retained_bytes, timeout_seconds=timeout_seconds,
+                limits=limits, usage=usage
+            )
+            if result:
+                yield "output", result
+            yield "done", (result, success, error_msg)
+            return
+        
         try:
-            # 替换参数占位符
-            for key, value in parameters.items():
-                command = command.replace(f"{{{key}}}", str(value))
-            
-            # 安全检查 - 防止危险命令
-            dangerous_commands = ['rm -rf', 'format', 'del', 'sudo rm', 'chmod 777']
-            for dangerous in dangerous_commands:
-                if dangerous in command.lower():
-                    return "", False, f"检测到危险命令，执行被阻止: {dangerous}"
-            
-            # 检查是否是多行命令
-            if '\n' in command.strip():
-                # 多行命令：创建临时脚本文件执行
-                with tempfile.NamedTemporaryFile(mode='w', suffix='.sh', delete=False) as f:
-                    f.write("#!/bin/bash\n")
-                    f.write("set -e\n")  # 遇到错误就退出
-                    f.write(command)
-                    temp_script = f.name
-                
-                try:
-                    # 给脚本添加执行权限
-                    os.chmod(temp_script, 0o755)
-                    
-                    # 执行脚本
-                    result = subprocess.run(
-                        ["/bin/bash", temp_script],
-                        capture_output=True,
-                        text=True,
-                        timeout=30
-                    )
-                finally:
-                    # 清理临时文件
-                    os.unlink(temp_script)
+            if template is None:
+                template = compile_action(action_type, action_content)
+            values = template.validate(parameters)
+        except TemplateError as e:
+            yield "done", ("", False, str(e))
+            return
+        
+        buffer = OutputBuffer(max_retained_bytes or settings.STREAM_MAX_RETAINED_BYTES)
+        timeout = timeout_seconds if timeout_seconds and timeout_seconds > 0 else settings.STREAM_TIMEOUT
+        state: Dict[str, Any] = {}
+        label = "命令" if action_type == "shell" else "Python代码"
+        try:
+            if action_type == "shell":
+                command, error_msg = APIExecutor._render_shell(template, values)
+                if error_msg:
+                    yield "done", ("", False, error_msg)
+                    return
+                with APIExecutor._shell_invocation(command) as (args, shell):
+                    async for line in _stream_process(args, timeout, state, shell=shell, limits=limits, usage=usage):
+                        buffer.append(line)
+                        yield "output", line
             else:
-                # 单行命令：直接执行
-                result = subprocess.run(
-                    command, 
-                    shell=True, 
-                    capture_output=True, 
-                    text=True, 
-                    timeout=30
+                invalid = [key for key in values if not key.isidentifier() or keyword.iskeyword(key)]
+                if invalid:
+                    yield "done", ("", False, f"无效的参数名: {', '.join(invalid)}")
+                    return
+                # 流式执行需要逐行读取输出，使用无缓冲的独立解释器
+                with APIExecutor._python_script(template.parts["code"], values) as temp_file:
+                    async for line in _stream_process(["python", "-u", temp_file], timeout, state, limits=limits, usage=usage):
+                        buffer.append(line)
+                        yield "output", line
+        except asyncio.TimeoutError:
+            yield "done", (buffer.getvalue(), False, f"{label}执行超时")
+            return
+        except Exception as e:
+            yield "done", (buffer.getvalue(), False, f"执行错误: {str(e)}")
+            return
+        
+        returncode = state.get("returncode")
+        success = returncode == 0
+        error_msg = "" if success else f"{label}执行失败，返回码: {returncode}"
+        yield "done", (buffer.getvalue(), success, error_msg)
+    
+    @staticmethod
+    def _render_shell(template: ActionTemplate, values: Dict[str, str]) -> Tuple[str, str]:
+        """
+        渲染Shell命令并做安全检查
+        返回: (命令, 错误信息)
+        """
+        # 单次渲染参数占位符（按引号上下文转义）
+        try:
+            command = template.parts["command"].render(values)
+        except TemplateError as e:
+            return "", str(e)
+        
+        # 安全检查 - 防止危险命令
+        dangerous_commands = ['rm -rf', 'format', 'del', 'sudo rm', 'chmod 777']
+        for dangerous in dangerous_commands:
+            if dangerous in command.lower():
+                return command, f"检测到危险命令，执行被阻止: {dangerous}"
+        
+        return command, ""
+    
+    @staticmethod
+    @contextmanager
+    def _shell_invocation(command: str):
+        """
+        准备Shell命令的执行方式
+        返回: (参数列表, 是否通过shell执行)
+        """
+        # 检查是否是多行命令
+        if '\n' in command.strip():
+            # 多行命令：创建临时脚本文件执行
+            with tempfile.NamedTemporaryFile(mode='w', suffix='.sh', delete=False) as f:
+                f.write("#!/bin/bash\n")
+                f.write("set -e\n")  # 遇到错误就退出
+                f.write(command)
+                temp_script = f.name
+            
+            try:
+                # 给脚本添加执行权限
+                os.chmod(temp_script, 0o755)
+                yield ["/bin/bash", temp_script], False
+            finally:
+                # 清理临时文件
+                os.unlink(temp_script)
+        else:
+            # 单行命令：直接执行
+            yield [command], True
+    
+    @staticmethod
+    async def _execute_shell(template: ActionTemplate, values: Dict[str, str],
+                             limit: int, timeout_seconds: Optional[float] = None,
+                             limits: Optional[ResourceLimits] = None,
+                             usage: Optional[ResourceUsage] = None) -> Tuple[str, bool, str]:
+        """执行Shell命令（超时时终止命令启动的所有进程，返回终止前的输出）"""
+        timeout = execution_timeout(timeout_seconds)
+        try:
+            with metrics.EXECUTE_PHASE_DURATION.time("render"):
+                command, error_msg = APIExecutor._render_shell(template, values)
+            if error_msg:
+                return "", False, error_msg
+            
+            if shell_pool.enabled and shell_pool.supports(command) and not (limits and limits.enabled):
+                # 常驻bash工作进程执行，不启动新的shell、不写临时脚本
+                returncode, stdout, stderr = await shell_pool.execute(
+                    command, timeout=timeout, max_output_bytes=limit, usage=usage
                 )
+            else:
+                # 设置了资源限制时在独立进程中执行，限制只作用于该命令
+                with APIExecutor._shell_invocation(command) as (args, shell):
+                    returncode, stdout, stderr = await _run_process(
+                        args, timeout=timeout, shell=shell, max_output_bytes=limit,
+                        limits=limits, usage=usage
+                    )
             
-            output = result.stdout + result.stderr
-            success = result.returncode == 0
-            error_msg = "" if success else f"命令执行失败，返回码: {result.returncode}"
+            output = truncate_output(stdout + stderr, limit)
+            success = returncode == 0
+            error_msg = "" if success else f"命令执行失败，返回码: {returncode}"
             
             return output, success, error_msg
-            
-        except subprocess.TimeoutExpired:
-            return "", False, "命令执行超时"
+        
+        except ExecutionTimeout as e:
+            return truncate_output(e.stdout + e.stderr, limit), False, f"命令执行超时（{timeout:g}秒）"
+        except asyncio.TimeoutError:
+            return "", False, f"命令执行超时（{timeout:g}秒）"
         except Exception as e:
             return "", False, f"Shell执行错误: {str(e)}"
     
     @staticmethod
-    def _execute_http(config: str, parameters: Dict[str, Any]) -> Tuple[str, bool, str]:
+    async def _execute_http(template: ActionTemplate, values: Dict[str, str],
+                            limit: int, timeout_seconds: Optional[float] = None) -> Tuple[str, bool, str]:
         """执行HTTP请求"""
         try:
-            # 解析HTTP配置
-            http_config = json.loads(config)
+            # 预编译的HTTP配置
+            http_config = template.parts["config"]
             
-            url = http_config.get("url", "")
             method = http_config.get("method", "GET").upper()
             headers = http_config.get("headers", {})
-            data = http_config.get("data", {})
-            
-            # 替换参数占位符
-            for key, value in parameters.items():
-                url = url.replace(f"{{{key}}}", str(value))
-                if isinstance(data, dict):
-                    for data_key, data_value in data.items():
-                        if isinstance(data_value, str):
-                            data[data_key] = data_value.replace(f"{{{key}}}", str(value))
-            
-            # 发送请求
-            response = requests.request(
-                method=method,
-                url=url,
+            timeout = _parse_timeout(http_config.get("timeout")) or timeout_seconds
+            
+            # 单次渲染参数占位符（URL编码、JSON结构内替换）
+            with metrics.EXECUTE_PHASE_DURATION.time("render"):
+                url = template.parts["url"].render(values)
+                data = template.parts["data"].render(values)
+            
+            # 发送请求（使用共享连接池，响应体最多保留limit字节）
+            response, body = await http_pool.request_text(
+                method,
+                url,
+                max_body_bytes=limit,
+                timeout=timeout,
                 headers=headers,
                 json=data if method in ["POST", "PUT", "PATCH"] else None,
-                params=data if method == "GET" else None,
-                timeout=30
+                params=data if method == "GET" else None
             )
             
             result = {
                 "status_code": response.status_code,
                 "headers": dict(response.headers),
-                "body": response.text
+                "body": body
             }
             
             success = 200 <= response.status_code < 300
             error_msg = "" if success else f"HTTP请求失败，状态码: {response.status_code}"
             
             return json.dumps(result, ensure_ascii=False, indent=2), success, error_msg
-            
-        except json.JSONDecodeError:
-            return "", False, "HTTP配置格式错误，请使用有效的JSON格式"
-        except requests.RequestException as e:
+        
+        except httpx.HTTPError as e:
             return "", False, f"HTTP请求错误: {str(e)}"
         except Exception as e:
             return "", False, f"HTTP执行错误: {str(e)}"
     
     @staticmethod
-    def _execute_python(code: str, parameters: Dict[str, Any]) -> Tuple[str, bool, str]:
-        """执行Python代码"""
+    async def _execute_python(template: ActionTemplate, values: Dict[str, str],
+                              limit: int, timeout_seconds: Optional[float] = None,
+                              limits: Optional[ResourceLimits] = None,
+                              usage: Optional[ResourceUsage] = None) -> Tuple[str, bool, str]:
+        """执行Python代码（超时时终止代码启动的所有进程，返回终止前的输出）"""
+        timeout = execution_timeout(timeout_seconds)
         try:
-            # 创建临时文件
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-                # 在代码前添加参数定义
-                param_code = ""
-                for key, value in parameters.items():
-                    if isinstance(value, str):
-                        param_code += f"{key} = '{value}'\n"
-                    else:
-                        param_code += f"{key} = {value}\n"
-                
-                f.write(param_code + "\n" + code)
-                temp_file = f.name
+            code = template.parts["code"]
+            invalid = [key for key in values if not key.isidentifier() or keyword.iskeyword(key)]
+            if invalid:
+                return "", False, f"无效的参数名: {', '.join(invalid)}"
             
-            try:
-                # 执行Python代码
-                result = subprocess.run(
-                    ["python", temp_file],
-                    capture_output=True,
-                    text=True,
-                    timeout=30
+            if python_pool.enabled and not (limits and limits.enabled):
+                # 预热工作进程执行，参数作为数据传入
+                returncode, stdout, stderr = await python_pool.execute(
+                    code, values, timeout=timeout, key=template.parts["code_key"], max_output_bytes=limit,
+                    usage=usage
                 )
-                
-                output = result.stdout + result.stderr
-                success = result.returncode == 0
-                error_msg = "" if success else f"Python代码执行失败，返回码: {result.returncode}"
-                
-                return output, success, error_msg
-                
-            finally:
-                # 清理临时文件
-                os.unlink(temp_file)
-                
-        except subprocess.TimeoutExpired:
-            return "", False, "Python代码执行超时"
+            else:
+                # 未启用工作进程池或设置了资源限制时，在独立的解释器中执行
+                returncode, stdout, stderr = await APIExecutor._run_python_file(
+                    code, values, limit, timeout, limits, usage
+                )
+            
+            output = truncate_output(stdout + stderr, limit)
+            success = returncode == 0
+            error_msg = "" if success else f"Python代码执行失败，返回码: {returncode}"
+            
+            return output, success, error_msg
+        
+        except ExecutionTimeout as e:
+            return truncate_output(e.stdout + e.stderr, limit), False, f"Python代码执行超时（{timeout:g}秒）"
+        except asyncio.TimeoutError:
+            return "", False, f"Python代码执行超时（{timeout:g}秒）"
         except Exception as e:
             return "", False, f"Python执行错误: {str(e)}"
     
     @staticmethod
-    def _execute_webhook(config: str, parameters: Dict[str, Any]) -> Tuple[str, bool, str]:
+    @contextmanager
+    def _python_script(code: str, values: Dict[str, str]):
+        """将参数定义和代码写入临时文件，返回文件路径"""
+        # 创建临时文件
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
+            # 在代码前添加参数定义（值转为Python字面量）
+            param_code = ""
+            for key, value in values.items():
+                param_code += f"{key} = {python_literal(value)}\n"
+            
+            f.write(param_code + "\n" + code)
+            temp_file = f.name
+        
+        try:
+            yield temp_file
+        finally:
+            # 清理临时文件
+            os.unlink(temp_file)
+    
+    @staticmethod
+    async def _run_python_file(code: str, values: Dict[str, str], limit: int, timeout: float,
+                               limits: Optional[ResourceLimits] = None,
+                               usage: Optional[ResourceUsage] = None) -> Tuple[int, str, str]:
+        """写入临时文件并启动新的解释器执行"""
+        with APIExecutor._python_script(code, values) as temp_file:
+            # 执行Python代码
+            return await _run_process(
+                ["python", temp_file],
+                timeout=timeout,
+                max_output_bytes=limit,
+                limits=limits,
+                usage=usage
+            )
+    
+    @staticmethod
+    async def _execute_webhook(template: ActionTemplate, values: Dict[str, str],
+                               limit: int, timeout_seconds: Optional[float] = None) -> Tuple[str, bool, str]:
         """执行Webhook调用"""
         try:
-            # 解析Webhook配置
-            webhook_config = json.loads(config)
+            # 预编译的Webhook配置
+            webhook_config = template.parts["config"]
             
-            url = webhook_config.get("url", "")
-            payload = webhook_config.get("payload", {})
             headers = webhook_config.get("headers", {"Content-Type": "application/json"})
+            timeout = _parse_timeout(webhook_config.get("timeout")) or timeout_seconds
             
-            # 替换参数占位符
-            for key, value in parameters.items():
-                url = url.replace(f"{{{key}}}", str(value))
-                payload = json.loads(json.dumps(payload).replace(f"{{{key}}}", str(value)))
+            # 单次渲染参数占位符（JSON结构内替换，序列化时自动转义）
+            with metrics.EXECUTE_PHASE_DURATION.time("render"):
+                url = template.parts["url"].render(values)
+                payload = template.parts["payload"].render(values)
             
-            # 发送Webhook
-            response = requests.post(
-                url=url,
+            # 发送Webhook（使用共享连接池，响应体最多保留limit字节）
+            response, body = await http_pool.request_text(
+                "POST",
+                url,
+                max_body_bytes=limit,
+                timeout=timeout,
                 json=payload,
-                headers=headers,
-                timeout=30
+                headers=headers
             )
             
             result = {
                 "webhook_url": url,
                 "status_code": response.status_code,
-                "response": response.text
+                "response": body
             }
             
             success = 200 <= response.status_code < 300
             error_msg = "" if success else f"Webhook调用失败，状态码: {response.status_code}"
             
             return json.dumps(result, ensure_ascii=False, indent=2), success, error_msg
-            
-        except json.JSONDecodeError:
-            return "", False, "Webhook配置格式错误，请使用有效的JSON格式"
-        except requests.RequestException as e:
+        
+        except httpx.HTTPError as e:
             return "", False, f"Webhook请求错误: {str(e)}"
         except Exception as e:
-            return "", False, f"Webhook执行错误: {str(e)}" 
\ No newline at end of file
+            return "", False, f"Webhook执行错误: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,132 @@
+import httpx
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlsplit
+
+import metrics
+from config import settings
+from result_store import OutputBuffer
+
+class HTTPClientPool:
+    """共享的HTTP连接池，按主机复用keep-alive连接，供http和webhook操作使用"""
+    
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._http2 = False
+        self._lock = threading.Lock()
+        # 按主机统计：请求数、新建连接数（只保留最近请求的HTTP_POOL_STATS_MAX_HOSTS个主机）
+        self._host_stats: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+    
+    def _create_client(self) -> httpx.AsyncClient:
+        """创建底层客户端"""
+        http2 = settings.HTTP_POOL_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("⚠️ 未安装h2，HTTP/2已禁用 (pip install httpx[http2])")
+                http2 = False
+        self._http2 = http2
+        
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=settings.HTTP_POOL_KEEPALIVE_EXPIRY
+        )
+        return httpx.AsyncClient(
+            limits=limits,
+            http2=http2,
+            timeout=settings.HTTP_DEFAULT_TIMEOUT,
+            # 与原先使用的requests一致，自动跟随重定向
+            follow_redirects=True
+        )
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """获取共享客户端（首次使用时创建）"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+    
+    def _record(self, host: str, field: str):
+        """记录主机统计"""
+        with self._lock:
+            stats = self._host_stats.get(host)
+            if stats is None:
+                stats = self._host_stats[host] = {"requests": 0, "new_connections": 0}
+                while len(self._host_stats) > settings.HTTP_POOL_STATS_MAX_HOSTS:
+                    self._host_stats.popitem(last=False)
+            else:
+                self._host_stats.move_to_end(host)
+            stats[field] += 1
+    
+    def _options(self, url: str, timeout: Optional[float]) -> Dict[str, Any]:
+        """请求的公共参数：超时和连接统计"""
+        host = urlsplit(url).netloc or "unknown"
+        
+        async def trace(event_name: str, info: Dict[str, Any]):
+            # 只有建立新TCP连接时才会触发该事件，复用连接不会触发
+            if event_name == "connection.connect_tcp.complete":
+                self._record(host, "new_connections")
+        
+        self._record(host, "requests")
+        return {
+            "timeout": timeout if timeout is not None else settings.HTTP_DEFAULT_TIMEOUT,
+            "extensions": {"trace": trace}
+        }
+    
+    async def request(self, method: str, url: str, timeout: Optional[float] = None, **kwargs) -> httpx.Response:
+        """发送请求，timeout为空时使用默认超时"""
+        with metrics.HTTP_IN_FLIGHT.track():
+            return await self.client.request(method, url, **self._options(url, timeout), **kwargs)
+    
+    async def request_text(self, method: str, url: str, max_body_bytes: int,
+                           timeout: Optional[float] = None, **kwargs) -> Tuple[httpx.Response, str]:
+        """
+        发送请求并分块读取响应体，最多保留max_body_bytes字节（保留开头和结尾）
+        返回: (响应, 响应体文本)
+        """
+        with metrics.HTTP_IN_FLIGHT.track():
+            async with self.client.stream(method, url, **self._options(url, timeout), **kwargs) as response:
+                buffer = OutputBuffer(max_body_bytes)
+                async for chunk in response.aiter_bytes():
+                    buffer.append(chunk)
+        return response, buffer.getvalue(response.encoding or "utf-8")
+    
+    def stats(self) -> Dict[str, Any]:
+        """连接池统计信息"""
+        with self._lock:
+            hosts = {}
+            total_requests = 0
+            total_connections = 0
+            for host, item in self._host_stats.items():
+                requests_count = item["requests"]
+                connections = item["new_connections"]
+                total_requests += requests_count
+                total_connections += connections
+                hosts[host] = {
+                    "requests": requests_count,
+                    "new_connections": connections,
+                    "reuse_rate": round((1 - connections / requests_count) * 100, 2) if requests_count else 0
+                }
+        
+        return {
+            "http2": self._http2,
+            "max_connections": settings.HTTP_POOL_MAX_CONNECTIONS,
+            "max_keepalive_connections": settings.HTTP_POOL_MAX_KEEPALIVE,
+            "keepalive_expiry": settings.HTTP_POOL_KEEPALIVE_EXPIRY,
+            "total_requests": total_requests,
+            "total_new_connections": total_connections,
+            "reuse_rate": round((1 - total_connections / total_requests) * 100, 2) if total_requests else 0,
+            "hosts": hosts
+        }
+    
+    async def close(self):
+        """关闭连接池"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+# 全局连接池实例
+http_pool = HTTPClientPool()
\ No newline at end of file
@@ -0,0 +1,268 @@
+import asyncio
+import itertools
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import or_, update
+
+from admission import admission
+from config import settings
+from database import SessionLocal, APIExecution
+from definition_cache import CachedDefinition
+from execution_counters import execution_counters
+from executor import APIExecutor, cancel_tasks, run_sync
+import metrics
+from resource_limits import ResourceUsage
+from result_store import pack_result
+
+# 任务状态：排队中、执行中、成功、失败
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_FINISHED = ("success", "error")
+# 长轮询时检查数据库的间隔（秒），用于其它进程执行的任务
+POLL_INTERVAL = 0.5
+# 超过多少个心跳间隔没有心跳的未完成任务视为中断
+STALE_HEARTBEATS = 3
+
+class JobQueueFull(Exception):
+    """任务队列已满"""
+
+class JobQueue:
+    """
+    异步执行任务队列
+    任务记录保存在api_executions表中（id即任务ID，status表示任务状态），
+    按定义的优先级排队，由固定数量的后台工作协程执行；
+    队列只在进程内存中，任务记录带有所在进程和心跳时间，进程崩溃后遗留的未完成任务由其它进程或重启后的进程标记为失败
+    """
+    
+    def __init__(self, workers: int, max_size: int, heartbeat_interval: float):
+        self.workers = workers
+        self.max_size = max_size
+        self.heartbeat_interval = heartbeat_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._sequence = itertools.count()
+        # 本进程中任务完成的通知（长轮询等待用）
+        self._events: Dict[int, asyncio.Event] = {}
+        self._running: Dict[int, Dict[str, Any]] = {}
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._recovered = 0
+    
+    @property
+    def queue(self) -> asyncio.PriorityQueue:
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue(maxsize=self.max_size)
+        return self._queue
+    
+    def start(self):
+        """启动工作协程"""
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._worker()))
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+    
+    async def stop(self):
+        """停止工作协程，未完成的任务标记为失败"""
+        await cancel_tasks(self._tasks + ([self._heartbeat_task] if self._heartbeat_task else []))
+        self._tasks = []
+        self._heartbeat_task = None
+        
+        interrupted = list(self._running.values())
+        while not self.queue.empty():
+            interrupted.append(self.queue.get_nowait()[2])
+        self._running.clear()
+        for job in interrupted:
+            await self._finish(job, {
+                "status": "error",
+                "error_message": "服务关闭，任务被中断",
+                "duration_ms": 0
+            })
+    
+    async def submit(self, api_def: CachedDefinition, parameters: Dict[str, Any],
+                     request_ip: str) -> int:
+        """创建任务记录并加入队列，返回任务ID；队列已满时抛出JobQueueFull"""
+        if self.queue.full():
+            raise JobQueueFull()
+        
+        job_id = await run_sync(self._insert_job, {
+            "api_definition_id": api_def.id,
+            "api_key": api_def.api_key,
+            "parameters": parameters,
+            "status": JOB_QUEUED,
+            "execution_time": datetime.utcnow(),
+            "request_ip": request_ip,
+            "job_owner": self.owner,
+            "job_heartbeat": datetime.utcnow()
+        })
+        job = {"id": job_id, "definition": api_def, "parameters": parameters}
+        self._events[job_id] = asyncio.Event()
+        try:
+            # 优先级数值越大越先执行，相同优先级按提交顺序
+            self.queue.put_nowait((-(api_def.job_priority or 0), next(self._sequence), job))
+        except asyncio.QueueFull:
+            await self._finish(job, {"status": "error", "error_message": "任务队列已满", "duration_ms": 0})
+            raise JobQueueFull()
+        
+        self._submitted += 1
+        return job_id
+    
+    async def wait(self, job_id: int, timeout: float) -> bool:
+        """等待本进程中的任务完成，返回是否已完成（其它进程的任务等待一个轮询间隔）"""
+        event = self._events.get(job_id)
+        try:
+            if event is None:
+                await asyncio.sleep(min(timeout, POLL_INTERVAL))
+                return False
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+    
+    def stats(self) -> Dict[str, Any]:
+        """队列统计信息"""
+        return {
+            "workers": self.workers,
+            "queued": self.queue.qsize(),
+            "queue_capacity": self.max_size,
+            "running": len(self._running),
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "failed": self._failed,
+            "recovered": self._recovered
+        }
+    
+    async def _heartbeat(self):
+        """定期刷新本进程任务的心跳，并把其它进程遗留的中断任务标记为失败（启动时立即检查一次）"""
+        while True:
+            try:
+                recovered = await run_sync(self._beat_and_recover, self.owner, self.heartbeat_interval * STALE_HEARTBEATS)
+                if recovered:
+                    self._recovered += recovered
+                    print(f"⚠️ {recovered} 个异步任务所在的进程已退出，已标记为失败")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"✗ 刷新异步任务心跳失败: {e}")
+            await asyncio.sleep(self.heartbeat_interval)
+    
+    async def _worker(self):
+        while True:
+            _, _, job = await self.queue.get()
+            self._running[job["id"]] = job
+            try:
+                await self._execute(job)
+            except Exception as e:
+                print(f"✗ 执行任务 {job['id']} 失败: {e}")
+            # 被取消时保留在执行中列表，由stop()标记为中断
+            self._running.pop(job["id"], None)
+    
+    async def _execute(self, job: Dict[str, Any]):
+        api_def: CachedDefinition = job["definition"]
+        await run_sync(self._update_job, job["id"], {"status": JOB_RUNNING})
+        
+        start_time = time.time()
+        usage = ResourceUsage()
+        try:
+            # 任务已在队列中排过队，这里只等待并发名额，不限制排队时间
+            async with admission.slot(api_def, wait=True):
+                result, success, error_msg = await APIExecutor.execute_action(
+                    api_def.action_type,
+                    api_def.action_content,
+                    job["parameters"],
+                    template=api_def.template,
+                    max_output_bytes=api_def.max_output_bytes,
+                    timeout_seconds=api_def.timeout_seconds,
+                    limits=api_def.limits,
+                    usage=usage
+                )
+        except Exception as e:
+            result, success, error_msg = "", False, f"执行错误: {str(e)}"
+        
+        duration_ms = int((time.time() - start_time) * 1000)
+        execution_counters.record(api_def.id, success, duration_ms)
+        metrics.record_execution(api_def.action_type, api_def.id, success)
+        await self._finish(job, {
+            "result": result,
+            "status": "success" if success else "error",
+            "error_message": error_msg,
+            "duration_ms": duration_ms,
+            **usage.fields()
+        })
+    
+    async def _finish(self, job: Dict[str, Any], fields: Dict[str, Any]):
+        """写入任务结果并通知等待者"""
+        try:
+            await run_sync(self._update_job, job["id"], pack_result(fields))
+        finally:
+            if fields["status"] == "success":
+                self._completed += 1
+            else:
+                self._failed += 1
+            event = self._events.pop(job["id"], None)
+            if event is not None:
+                event.set()
+    
+    @staticmethod
+    def _insert_job(record: Dict[str, Any]) -> int:
+        db = SessionLocal()
+        try:
+            execution = APIExecution(**record)
+            db.add(execution)
+            db.commit()
+            return execution.id
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _beat_and_recover(owner: str, stale_after: float) -> int:
+        """刷新本进程未完成任务的心跳，返回标记为失败的中断任务数"""
+        now = datetime.utcnow()
+        unfinished = APIExecution.status.in_((JOB_QUEUED, JOB_RUNNING))
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(APIExecution)
+                .where(unfinished, APIExecution.job_owner == owner)
+                .values(job_heartbeat=now)
+            )
+            # 旧版本创建的任务没有心跳，按提交时间判断
+            cutoff = now - timedelta(seconds=stale_after)
+            recovered = db.execute(
+                update(APIExecution)
+                .where(
+                    unfinished,
+                    or_(APIExecution.job_owner.is_(None), APIExecution.job_owner != owner),
+                    or_(
+                        APIExecution.job_heartbeat < cutoff,
+                        APIExecution.job_heartbeat.is_(None) & (APIExecution.execution_time < cutoff)
+                    )
+                )
+                .values(status="error", error_message="任务所在的进程已退出，任务被中断", duration_ms=0)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+            return recovered
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _update_job(job_id: int, fields: Dict[str, Any]):
+        db = SessionLocal()
+        try:
+            db.execute(update(APIExecution).where(APIExecution.id == job_id).values(**fields))
+            db.commit()
+        finally:
+            db.close()
+
+# 全局任务队列
+job_queue = JobQueue(workers=settings.JOB_WORKERS, max_size=settings.JOB_QUEUE_SIZE,
+                     heartbeat_interval=settings.JOB_HEARTBEAT_INTERVAL)
\ No newline at end of file
@@ -0,0 +1,332 @@
+import asyncio
+import contextlib
+import fcntl
+import itertools
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from config import settings
+from database import SessionLocal, APIExecution
+from executor import run_sync
+from result_store import pack_result
+
+# 写入数据库的字段（id由数据库生成）
+LOG_COLUMNS = [column.name for column in APIExecution.__table__.columns if column.name != "id"]
+
+# 停止信号：后台任务取到后写完当前批次并退出
+_STOP = object()
+
+class ExecutionLogWriter:
+    """
+    异步批量执行日志写入器
+    日志先进入内存队列，按数量或时间阈值批量写入数据库；
+    队列满时按策略丢弃或溢写到本地文件，服务关闭时写完剩余日志
+    """
+    
+    def __init__(self, batch_size: int, flush_interval: float, queue_size: int,
+                 overflow_policy: str, spill_path: str, spill_max_bytes: int,
+                 put_timeout: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.spill_path = spill_path
+        self.spill_max_bytes = spill_max_bytes
+        self.put_timeout = put_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._spill_lock = threading.Lock()
+        # 执行中的记录只保存在内存中，完成后才写入数据库
+        self._running: Dict[int, Dict[str, Any]] = {}
+        self._running_ids = itertools.count(1)
+        # 不经过队列直接写入的后台任务，关闭时等待完成
+        self._direct_flushes = set()
+        # 已接收但尚未写入数据库的记录（按状态计数）
+        self._pending = Counter()
+        self._written = 0
+        self._dropped = 0
+        self._spilled = 0
+        self._failed_batches = 0
+    
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+        return self._queue
+    
+    def start(self):
+        """启动后台写入任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """
+        停止后台任务并写入队列中剩余的日志
+        通过队列发送停止信号而不是直接取消，后台任务正在凑批的记录也会写入
+        """
+        if self._task is not None:
+            if not self._task.done():
+                await self.queue.put(_STOP)
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
+                except Exception as e:
+                    print(f"✗ 执行日志写入任务异常退出: {e}")
+            self._task = None
+        if self._direct_flushes:
+            await asyncio.gather(*self._direct_flushes, return_exceptions=True)
+        
+        remaining = []
+        while not self.queue.empty():
+            record = self.queue.get_nowait()
+            if record is not _STOP:
+                remaining.append(record)
+        for start in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[start:start + self.batch_size])
+    
+    def track_running(self, record: Dict[str, Any]) -> int:
+        """登记执行中的记录，返回内存中的跟踪ID"""
+        running_id = next(self._running_ids)
+        self._running[running_id] = record
+        return running_id
+    
+    def discard(self, running_id: int):
+        """放弃执行中的记录（请求被拒绝、未实际执行时）"""
+        self._running.pop(running_id, None)
+    
+    def running(self) -> List[Dict[str, Any]]:
+        """执行中的记录快照"""
+        return [dict(record, running_id=running_id) for running_id, record in list(self._running.items())]
+    
+    async def finish(self, running_id: int, **fields) -> bool:
+        """结束执行中的记录并提交最终结果"""
+        record = self._running.pop(running_id, None)
+        if record is None:
+            return False
+        record.update(fields)
+        return await self.submit(record)
+    
+    def finish_many_nowait(self, finished: List[Tuple[int, Dict[str, Any]]]) -> Optional[asyncio.Task]:
+        """
+        结束一批执行中的记录，在后台用一条多行INSERT直接写入（不经过队列，批量执行结束时使用）
+        不需要await：调用方可能正在被取消（如客户端断开），记录在返回前已从执行中移除
+        """
+        records = []
+        for running_id, fields in finished:
+            record = self._running.pop(running_id, None)
+            if record is not None:
+                record.update(fields)
+                records.append(record)
+        if not records:
+            return None
+        for record in records:
+            self._pending[record.get("status")] += 1
+        task = asyncio.create_task(self._flush(records))
+        self._direct_flushes.add(task)
+        task.add_done_callback(self._direct_flushes.discard)
+        return task
+    
+    async def submit(self, record: Dict[str, Any]) -> bool:
+        """
+        提交一条完整的执行记录
+        队列满时最多等待put_timeout秒（背压），仍然满则按溢出策略处理
+        """
+        record.setdefault("execution_time", datetime.utcnow())
+        try:
+            self.queue.put_nowait(record)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self.queue.put(record), timeout=self.put_timeout)
+            except asyncio.TimeoutError:
+                await self._overflow([record])
+                return False
+        
+        self._pending[record.get("status")] += 1
+        return True
+    
+    def pending_counts(self) -> Dict[str, int]:
+        """已接收但尚未写入数据库的记录数（按状态）"""
+        return {status: count for status, count in self._pending.items() if count > 0}
+    
+    def stats(self) -> Dict[str, Any]:
+        """写入器统计信息"""
+        return {
+            "queue_size": self.queue.qsize(),
+            "queue_capacity": self.queue_size,
+            "running": len(self._running),
+            "pending": sum(self.pending_counts().values()),
+            "written": self._written,
+            "dropped": self._dropped,
+            "spilled": self._spilled,
+            "failed_batches": self._failed_batches,
+            "overflow_policy": self.overflow_policy
+        }
+    
+    async def _run(self):
+        """后台循环：凑够一批或到达时间阈值就写入，收到停止信号时写完当前批次后退出"""
+        await self._replay_spill()
+        while True:
+            record = await self.queue.get()
+            if record is _STOP:
+                return
+            batch = [record]
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            try:
+                while len(batch) < self.batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        record = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    if record is _STOP:
+                        stopping = True
+                        break
+                    batch.append(record)
+            except asyncio.CancelledError:
+                # 被直接取消时仍写入已从队列取出的记录
+                await self._flush(batch)
+                raise
+            
+            if stopping:
+                await self._flush(batch)
+                return
+            # 数据库可用且队列空闲时回放溢写文件
+            if await self._flush(batch) and self.queue.empty():
+                await self._replay_spill()
+    
+    async def _flush(self, batch: List[Dict[str, Any]]) -> bool:
+        """写入一批日志，失败时按溢出策略处理"""
+        try:
+            await run_sync(self._insert_batch, batch)
+            self._written += len(batch)
+            return True
+        except Exception as e:
+            self._failed_batches += 1
+            print(f"✗ 批量写入执行日志失败({len(batch)}条): {e}")
+            await self._overflow(batch)
+            return False
+        finally:
+            for record in batch:
+                self._pending[record.get("status")] -= 1
+    
+    @staticmethod
+    def _insert_batch(records: List[Dict[str, Any]]):
+        """多行INSERT写入（较大的结果在此压缩，不占用事件循环）"""
+        # 多行INSERT要求每条记录的字段一致
+        rows = [
+            {column: packed.get(column) for column in LOG_COLUMNS}
+            for packed in map(pack_result, records)
+        ]
+        db = SessionLocal()
+        try:
+            db.execute(insert(APIExecution), rows)
+            db.commit()
+        finally:
+            db.close()
+    
+    async def _overflow(self, records: List[Dict[str, Any]]):
+        """溢出处理：spill策略写入本地文件（有大小上限），否则丢弃"""
+        if self.overflow_policy == "spill" and self.spill_path:
+            spilled = await run_sync(self._spill, records)
+            self._spilled += spilled
+            self._dropped += len(records) - spilled
+        else:
+            self._dropped += len(records)
+    
+    @contextlib.contextmanager
+    def _spill_locked(self):
+        """
+        溢写文件的读写锁：线程锁加上锁文件的flock，多个worker进程共用同一溢写文件时
+        追加、读取和删除互斥（锁加在单独的锁文件上，溢写文件回放后会被删除）
+        """
+        with self._spill_lock:
+            with open(self.spill_path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    
+    def _spill(self, records: List[Dict[str, Any]]) -> int:
+        """追加写入溢写文件，返回实际写入条数"""
+        written = 0
+        with self._spill_locked():
+            size = os.path.getsize(self.spill_path) if os.path.exists(self.spill_path) else 0
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for record in records:
+                    line = json.dumps(record, ensure_ascii=False, default=_json_default) + "\n"
+                    if size + len(line.encode("utf-8")) > self.spill_max_bytes:
+                        break
+                    f.write(line)
+                    size += len(line.encode("utf-8"))
+                    written += 1
+        return written
+    
+    def _take_spill(self) -> List[Dict[str, Any]]:
+        """读取并清空溢写文件"""
+        if not self.spill_path:
+            return []
+        with self._spill_locked():
+            if not os.path.exists(self.spill_path):
+                return []
+            with open(self.spill_path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+            os.unlink(self.spill_path)
+        
+        records = []
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("execution_time"):
+                record["execution_time"] = datetime.fromisoformat(record["execution_time"])
+            records.append(record)
+        return records
+    
+    async def _replay_spill(self):
+        """将溢写文件中的日志重新写入数据库"""
+        if self.overflow_policy != "spill":
+            return
+        records = await run_sync(self._take_spill)
+        if not records:
+            return
+        print(f"🔄 回放溢写的执行日志 {len(records)} 条...")
+        for start in range(0, len(records), self.batch_size):
+            batch = records[start:start + self.batch_size]
+            for record in batch:
+                self._pending[record.get("status")] += 1
+            if not await self._flush(batch):
+                # 数据库仍不可用，剩余记录写回溢写文件
+                rest = records[start + self.batch_size:]
+                if rest:
+                    await self._overflow(rest)
+                break
+
+def _json_default(value):
+    """溢写文件的JSON序列化"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+# 全局日志写入器
+log_writer = ExecutionLogWriter(
+    batch_size=settings.LOG_BATCH_SIZE,
+    flush_interval=settings.LOG_FLUSH_INTERVAL,
+    queue_size=settings.LOG_QUEUE_SIZE,
+    overflow_policy=settings.LOG_OVERFLOW_POLICY,
+    spill_path=settings.LOG_SPILL_PATH,
+    spill_max_bytes=settings.LOG_SPILL_MAX_BYTES,
+    put_timeout=settings.LOG_PUT_TIMEOUT
+)
\ No newline at end of file
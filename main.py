@@ -1,20 +1,46 @@
-from fastapi import FastAPI, Depends, HTTPException, Form, Request, Query
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi import FastAPI, Depends, HTTPException, Form, Request, Query, Response
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 import time
 import json
+from datetime import datetime
 import os
 import argparse
 import sys
+import ipaddress
 
-from database import get_db, create_tables, APIDefinition, APIExecution, generate_api_key
-from executor import APIExecutor
+from database import get_async_db, engine, async_engine, create_tables, APIDefinition, APIExecution, generate_api_key
+from executor import APIExecutor, cancel_tasks, run_sync, shutdown_sync_executor
+from http_pool import http_pool
+from definition_cache import definition_cache, CachedDefinition
+from shared_backend import close_redis
+from log_writer import log_writer
+from execution_counters import execution_counters
+import execution_stats
+import metrics
+from retention import log_retention
+from execution_query import InvalidQuery, list_executions, parse_fields, serialize_execution
+from templating import TemplateError, compile_action
+from python_pool import python_pool
+from shell_pool import shell_pool
+from result_store import unpack_result
+from job_queue import job_queue, JobQueueFull, JOB_FINISHED
+from admission import admission, AdmissionRejected
+from rate_limit import rate_limiter, RateLimited
+from result_cache import result_cache
+from scheduler import scheduler, ScheduleError
+from resource_limits import ResourceUsage
+import math
+from starlette.background import BackgroundTask
 from config import settings
 from auth import AuthManager, get_current_user, get_current_user_optional
+from session_store import session_store
 import asyncio
 from contextlib import asynccontextmanager
 
@@ -25,8 +51,9 @@ async def cleanup_sessions_task():
         # 首次延迟启动，给服务器时间完全启动
         await asyncio.sleep(30)  # 等待30秒后开始第一次清理
         while True:
-            AuthManager.cleanup_expired_sessions()
-            print("✓ 已清理过期会话")
+            purged = await AuthManager.cleanup_expired_sessions()
+            if purged:
+                print(f"✓ 已清理过期会话 {purged} 个")
             await asyncio.sleep(300)  # 每5分钟清理一次
     except asyncio.CancelledError:
         print("✓ 会话清理任务已停止")
@@ -41,6 +68,21 @@ async def lifespan(app: FastAPI):
     # 启动时执行
     print("🔄 启动会话清理任务...")
     cleanup_task = asyncio.create_task(cleanup_sessions_task())
+    # 定时执行（多个worker/副本中由主节点触发）
+    scheduler.start()
+    # 跨进程缓存失效订阅（未配置REDIS_URL时立即结束）
+    invalidation_task = asyncio.create_task(definition_cache.listen_invalidations())
+    # 执行日志批量写入任务
+    log_writer.start()
+    # 执行计数定期批量写入任务
+    execution_counters.start()
+    # 预先启动Python和Shell工作进程
+    await python_pool.start()
+    await shell_pool.start()
+    # 异步任务工作协程
+    job_queue.start()
+    # 过期执行日志定期清理
+    log_retention.start()
     
     try:
         yield
@@ -48,10 +90,25 @@ async def lifespan(app: FastAPI):
         # 关闭时执行
         print("🛑 停止会话清理任务...")
         cleanup_task.cancel()
-        try:
-            await cleanup_task
-        except asyncio.CancelledError:
-            pass
+        invalidation_task.cancel()
+        for task in (cleanup_task, invalidation_task):
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await scheduler.stop()
+        # 写入队列中剩余的执行日志
+        print("📝 写入剩余执行日志...")
+        await log_retention.stop()
+        await job_queue.stop()
+        await log_writer.stop()
+        await execution_counters.stop()
+        await python_pool.close()
+        await shell_pool.close()
+        await http_pool.close()
+        await close_redis()
+        await async_engine.dispose()
+        shutdown_sync_executor()
         print("✅ 应用已完全关闭")
 
 # 创建FastAPI应用 (使用新的lifespan管理)
@@ -62,6 +119,29 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# 执行准入被拒绝：排队已满返回429/503，排队超时返回503
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": "1"}
+    )
+
+# 请求频率超过限制：返回429和建议的重试等待时间
+@app.exception_handler(RateLimited)
+async def rate_limited_handler(request: Request, exc: RateLimited):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
+
+# 执行记录查询参数不合法（分页游标、字段、数量限制）
+@app.exception_handler(InvalidQuery)
+async def invalid_query_handler(request: Request, exc: InvalidQuery):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
 # 创建数据库表
 create_tables()
 
@@ -74,6 +154,66 @@ async def health_check():
     """健康检查端点，用于Docker和负载均衡器"""
     return {"status": "ok", "service": "api-management", "version": settings.APP_VERSION}
 
+# 连接池当前使用情况（导出指标时读取）
+def db_pool_usage():
+    values = {}
+    for name, pool in (("async", async_engine.sync_engine.pool), ("sync", engine.pool)):
+        # SQLite等使用的连接池没有容量统计
+        if hasattr(pool, "checkedout"):
+            values[(name, "checked_out")] = pool.checkedout()
+            values[(name, "size")] = pool.size()
+            values[(name, "overflow")] = max(pool.overflow(), 0)
+    return values
+
+metrics.registry.callback_gauge(
+    "api_db_pool_connections", "Database pool connections (checked_out, size, overflow)", ["engine", "state"],
+    db_pool_usage
+)
+metrics.registry.callback_counter(
+    "api_http_pool_requests_total", "Outbound HTTP requests and new connections since start", ["kind"],
+    lambda: {
+        ("requests",): http_pool.stats()["total_requests"],
+        ("new_connections",): http_pool.stats()["total_new_connections"]
+    }
+)
+metrics.registry.callback_gauge(
+    "api_admission_slots", "Global execution slots (active, queued, limit)", ["state"],
+    lambda: {(state,): admission.stats()["global"][state] for state in ("active", "queued", "limit")}
+)
+metrics.registry.callback_gauge(
+    "api_log_writer_queue", "Execution log writer queue (queued, running)", ["state"],
+    lambda: {("queued",): log_writer.stats()["queue_size"], ("running",): log_writer.stats()["running"]}
+)
+metrics.registry.callback_gauge(
+    "api_job_queue", "Async job queue (queued, running)", ["state"],
+    lambda: {("queued",): job_queue.stats()["queued"], ("running",): job_queue.stats()["running"]}
+)
+metrics.registry.callback_gauge(
+    "api_worker_pool_workers", "Pre-spawned worker pools (idle, size)", ["pool", "state"],
+    lambda: {
+        (name, state): pool.stats()[state]
+        for name, pool in (("python", python_pool), ("shell", shell_pool))
+        for state in ("idle", "size")
+    }
+)
+metrics.registry.callback_counter(
+    "api_scheduler_runs_total", "Scheduled ticks by result (fired, overlap, missed)", ["result"],
+    lambda: {(result,): count for result, count in scheduler.counters().items()}
+)
+metrics.registry.callback_gauge(
+    "api_scheduler_leader", "Whether this process holds the scheduler lease", [],
+    lambda: {(): int(scheduler.is_leader)}
+)
+
+# Prometheus指标端点
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if settings.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="指标令牌无效")
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 # Pydantic模型
 class APIDefinitionCreate(BaseModel):
     name: str
@@ -83,6 +223,14 @@ class APIDefinitionCreate(BaseModel):
     action_content: str
     parameters: Optional[Dict[str, str]] = {}
 
+class BatchItem(BaseModel):
+    key: Optional[str] = None  # 未指定时使用请求的key参数
+    parameters: Dict[str, Any] = {}
+
+class BatchExecuteRequest(BaseModel):
+    items: List[BatchItem]
+    concurrency: Optional[int] = None  # 同时执行数，不超过BATCH_CONCURRENCY
+
 class APIDefinitionResponse(BaseModel):
     id: int
     name: str
@@ -110,12 +258,12 @@ async def login_page(request: Request):
 @app.post("/login")
 async def login(request: Request, username: str = Form(...), password: str = Form(...)):
     if AuthManager.authenticate_user(username, password):
-        session_id = AuthManager.create_session(username, request)
+        session_id = await AuthManager.create_session(username, request)
         response = JSONResponse({"success": True, "message": "登录成功"})
         response.set_cookie(
             key="session_id", 
             value=session_id, 
-            max_age=15*60,  # 15分钟
+            max_age=settings.SESSION_TTL_MINUTES * 60,
             httponly=True,
             secure=False,  # 生产环境设置为True
             samesite="lax"
@@ -129,7 +277,7 @@ async def login(request: Request, username: str = Form(...), password: str = For
 async def logout(request: Request):
     session_id = request.cookies.get("session_id")
     if session_id:
-        AuthManager.logout_session(session_id)
+        await AuthManager.logout_session(session_id)
     
     response = JSONResponse({"success": True, "message": "已登出"})
     response.delete_cookie("session_id")
@@ -150,10 +298,54 @@ async def home(request: Request):
         # 未登录，重定向到登录页面
         return RedirectResponse(url="/login", status_code=302)
 
+# 执行计数汇总（数据库中的计数加上尚未写入的内存增量）
+def execution_summary(api_def: APIDefinition) -> Dict[str, Any]:
+    pending = execution_counters.pending(api_def.id)
+    execution_count = (api_def.execution_count or 0) + pending["execution_count"]
+    total_duration_ms = (api_def.total_duration_ms or 0) + pending["total_duration_ms"]
+    return {
+        "execution_count": execution_count,
+        "success_count": (api_def.success_count or 0) + pending["success_count"],
+        "error_count": (api_def.error_count or 0) + pending["error_count"],
+        "cache_hit_count": (api_def.cache_hit_count or 0) + pending["cache_hit_count"],
+        "avg_duration_ms": round(total_duration_ms / execution_count) if execution_count else 0
+    }
+
+# 定义变更后清除定义缓存和结果缓存（结果缓存随定义缓存一起失效，包括其它进程）
+async def invalidate_definition(api_key: str):
+    await definition_cache.invalidate(api_key)
+    scheduler.request_reload()
+
+# 解析表单中的可选数字（默认不允许负数），空值返回None
+def form_number(value: Optional[str], label: str, number_type=int, allow_negative: bool = False):
+    if value is None or not str(value).strip():
+        return None
+    try:
+        number = number_type(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{label}必须是{'整数' if number_type is int else '数字'}")
+    if number < 0 and not allow_negative:
+        raise HTTPException(status_code=400, detail=f"{label}不能为负数")
+    return number
+
+# 解析表单中的定时执行设置：表达式为空表示不定时执行；定时参数按参数声明校验
+def form_schedule(template, schedule: Optional[str], schedule_parameters: Optional[str],
+                  schedule_jitter: Optional[str], schedule_misfire: Optional[str]):
+    expression = (schedule or "").strip() or None
+    misfire = (schedule_misfire or "").strip() or None
+    scheduler.validate(expression, misfire)
+    params = json.loads(schedule_parameters) if schedule_parameters and schedule_parameters.strip() else {}
+    if not isinstance(params, dict):
+        raise HTTPException(status_code=400, detail="定时参数必须是JSON对象")
+    if expression:
+        template.validate(params)
+    jitter = form_number(schedule_jitter, "随机延迟", number_type=float)
+    return expression, params or None, jitter, misfire
+
 # 获取所有API定义
 @app.get("/api/definitions")
-async def get_api_definitions(db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
-    definitions = db.query(APIDefinition).all()
+async def get_api_definitions(db: AsyncSession = Depends(get_async_db), current_user: dict = Depends(get_current_user)):
+    definitions = (await db.scalars(select(APIDefinition))).all()
     return [
         {
             "id": d.id,
@@ -164,7 +356,7 @@ async def get_api_definitions(db: Session = Depends(get_db), current_user: dict
             "action_type": d.action_type,
             "is_active": d.is_active,
             "enable_logging": getattr(d, 'enable_logging', True),  # 兼容旧数据
-            "execution_count": d.execution_count,
+            **execution_summary(d),
             "created_at": d.created_at.isoformat()
         }
         for d in definitions
@@ -180,13 +372,53 @@ async def create_api_definition(
     action_content: str = Form(...),
     parameters: str = Form("{}"),
     enable_logging: bool = Form(True),
-    db: Session = Depends(get_db),
+    max_output_bytes: Optional[str] = Form(None),
+    timeout_seconds: Optional[str] = Form(None),
+    job_priority: Optional[str] = Form(None),
+    max_concurrency: Optional[str] = Form(None),
+    max_queue: Optional[str] = Form(None),
+    queue_timeout: Optional[str] = Form(None),
+    key_rate_limit: Optional[str] = Form(None),
+    ip_rate_limit: Optional[str] = Form(None),
+    rate_limit_burst: Optional[str] = Form(None),
+    result_cache_ttl: Optional[str] = Form(None),
+    retention_days: Optional[str] = Form(None),
+    cpu_limit_seconds: Optional[str] = Form(None),
+    memory_limit_mb: Optional[str] = Form(None),
+    max_open_files: Optional[str] = Form(None),
+    max_processes: Optional[str] = Form(None),
+    schedule: Optional[str] = Form(None),
+    schedule_parameters: Optional[str] = Form(None),
+    schedule_jitter: Optional[str] = Form(None),
+    schedule_misfire: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
     try:
         # 解析参数JSON
         param_dict = json.loads(parameters) if parameters else {}
         
+        # 校验操作内容和参数声明（编译模板）
+        template = compile_action(action_type, action_content, param_dict)
+        output_bytes = form_number(max_output_bytes, "结果上限")
+        run_timeout = form_number(timeout_seconds, "执行超时", number_type=float)
+        priority = form_number(job_priority, "任务优先级", allow_negative=True) or 0
+        concurrency = form_number(max_concurrency, "最大并发数")
+        queue_size = form_number(max_queue, "最大排队数")
+        wait_timeout = form_number(queue_timeout, "排队超时", number_type=float)
+        key_rate = form_number(key_rate_limit, "API密钥限流", number_type=float)
+        ip_rate = form_number(ip_rate_limit, "客户端IP限流", number_type=float)
+        burst = form_number(rate_limit_burst, "突发请求数")
+        cache_ttl = form_number(result_cache_ttl, "结果缓存时间", number_type=float)
+        keep_days = form_number(retention_days, "日志保留天数")
+        cpu_limit = form_number(cpu_limit_seconds, "CPU时间上限")
+        memory_limit = form_number(memory_limit_mb, "内存上限")
+        open_files = form_number(max_open_files, "最多打开文件数")
+        processes = form_number(max_processes, "最大进程数")
+        schedule_expr, schedule_params, jitter, misfire = form_schedule(
+            template, schedule, schedule_parameters, schedule_jitter, schedule_misfire
+        )
+        
         # 生成API密钥
         api_key = generate_api_key()
         
@@ -199,12 +431,34 @@ async def create_api_definition(
             action_type=action_type,
             action_content=action_content,
             parameters=param_dict,
-            enable_logging=enable_logging
+            enable_logging=enable_logging,
+            max_output_bytes=output_bytes,
+            timeout_seconds=run_timeout,
+            job_priority=priority,
+            max_concurrency=concurrency,
+            max_queue=queue_size,
+            queue_timeout=wait_timeout,
+            key_rate_limit=key_rate,
+            ip_rate_limit=ip_rate,
+            rate_limit_burst=burst,
+            result_cache_ttl=cache_ttl,
+            retention_days=keep_days,
+            cpu_limit_seconds=cpu_limit,
+            memory_limit_mb=memory_limit,
+            max_open_files=open_files,
+            max_processes=processes,
+            schedule=schedule_expr,
+            schedule_parameters=schedule_params,
+            schedule_jitter=jitter,
+            schedule_misfire=misfire
         )
         
         db.add(api_def)
-        db.commit()
-        db.refresh(api_def)
+        await db.commit()
+        await db.refresh(api_def)
+        
+        # 清除该密钥可能存在的"不存在"缓存
+        await invalidate_definition(api_key)
         
         return {
             "success": True,
@@ -212,16 +466,20 @@ async def create_api_definition(
             "api_key": api_key,
             "id": api_def.id
         }
-        
+    
+    except HTTPException:
+        raise
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="参数格式错误，请使用有效的JSON格式")
+    except (TemplateError, ScheduleError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"创建失败: {str(e)}")
 
 # 获取单个API定义详情（用于编辑）
 @app.get("/api/definitions/{definition_id}")
-async def get_api_definition(definition_id: int, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
-    api_def = db.query(APIDefinition).filter(APIDefinition.id == definition_id).first()
+async def get_api_definition(definition_id: int, db: AsyncSession = Depends(get_async_db), current_user: dict = Depends(get_current_user)):
+    api_def = await db.get(APIDefinition, definition_id)
     if not api_def:
         raise HTTPException(status_code=404, detail="API定义不存在")
     
@@ -236,7 +494,26 @@ async def get_api_definition(definition_id: int, db: Session = Depends(get_db),
         "parameters": api_def.parameters,
         "is_active": api_def.is_active,
         "enable_logging": getattr(api_def, 'enable_logging', True),  # 兼容旧数据
-        "execution_count": api_def.execution_count,
+        "max_output_bytes": api_def.max_output_bytes,
+        "timeout_seconds": api_def.timeout_seconds,
+        "job_priority": api_def.job_priority or 0,
+        "max_concurrency": api_def.max_concurrency,
+        "max_queue": api_def.max_queue,
+        "queue_timeout": api_def.queue_timeout,
+        "key_rate_limit": api_def.key_rate_limit,
+        "ip_rate_limit": api_def.ip_rate_limit,
+        "rate_limit_burst": api_def.rate_limit_burst,
+        "result_cache_ttl": api_def.result_cache_ttl,
+        "retention_days": api_def.retention_days,
+        "cpu_limit_seconds": api_def.cpu_limit_seconds,
+        "memory_limit_mb": api_def.memory_limit_mb,
+        "max_open_files": api_def.max_open_files,
+        "max_processes": api_def.max_processes,
+        "schedule": api_def.schedule,
+        "schedule_parameters": api_def.schedule_parameters,
+        "schedule_jitter": api_def.schedule_jitter,
+        "schedule_misfire": api_def.schedule_misfire,
+        **execution_summary(api_def),
         "created_at": api_def.created_at.isoformat(),
         "updated_at": api_def.updated_at.isoformat()
     }
@@ -252,15 +529,55 @@ async def update_api_definition(
     action_content: str = Form(...),
     parameters: str = Form("{}"),
     enable_logging: bool = Form(True),
-    db: Session = Depends(get_db),
+    max_output_bytes: Optional[str] = Form(None),
+    timeout_seconds: Optional[str] = Form(None),
+    job_priority: Optional[str] = Form(None),
+    max_concurrency: Optional[str] = Form(None),
+    max_queue: Optional[str] = Form(None),
+    queue_timeout: Optional[str] = Form(None),
+    key_rate_limit: Optional[str] = Form(None),
+    ip_rate_limit: Optional[str] = Form(None),
+    rate_limit_burst: Optional[str] = Form(None),
+    result_cache_ttl: Optional[str] = Form(None),
+    retention_days: Optional[str] = Form(None),
+    cpu_limit_seconds: Optional[str] = Form(None),
+    memory_limit_mb: Optional[str] = Form(None),
+    max_open_files: Optional[str] = Form(None),
+    max_processes: Optional[str] = Form(None),
+    schedule: Optional[str] = Form(None),
+    schedule_parameters: Optional[str] = Form(None),
+    schedule_jitter: Optional[str] = Form(None),
+    schedule_misfire: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
     try:
         # 解析参数JSON
         param_dict = json.loads(parameters) if parameters else {}
         
+        # 校验操作内容和参数声明（编译模板）
+        template = compile_action(action_type, action_content, param_dict)
+        output_bytes = form_number(max_output_bytes, "结果上限")
+        run_timeout = form_number(timeout_seconds, "执行超时", number_type=float)
+        priority = form_number(job_priority, "任务优先级", allow_negative=True) or 0
+        concurrency = form_number(max_concurrency, "最大并发数")
+        queue_size = form_number(max_queue, "最大排队数")
+        wait_timeout = form_number(queue_timeout, "排队超时", number_type=float)
+        key_rate = form_number(key_rate_limit, "API密钥限流", number_type=float)
+        ip_rate = form_number(ip_rate_limit, "客户端IP限流", number_type=float)
+        burst = form_number(rate_limit_burst, "突发请求数")
+        cache_ttl = form_number(result_cache_ttl, "结果缓存时间", number_type=float)
+        keep_days = form_number(retention_days, "日志保留天数")
+        cpu_limit = form_number(cpu_limit_seconds, "CPU时间上限")
+        memory_limit = form_number(memory_limit_mb, "内存上限")
+        open_files = form_number(max_open_files, "最多打开文件数")
+        processes = form_number(max_processes, "最大进程数")
+        schedule_expr, schedule_params, jitter, misfire = form_schedule(
+            template, schedule, schedule_parameters, schedule_jitter, schedule_misfire
+        )
+        
         # 查找API定义
-        api_def = db.query(APIDefinition).filter(APIDefinition.id == definition_id).first()
+        api_def = await db.get(APIDefinition, definition_id)
         if not api_def:
             raise HTTPException(status_code=404, detail="API定义不存在")
         
@@ -272,186 +589,717 @@ async def update_api_definition(
         api_def.action_content = action_content
         api_def.parameters = param_dict
         api_def.enable_logging = enable_logging
+        api_def.max_output_bytes = output_bytes
+        api_def.timeout_seconds = run_timeout
+        api_def.job_priority = priority
+        api_def.max_concurrency = concurrency
+        api_def.max_queue = queue_size
+        api_def.queue_timeout = wait_timeout
+        api_def.key_rate_limit = key_rate
+        api_def.ip_rate_limit = ip_rate
+        api_def.rate_limit_burst = burst
+        api_def.result_cache_ttl = cache_ttl
+        api_def.retention_days = keep_days
+        api_def.cpu_limit_seconds = cpu_limit
+        api_def.memory_limit_mb = memory_limit
+        api_def.max_open_files = open_files
+        api_def.max_processes = processes
+        api_def.schedule = schedule_expr
+        api_def.schedule_parameters = schedule_params
+        api_def.schedule_jitter = jitter
+        api_def.schedule_misfire = misfire
+        
+        await db.commit()
+        await db.refresh(api_def)
         
-        db.commit()
-        db.refresh(api_def)
+        await invalidate_definition(api_def.api_key)
         
         return {
             "success": True,
             "message": "API定义更新成功",
             "id": api_def.id
         }
-        
+    
+    except HTTPException:
+        raise
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="参数格式错误，请使用有效的JSON格式")
+    except (TemplateError, ScheduleError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"更新失败: {str(e)}")
 
 # 删除API定义
 @app.delete("/api/definitions/{definition_id}")
-async def delete_api_definition(definition_id: int, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
-    api_def = db.query(APIDefinition).filter(APIDefinition.id == definition_id).first()
+async def delete_api_definition(definition_id: int, db: AsyncSession = Depends(get_async_db), current_user: dict = Depends(get_current_user)):
+    api_def = await db.get(APIDefinition, definition_id)
     if not api_def:
         raise HTTPException(status_code=404, detail="API定义不存在")
     
-    db.delete(api_def)
-    db.commit()
+    api_key = api_def.api_key
+    await db.delete(api_def)
+    await db.commit()
+    await invalidate_definition(api_key)
     return {"success": True, "message": "API定义删除成功"}
 
 # 切换API状态
 @app.put("/api/definitions/{definition_id}/toggle")
-async def toggle_api_definition(definition_id: int, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
-    api_def = db.query(APIDefinition).filter(APIDefinition.id == definition_id).first()
+async def toggle_api_definition(definition_id: int, db: AsyncSession = Depends(get_async_db), current_user: dict = Depends(get_current_user)):
+    api_def = await db.get(APIDefinition, definition_id)
     if not api_def:
         raise HTTPException(status_code=404, detail="API定义不存在")
     
     api_def.is_active = not api_def.is_active
-    db.commit()
+    await db.commit()
+    await invalidate_definition(api_def.api_key)
     return {"success": True, "is_active": api_def.is_active}
 
-# 执行API - 主要入口点
-@app.get("/execute")
-async def execute_api(
-    request: Request,
-    key: str = Query(..., description="API密钥"),
-    db: Session = Depends(get_db)
-):
-    start_time = time.time()
+# 查找API定义并检查是否可用（优先读缓存，未命中时异步查询数据库）
+async def load_active_definition(key: str, db: AsyncSession) -> CachedDefinition:
+    async def load_definition():
+        return await db.scalar(select(APIDefinition).where(APIDefinition.api_key == key))
     
-    # 查找API定义
-    api_def = db.query(APIDefinition).filter(APIDefinition.api_key == key).first()
+    api_def = await definition_cache.get_or_load(key, load_definition)
     if not api_def:
         raise HTTPException(status_code=404, detail="无效的API密钥")
     
     if not api_def.is_active:
         raise HTTPException(status_code=403, detail="API已被禁用")
     
-    # 获取请求参数
+    return api_def
+
+# 获取请求参数并按声明的参数校验（必填参数、类型），返回规范化后的参数（包括默认值）
+def request_parameters(request: Request, api_def: CachedDefinition) -> Dict[str, Any]:
     query_params = dict(request.query_params)
     query_params.pop("key", None)  # 移除key参数
     
+    if api_def.template is not None:
+        try:
+            return api_def.template.validate(query_params)
+        except TemplateError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    return query_params
+
+# 受信任的反向代理网段
+def parse_networks(value: str) -> List[Any]:
+    networks = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(item, strict=False))
+        except ValueError:
+            print(f"⚠️ 忽略无效的代理地址: {item}")
+    return networks
+
+TRUSTED_PROXIES = parse_networks(settings.TRUSTED_PROXIES)
+
+def is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+# 客户端IP：直连地址是受信任的代理时，从X-Forwarded-For右侧跳过受信任的代理，取第一个其它地址
+def client_ip(request: Request) -> str:
+    peer = request.client.host if request.client else "unknown"
+    forwarded = request.headers.get("x-forwarded-for")
+    if not forwarded or not is_trusted_proxy(peer):
+        return peer
+    
+    addresses = [address.strip() for address in forwarded.split(",") if address.strip()]
+    for address in reversed(addresses):
+        if not is_trusted_proxy(address):
+            return address
+    return addresses[0] if addresses else peer
+
+# 执行前的检查：查找定义、限流（不访问数据库）、参数校验
+async def prepare_execution(request: Request, key: str, db: AsyncSession):
+    api_def = await load_active_definition(key, db)
+    # 之后不再查询数据库，立即归还连接，执行期间不占用连接池
+    await db.close()
+    await rate_limiter.check(api_def, client_ip(request))
+    return api_def, request_parameters(request, api_def)
+
+# 在内存中登记执行中的记录
+def track_execution(api_def: CachedDefinition, query_params: Dict[str, Any], request: Request) -> int:
+    return log_writer.track_running({
+        "api_definition_id": api_def.id,
+        "api_key": api_def.api_key,
+        "parameters": query_params,
+        "status": "running",
+        "execution_time": datetime.utcnow(),
+        "request_ip": client_ip(request)
+    })
+
+# 执行API - 主要入口点
+@app.get("/execute")
+async def execute_api(
+    request: Request,
+    key: str = Query(..., description="API密钥"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    start_time = time.time()
+    phase_start = time.perf_counter()
+    
+    api_def, query_params = await prepare_execution(request, key, db)
+    phase_start = metrics.observe_phase("lookup", phase_start)
+    
     # 检查是否启用日志记录
-    enable_logging = getattr(api_def, 'enable_logging', True)
-    execution = None
+    enable_logging = api_def.enable_logging
+    running_id = None
     
-    # 如果启用日志记录，则创建执行记录
+    # 如果启用日志记录，则在内存中登记执行记录，完成后再批量写入数据库
     if enable_logging:
-        execution = APIExecution(
-            api_definition_id=api_def.id,
-            api_key=key,
-            parameters=query_params,
-            status="running",
-            request_ip=request.client.host if request.client else "unknown"
-        )
-        db.add(execution)
-        db.commit()
+        running_id = track_execution(api_def, query_params, request)
+        metrics.observe_phase("log_insert", phase_start)
+    
+    # 子进程的资源使用（命中缓存或合并到其它执行时为空）
+    usage = ResourceUsage()
     
     try:
-        # 执行操作
-        result, success, error_msg = APIExecutor.execute_action(
-            api_def.action_type,
-            api_def.action_content,
-            query_params
+        # 执行操作（异步执行，不阻塞其他请求）；开启结果缓存时，缓存命中或合并到相同的执行中
+        (result, success, error_msg), cached = await result_cache.get_or_execute(
+            api_def,
+            query_params,
+            lambda: execute_admitted(api_def, query_params, usage)
         )
         
         # 计算执行时长
         duration_ms = int((time.time() - start_time) * 1000)
         
-        # 如果启用日志记录，则更新执行记录
-        if enable_logging and execution:
-            execution.result = result
-            execution.status = "success" if success else "error"
-            execution.error_message = error_msg
-            execution.duration_ms = duration_ms
+        # 如果启用日志记录，则提交最终执行记录
+        if running_id is not None:
+            phase_start = time.perf_counter()
+            await log_writer.finish(
+                running_id,
+                result=result,
+                status="success" if success else "error",
+                error_message=error_msg,
+                duration_ms=duration_ms,
+                **usage.fields()
+            )
+            metrics.observe_phase("log_update", phase_start)
         
-        # 更新API定义的执行计数
-        api_def.execution_count += 1
-        
-        db.commit()
+        # 累加执行计数（内存聚合，定期批量写入数据库）
+        execution_counters.record(api_def.id, success, duration_ms, cache_hit=cached)
+        metrics.record_execution(api_def.action_type, api_def.id, success, cached=cached)
+        metrics.EXECUTE_DURATION.observe(time.time() - start_time, api_def.action_type)
         
         return {
             "success": success,
             "result": result,
             "error_message": error_msg,
             "execution_time": duration_ms,
-            "api_name": api_def.name
+            "api_name": api_def.name,
+            "cached": cached
         }
-        
+    
+    except AdmissionRejected:
+        # 被拒绝的请求没有实际执行，不记录日志
+        if running_id is not None:
+            log_writer.discard(running_id)
+        raise
+    
     except Exception as e:
         duration_ms = int((time.time() - start_time) * 1000)
+        execution_counters.record(api_def.id, False, duration_ms)
+        metrics.record_execution(api_def.action_type, api_def.id, False)
+        metrics.EXECUTE_DURATION.observe(time.time() - start_time, api_def.action_type)
         
-        # 如果启用日志记录，则更新执行记录
-        if enable_logging and execution:
-            execution.status = "error"
-            execution.error_message = str(e)
-            execution.duration_ms = duration_ms
-            db.commit()
+        # 如果启用日志记录，则提交失败的执行记录
+        if running_id is not None:
+            await log_writer.finish(
+                running_id,
+                status="error",
+                error_message=str(e),
+                duration_ms=duration_ms,
+                **usage.fields()
+            )
         
         raise HTTPException(status_code=500, detail=f"执行错误: {str(e)}")
 
-# 获取执行历史
+# 在执行名额内执行操作（并发已满时排队，排队已满或超时直接拒绝，不启动任何进程）
+async def execute_admitted(api_def: CachedDefinition, query_params: Dict[str, Any],
+                           usage: Optional[ResourceUsage] = None):
+    queued_at = time.perf_counter()
+    async with admission.slot(api_def):
+        metrics.observe_phase("admission", queued_at)
+        return await APIExecutor.execute_action(
+            api_def.action_type,
+            api_def.action_content,
+            query_params,
+            template=api_def.template,
+            max_output_bytes=api_def.max_output_bytes,
+            timeout_seconds=api_def.timeout_seconds,
+            limits=api_def.limits,
+            usage=usage
+        )
+
+# 流式执行API - 以Server-Sent Events实时推送输出，适合长时间运行的脚本
+@app.get("/execute/stream")
+async def execute_api_stream(
+    request: Request,
+    key: str = Query(..., description="API密钥"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    start_time = time.time()
+    
+    api_def, query_params = await prepare_execution(request, key, db)
+    ticket = await admission.acquire(api_def)
+    
+    async def event_stream():
+        running_id = track_execution(api_def, query_params, request) if api_def.enable_logging else None
+        result, success, error_msg = "", False, "客户端已断开，执行被中断"
+        usage = ResourceUsage()
+        try:
+            async for event, data in APIExecutor.stream_action(
+                api_def.action_type,
+                api_def.action_content,
+                query_params,
+                template=api_def.template,
+                max_retained_bytes=api_def.max_output_bytes,
+                timeout_seconds=api_def.timeout_seconds,
+                limits=api_def.limits,
+                usage=usage
+            ):
+                if event == "output":
+                    yield sse_event("output", {"line": data})
+                else:
+                    result, success, error_msg = data
+            
+            yield sse_event("done", {
+                "success": success,
+                "error_message": error_msg,
+                "execution_time": int((time.time() - start_time) * 1000),
+                "api_name": api_def.name
+            })
+        finally:
+            ticket.release()
+            # 无论正常结束还是客户端断开，都记录最终结果（只保留有上限的输出）
+            duration_ms = int((time.time() - start_time) * 1000)
+            execution_counters.record(api_def.id, success, duration_ms)
+            metrics.record_execution(api_def.action_type, api_def.id, success)
+            if running_id is not None:
+                await log_writer.finish(
+                    running_id,
+                    result=result,
+                    status="success" if success else "error",
+                    error_message=error_msg,
+                    duration_ms=duration_ms,
+                    **usage.fields()
+                )
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # 禁止nginx缓冲，保证实时推送
+        },
+        # 客户端在输出开始前断开时生成器不会执行，响应结束后再释放一次名额（可重复调用）
+        background=BackgroundTask(ticket.release)
+    )
+
+# 批量执行API - 按多组参数（可以属于不同的API密钥）并发执行，以NDJSON逐行返回先完成的结果，日志在结束时一次写入
+@app.post("/execute/batch")
+async def execute_api_batch(
+    request: Request,
+    batch: BatchExecuteRequest,
+    key: Optional[str] = Query(None, description="默认API密钥"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    start_time = time.time()
+    if not batch.items:
+        raise HTTPException(status_code=400, detail="items不能为空")
+    if len(batch.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"每次最多执行 {settings.BATCH_MAX_ITEMS} 组参数")
+    keys = [item.key or key for item in batch.items]
+    if not all(keys):
+        raise HTTPException(status_code=400, detail="缺少API密钥")
+    
+    # 每个API密钥只查找一次定义，之后不再查询数据库，立即归还连接
+    definitions: Dict[str, Any] = {}
+    for item_key in dict.fromkeys(keys):
+        try:
+            definitions[item_key] = await load_active_definition(item_key, db)
+        except HTTPException as e:
+            definitions[item_key] = e
+    await db.close()
+    
+    ip = client_ip(request)
+    concurrency = max(1, min(batch.concurrency or settings.BATCH_CONCURRENCY, settings.BATCH_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+    # 已结束的执行记录: (执行中记录ID, 最终字段)
+    finished_logs: List[Tuple[int, Dict[str, Any]]] = []
+    # 正在执行的记录: 序号 -> (执行中记录ID, 开始时间)
+    running_items: Dict[int, Tuple[int, float]] = {}
+    
+    def item_error(index: int, status_code: int, detail: str) -> Dict[str, Any]:
+        return {"index": index, "success": False, "result": None, "error_message": detail, "status_code": status_code}
+    
+    async def run_item(index: int, item_key: str, raw_parameters: Dict[str, Any]) -> Dict[str, Any]:
+        api_def = definitions[item_key]
+        if isinstance(api_def, HTTPException):
+            return item_error(index, api_def.status_code, api_def.detail)
+        try:
+            if api_def.template is not None:
+                parameters = api_def.template.validate(raw_parameters)
+            else:
+                parameters = {name: str(value) for name, value in raw_parameters.items()}
+            await rate_limiter.check(api_def, ip)
+        except TemplateError as e:
+            return item_error(index, 400, str(e))
+        except RateLimited as e:
+            return item_error(index, 429, e.detail)
+        
+        async with semaphore:
+            item_start = time.time()
+            running_id = log_writer.track_running({
+                "api_definition_id": api_def.id,
+                "api_key": api_def.api_key,
+                "parameters": parameters,
+                "status": "running",
+                "execution_time": datetime.utcnow(),
+                "request_ip": ip
+            }) if api_def.enable_logging else None
+            if running_id is not None:
+                running_items[index] = (running_id, item_start)
+            usage = ResourceUsage()
+            try:
+                (result, success, error_msg), cached = await result_cache.get_or_execute(
+                    api_def,
+                    parameters,
+                    lambda: execute_admitted(api_def, parameters, usage)
+                )
+            except AdmissionRejected as e:
+                if running_id is not None:
+                    running_items.pop(index, None)
+                    log_writer.discard(running_id)
+                return item_error(index, e.status_code, e.detail)
+            except Exception as e:
+                (result, success, error_msg), cached = ("", False, f"执行错误: {str(e)}"), False
+            running_items.pop(index, None)
+            
+            duration_ms = int((time.time() - item_start) * 1000)
+            execution_counters.record(api_def.id, success, duration_ms, cache_hit=cached)
+            metrics.record_execution(api_def.action_type, api_def.id, success, cached=cached)
+            if running_id is not None:
+                finished_logs.append((running_id, {
+                    "result": result,
+                    "status": "success" if success else "error",
+                    "error_message": error_msg,
+                    "duration_ms": duration_ms,
+                    **usage.fields()
+                }))
+            return {
+                "index": index,
+                "success": success,
+                "result": result,
+                "error_message": error_msg,
+                "execution_time": duration_ms,
+                "api_name": api_def.name,
+                "cached": cached
+            }
+    
+    async def result_lines():
+        tasks = [
+            asyncio.create_task(run_item(index, item_key, item.parameters))
+            for index, (item_key, item) in enumerate(zip(keys, batch.items))
+        ]
+        succeeded = 0
+        try:
+            for completed in asyncio.as_completed(tasks):
+                line = await completed
+                succeeded += bool(line["success"])
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+            yield json.dumps({
+                "done": True,
+                "total": len(tasks),
+                "succeeded": succeeded,
+                "failed": len(tasks) - succeeded,
+                "execution_time": int((time.time() - start_time) * 1000)
+            }, ensure_ascii=False) + "\n"
+        finally:
+            # 客户端断开时生成器会在第一个await处再次被取消，因此先同步中断未完成的执行、
+            # 记录中断结果并提交全部执行日志（一条多行INSERT，在后台写入），之后才等待任务结束
+            for task in tasks:
+                task.cancel()
+            interrupted_at = time.time()
+            for running_id, item_start in running_items.values():
+                finished_logs.append((running_id, {
+                    "status": "error",
+                    "error_message": "客户端已断开，执行被中断",
+                    "duration_ms": int((interrupted_at - item_start) * 1000)
+                }))
+            running_items.clear()
+            log_writer.finish_many_nowait(finished_logs)
+            await cancel_tasks(tasks)
+    
+    return StreamingResponse(
+        result_lines(),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"}
+    )
+
+# 异步执行API - 任务加入队列后立即返回任务ID，通过 /jobs/{job_id} 查询结果
+@app.get("/execute/async", status_code=202)
+async def execute_api_async(
+    request: Request,
+    key: str = Query(..., description="API密钥"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    api_def, query_params = await prepare_execution(request, key, db)
+    
+    try:
+        job_id = await job_queue.submit(
+            api_def,
+            query_params,
+            client_ip(request)
+        )
+    except JobQueueFull:
+        raise HTTPException(status_code=503, detail="任务队列已满，请稍后重试")
+    
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/jobs/{job_id}?key={key}",
+        "api_name": api_def.name
+    }
+
+# 查询异步任务状态和结果（wait>0时长轮询，任务完成或超时后返回）
+@app.get("/jobs/{job_id}")
+async def get_job(
+    job_id: int,
+    key: str = Query(..., description="API密钥"),
+    wait: float = Query(0, description="最长等待秒数"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    deadline = time.monotonic() + min(max(wait, 0), settings.JOB_MAX_WAIT)
+    while True:
+        # populate_existing读取其它会话写入的最新状态
+        job = await db.get(
+            APIExecution, job_id, options=[undefer(APIExecution.result_blob)], populate_existing=True
+        )
+        # 任务只对持有对应API密钥的调用方可见
+        if not job or job.api_key != key:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        
+        remaining = deadline - time.monotonic()
+        if job.status in JOB_FINISHED or remaining <= 0:
+            break
+        # 等待期间不占用数据库连接
+        await db.close()
+        await job_queue.wait(job_id, remaining)
+    
+    finished = job.status in JOB_FINISHED
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "result": await run_sync(unpack_result, job) if finished else None,
+        "error_message": job.error_message,
+        "execution_time": job.execution_time.isoformat() if job.execution_time else None,
+        "duration_ms": job.duration_ms
+    }
+
+# 获取执行准入（并发限制）统计
+@app.get("/api/admission/stats")
+async def get_admission_stats(current_user: dict = Depends(get_current_user)):
+    return admission.stats()
+
+# 获取执行结果缓存统计
+@app.get("/api/result-cache/stats")
+async def get_result_cache_stats(current_user: dict = Depends(get_current_user)):
+    return result_cache.stats()
+
+# 获取限流统计
+@app.get("/api/rate-limit/stats")
+async def get_rate_limit_stats(current_user: dict = Depends(get_current_user)):
+    return rate_limiter.stats()
+
+# 获取异步任务队列统计
+@app.get("/api/jobs/stats")
+async def get_job_queue_stats(current_user: dict = Depends(get_current_user)):
+    return job_queue.stats()
+
+# Server-Sent Events格式化
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# 获取执行历史（按游标分页，下一页游标在 X-Next-Cursor 响应头中）
 @app.get("/api/executions")
 async def get_executions(
+    response: Response,
     limit: int = Query(50, description="返回数量限制"),
     api_key: Optional[str] = Query(None, description="按API密钥筛选"),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页返回的X-Next-Cursor）"),
+    status: Optional[str] = Query(None, description="按状态筛选，多个用逗号分隔"),
+    since: Optional[datetime] = Query(None, description="执行时间不早于"),
+    until: Optional[datetime] = Query(None, description="执行时间早于"),
+    min_duration_ms: Optional[int] = Query(None, description="最短执行时长(毫秒)"),
+    max_duration_ms: Optional[int] = Query(None, description="最长执行时长(毫秒)"),
+    fields: Optional[str] = Query(None, description="返回的字段，多个用逗号分隔"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
-    query = db.query(APIExecution)
+    statement = select(APIExecution)
     
     if api_key:
-        query = query.filter(APIExecution.api_key == api_key)
+        statement = statement.where(APIExecution.api_key == api_key)
     
-    executions = query.order_by(APIExecution.execution_time.desc()).limit(limit).all()
+    selected_fields = parse_fields(fields)
+    executions, next_cursor = await list_executions(
+        db, statement, limit, cursor=cursor, fields=selected_fields, status=status, since=since, until=until,
+        min_duration_ms=min_duration_ms, max_duration_ms=max_duration_ms
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
+    return [serialize_execution(e, selected_fields) for e in executions]
+
+# 获取单条执行记录的完整结果
+@app.get("/api/executions/{execution_id}/result")
+async def get_execution_result(
+    execution_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user)
+):
+    execution = await db.get(APIExecution, execution_id, options=[undefer(APIExecution.result_blob)])
+    if not execution:
+        raise HTTPException(status_code=404, detail="日志记录不存在")
+    
+    try:
+        result = await run_sync(unpack_result, execution)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"读取结果失败: {str(e)}")
+    
+    return {
+        "id": execution.id,
+        "result": result,
+        "result_size": execution.result_size,
+        "result_encoding": execution.result_encoding
+    }
+
+# 获取系统统计
+@app.get("/api/stats")
+async def get_stats(db: AsyncSession = Depends(get_async_db), current_user: dict = Depends(get_current_user)):
+    # 一次聚合查询预先累加的计数（短时缓存），不扫描执行日志
+    return await execution_stats.summary(db)
+
+# 获取按时间桶的执行统计（用于仪表盘图表）
+@app.get("/api/stats/timeseries")
+async def get_stats_timeseries(
+    bucket: str = Query("minute", description="时间桶大小: minute/hour"),
+    points: int = Query(60, description="返回的时间桶数量"),
+    definition_id: Optional[int] = Query(None, description="按API定义筛选"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user)
+):
+    if bucket not in execution_stats.MAX_POINTS:
+        raise HTTPException(status_code=400, detail="时间桶大小只能是 minute 或 hour")
+    if points < 1 or points > execution_stats.MAX_POINTS[bucket]:
+        raise HTTPException(status_code=400, detail=f"时间桶数量应在1到{execution_stats.MAX_POINTS[bucket]}之间")
+    return await execution_stats.timeseries(db, bucket, points, definition_id)
+
+# 获取各API定义的执行统计
+@app.get("/api/stats/definitions")
+async def get_definition_stats(
+    hours: int = Query(24, description="统计最近多少小时"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user)
+):
+    if hours < 1 or hours > execution_stats.MAX_POINTS["hour"]:
+        raise HTTPException(status_code=400, detail=f"小时数应在1到{execution_stats.MAX_POINTS['hour']}之间")
+    return await execution_stats.definition_stats(db, hours)
+
+# 获取HTTP连接池统计
+@app.get("/api/http-pool/stats")
+async def get_http_pool_stats(current_user: dict = Depends(get_current_user)):
+    return http_pool.stats()
+
+# 获取执行日志写入器统计
+@app.get("/api/log-writer/stats")
+async def get_log_writer_stats(current_user: dict = Depends(get_current_user)):
+    return log_writer.stats()
+
+# 获取执行中的记录（仅保存在内存中）
+@app.get("/api/executions/running")
+async def get_running_executions(current_user: dict = Depends(get_current_user)):
     return [
         {
-            "id": e.id,
-            "api_key": e.api_key,
-            "parameters": e.parameters,
-            "result": e.result,
-            "status": e.status,
-            "execution_time": e.execution_time.isoformat(),
-            "duration_ms": e.duration_ms,
-            "error_message": e.error_message,
-            "request_ip": e.request_ip
+            "running_id": record["running_id"],
+            "api_definition_id": record["api_definition_id"],
+            "api_key": record["api_key"],
+            "parameters": record["parameters"],
+            "status": record["status"],
+            "execution_time": record["execution_time"].isoformat(),
+            "request_ip": record["request_ip"]
         }
-        for e in executions
+        for record in log_writer.running()
     ]
 
-# 获取系统统计
-@app.get("/api/stats")
-async def get_stats(db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
-    total_apis = db.query(APIDefinition).count()
-    active_apis = db.query(APIDefinition).filter(APIDefinition.is_active == True).count()
-    total_executions = db.query(APIExecution).count()
-    successful_executions = db.query(APIExecution).filter(APIExecution.status == "success").count()
-    
-    return {
-        "total_apis": total_apis,
-        "active_apis": active_apis,
-        "total_executions": total_executions,
-        "successful_executions": successful_executions,
-        "success_rate": round(successful_executions / total_executions * 100, 2) if total_executions > 0 else 0
-    }
+# 获取Python工作进程池统计
+@app.get("/api/python-pool/stats")
+async def get_python_pool_stats(current_user: dict = Depends(get_current_user)):
+    return python_pool.stats()
+
+# 获取Shell工作进程池统计
+@app.get("/api/shell-pool/stats")
+async def get_shell_pool_stats(current_user: dict = Depends(get_current_user)):
+    return shell_pool.stats()
+
+# 获取定时调度统计
+@app.get("/api/scheduler/stats")
+async def get_scheduler_stats(current_user: dict = Depends(get_current_user)):
+    return scheduler.stats()
+
+# 获取执行日志清理统计
+@app.get("/api/retention/stats")
+async def get_retention_stats(current_user: dict = Depends(get_current_user)):
+    return log_retention.stats()
+
+# 立即清理过期执行日志
+@app.post("/api/retention/purge")
+async def purge_expired_logs(current_user: dict = Depends(get_current_user)):
+    if log_retention.stats()["running"]:
+        raise HTTPException(status_code=409, detail="清理正在进行中")
+    return await log_retention.purge()
+
+# 获取API定义缓存统计
+@app.get("/api/definition-cache/stats")
+async def get_definition_cache_stats(current_user: dict = Depends(get_current_user)):
+    return definition_cache.stats()
 
 # 获取特定API的详细执行日志
 @app.get("/api/definitions/{definition_id}/logs")
 async def get_api_logs(
     definition_id: int,
     limit: int = Query(20, description="返回数量限制"),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页返回的next_cursor）"),
+    status: Optional[str] = Query(None, description="按状态筛选，多个用逗号分隔"),
+    since: Optional[datetime] = Query(None, description="执行时间不早于"),
+    until: Optional[datetime] = Query(None, description="执行时间早于"),
+    min_duration_ms: Optional[int] = Query(None, description="最短执行时长(毫秒)"),
+    max_duration_ms: Optional[int] = Query(None, description="最长执行时长(毫秒)"),
+    fields: Optional[str] = Query(None, description="返回的字段，多个用逗号分隔"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
     # 验证API是否存在
-    api_def = db.query(APIDefinition).filter(APIDefinition.id == definition_id).first()
+    api_def = await db.get(APIDefinition, definition_id)
     if not api_def:
         raise HTTPException(status_code=404, detail="API定义不存在")
     
     # 获取执行记录
-    executions = db.query(APIExecution).filter(
-        APIExecution.api_definition_id == definition_id
-    ).order_by(APIExecution.execution_time.desc()).limit(limit).all()
+    selected_fields = parse_fields(fields)
+    executions, next_cursor = await list_executions(
+        db, select(APIExecution).where(APIExecution.api_definition_id == definition_id),
+        limit, cursor=cursor, fields=selected_fields, status=status, since=since, until=until,
+        min_duration_ms=min_duration_ms, max_duration_ms=max_duration_ms
+    )
     
     return {
         "api_info": {
@@ -460,19 +1308,8 @@ async def get_api_logs(
             "description": api_def.description,
             "endpoint_path": api_def.endpoint_path
         },
-        "logs": [
-            {
-                "id": e.id,
-                "execution_time": e.execution_time.isoformat(),
-                "parameters": e.parameters,
-                "result": e.result,
-                "status": e.status,
-                "duration_ms": e.duration_ms,
-                "error_message": e.error_message,
-                "request_ip": e.request_ip
-            }
-            for e in executions
-        ]
+        "logs": [serialize_execution(e, selected_fields) for e in executions],
+        "next_cursor": next_cursor
     }
 
 # 获取会话信息
@@ -485,39 +1322,41 @@ async def get_session_info(current_user: dict = Depends(get_current_user)):
         "ip_address": current_user["ip_address"]
     }
 
+# 获取会话存储统计
+@app.get("/api/sessions/stats")
+async def get_session_stats(current_user: dict = Depends(get_current_user)):
+    return await session_store.stats()
+
 # 删除单个日志记录
 @app.delete("/api/executions/{execution_id}")
 async def delete_execution_log(
     execution_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
-    execution = db.query(APIExecution).filter(APIExecution.id == execution_id).first()
+    execution = await db.get(APIExecution, execution_id)
     if not execution:
         raise HTTPException(status_code=404, detail="日志记录不存在")
     
-    db.delete(execution)
-    db.commit()
+    await db.delete(execution)
+    await db.commit()
     return {"success": True, "message": "日志记录删除成功"}
 
 # 删除API的所有日志记录
 @app.delete("/api/definitions/{definition_id}/logs")
 async def delete_api_logs(
     definition_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
     # 验证API是否存在
-    api_def = db.query(APIDefinition).filter(APIDefinition.id == definition_id).first()
+    api_def = await db.get(APIDefinition, definition_id)
     if not api_def:
         raise HTTPException(status_code=404, detail="API定义不存在")
     
-    # 删除该API的所有执行记录
-    deleted_count = db.query(APIExecution).filter(
-        APIExecution.api_definition_id == definition_id
-    ).delete()
+    # 分批删除该API的所有执行记录，避免一次大事务长时间锁表
+    deleted_count = await log_retention.delete_in_batches(APIExecution.api_definition_id == definition_id)
     
-    db.commit()
     return {
         "success": True, 
         "message": f"已删除 {deleted_count} 条日志记录",
@@ -528,10 +1367,10 @@ async def delete_api_logs(
 @app.put("/api/definitions/{definition_id}/toggle-logging")
 async def toggle_api_logging(
     definition_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
-    api_def = db.query(APIDefinition).filter(APIDefinition.id == definition_id).first()
+    api_def = await db.get(APIDefinition, definition_id)
     if not api_def:
         raise HTTPException(status_code=404, detail="API定义不存在")
     
@@ -539,7 +1378,8 @@ async def toggle_api_logging(
     current_logging = getattr(api_def, 'enable_logging', True)
     api_def.enable_logging = not current_logging
     
-    db.commit()
+    await db.commit()
+    await invalidate_definition(api_def.api_key)
     return {
         "success": True, 
         "enable_logging": api_def.enable_logging,
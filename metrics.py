@@ -0,0 +1,242 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# 延迟直方图的默认分桶（秒），覆盖1毫秒到1分钟
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Prometheus文本格式的Content-Type
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class Metric:
+    """指标基类：按标签值保存数据，记录时只做一次字典查找和加锁累加"""
+    
+    type_name = ""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+    
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+    
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(Metric):
+    """只增不减的计数"""
+    
+    type_name = "counter"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+    
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in items
+        ]
+
+class Gauge(Counter):
+    """可增可减的当前值"""
+    
+    type_name = "gauge"
+    
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+    
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+    
+    @contextmanager
+    def track(self, *labels):
+        """在代码块执行期间加一"""
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.dec(*labels)
+
+class CallbackGauge(Metric):
+    """导出时才读取的当前值（如连接池、队列状态），记录路径上没有任何开销"""
+    
+    type_name = "gauge"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str],
+                 callback: Callable[[], Dict[Tuple, float]]):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+    
+    def render(self) -> List[str]:
+        try:
+            items = list(self.callback().items())
+        except Exception:
+            items = []
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in items
+        ]
+
+class CallbackCounter(CallbackGauge):
+    """导出时才读取的累计值（如各组件自己维护的计数）"""
+    
+    type_name = "counter"
+
+class Histogram(Metric):
+    """分桶直方图：每个标签组合保存各桶计数、总和与次数"""
+    
+    type_name = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各桶计数..., 总和, 次数]
+        self._values: Dict[Tuple, List[float]] = {}
+    
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(labels)
+            if data is None:
+                data = self._values[labels] = [0] * (len(self.buckets) + 3)
+            data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+    
+    @contextmanager
+    def time(self, *labels):
+        """记录代码块的执行时间"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(labels, list(data)) for labels, data in self._values.items()]
+        lines = self.header()
+        for labels, data in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), data):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {_format_value(cumulative)}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(data[-2])}")
+            lines.append(f"{self.name}_count{label_text} {_format_value(data[-1])}")
+        return lines
+
+class Registry:
+    """指标注册表，按Prometheus文本格式导出"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+    
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+    
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+    
+    def callback_gauge(self, name: str, documentation: str, labelnames: Iterable[str],
+                       callback: Callable[[], Dict[Tuple, float]]) -> CallbackGauge:
+        return self.register(CallbackGauge(name, documentation, labelnames, callback))
+    
+    def callback_counter(self, name: str, documentation: str, labelnames: Iterable[str],
+                         callback: Callable[[], Dict[Tuple, float]]) -> CallbackCounter:
+        return self.register(CallbackCounter(name, documentation, labelnames, callback))
+    
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# 全局指标注册表
+registry = Registry()
+
+# /execute 端到端耗时和各阶段耗时
+EXECUTE_DURATION = registry.histogram(
+    "api_execute_duration_seconds", "End-to-end /execute latency", ["action_type"]
+)
+EXECUTE_PHASE_DURATION = registry.histogram(
+    "api_execute_phase_duration_seconds",
+    "/execute latency by phase (lookup, log_insert, admission, render, run, log_update)",
+    ["phase"]
+)
+# 执行次数（按操作类型、按API定义）
+EXECUTIONS = registry.counter(
+    "api_executions_total", "Executions by action type and status", ["action_type", "status"]
+)
+DEFINITION_EXECUTIONS = registry.counter(
+    "api_definition_executions_total", "Executions by API definition and status", ["definition_id", "status"]
+)
+CACHE_HITS = registry.counter(
+    "api_result_cache_hits_total", "Executions served from the result cache", ["definition_id"]
+)
+IN_FLIGHT = registry.gauge(
+    "api_executions_in_flight", "Actions currently running", ["action_type"]
+)
+# 启动子进程耗时
+SUBPROCESS_SPAWN = registry.histogram(
+    "api_subprocess_spawn_seconds", "Time to spawn a subprocess", ["kind"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+HTTP_IN_FLIGHT = registry.gauge(
+    "api_http_pool_requests_in_flight", "Outbound HTTP requests currently using the shared pool"
+)
+
+def record_execution(action_type: str, definition_id: int, success: bool, cached: bool = False):
+    """记录一次执行的结果"""
+    status = "success" if success else "error"
+    EXECUTIONS.inc(action_type, status)
+    DEFINITION_EXECUTIONS.inc(str(definition_id), status)
+    if cached:
+        CACHE_HITS.inc(str(definition_id))
+
+def observe_phase(phase: str, start: float) -> float:
+    """记录从start(perf_counter)到现在的阶段耗时，返回当前时间便于衔接下一阶段"""
+    now = time.perf_counter()
+    EXECUTE_PHASE_DURATION.observe(now - start, phase)
+    return now
+
+def render() -> str:
+    """导出全部指标"""
+    return registry.render()
\ No newline at end of file
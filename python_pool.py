@@ -0,0 +1,264 @@
+import asyncio
+import hashlib
+import json
+import os
+import signal
+import sys
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import metrics
+from config import settings
+from resource_limits import ResourceUsage
+from result_store import ExecutionTimeout, read_output_file
+
+# 工作进程脚本路径
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_worker.py")
+
+# 不传递给用户代码的敏感环境变量
+SENSITIVE_ENV_VARS = ("SUPABASE_URL", "SECRET_KEY", "ADMIN_USERNAME", "ADMIN_PASSWORD", "REDIS_URL")
+
+def code_key(code: str) -> str:
+    """代码缓存键"""
+    return hashlib.sha1(code.encode("utf-8")).hexdigest()
+
+def sandbox_env() -> Dict[str, str]:
+    """用户代码的运行环境变量（去掉服务自身的敏感配置）"""
+    env = {key: value for key, value in os.environ.items() if key not in SENSITIVE_ENV_VARS}
+    env["PYTHONIOENCODING"] = "utf-8"
+    return env
+
+class PythonWorker:
+    """单个预热的Python工作进程"""
+    
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.runs = 0
+        self.maxrss_kb = 0
+        # 用户代码修改了已加载模块的状态，不能再复用
+        self.dirty = False
+        # 该进程已编译缓存的代码
+        self.cached_keys = set()
+    
+    @classmethod
+    async def spawn(cls) -> "PythonWorker":
+        """
+        启动工作进程（独立会话，超时时可以整组终止）
+        与直接执行临时脚本一致：使用服务的工作目录，PYTHONPATH和用户site-packages照常生效
+        """
+        preload = [module.strip() for module in settings.PYTHON_POOL_PRELOAD.split(",") if module.strip()]
+        with metrics.SUBPROCESS_SPAWN.time("python_worker"):
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, WORKER_SCRIPT, *preload,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                env=sandbox_env(),
+                start_new_session=True
+            )
+        return cls(process)
+    
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+    
+    async def run(self, key: str, code: str, params: Dict[str, Any],
+                  max_output_bytes: Optional[int] = None) -> Dict[str, Any]:
+        """执行一次代码，返回工作进程的响应"""
+        request = {"key": key, "params": params, "max_output": max_output_bytes}
+        if key not in self.cached_keys:
+            request["code"] = code
+        self.process.stdin.write(json.dumps(request).encode("utf-8") + b"\n")
+        await self.process.stdin.drain()
+        
+        header = await self.process.stdout.readline()
+        if not header:
+            raise RuntimeError("Python工作进程异常退出")
+        response = json.loads(await self.process.stdout.readexactly(int(header)))
+        
+        self.runs += 1
+        self.maxrss_kb = response.get("maxrss_kb", 0)
+        self.dirty = self.dirty or bool(response.get("recycle"))
+        if response.get("code_cached"):
+            self.cached_keys.add(key)
+        return response
+    
+    def partial_output(self, max_output_bytes: Optional[int]) -> Tuple[str, str]:
+        """超时终止前已产生的输出（工作进程的标准输出/标准错误重定向到了临时文件，通过/proc读取）"""
+        try:
+            return (
+                read_output_file(f"/proc/{self.process.pid}/fd/1", max_output_bytes),
+                read_output_file(f"/proc/{self.process.pid}/fd/2", max_output_bytes)
+            )
+        except OSError:
+            return "", ""
+    
+    def kill(self):
+        """终止工作进程及其创建的所有子进程"""
+        if self.alive:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+class WorkerPool:
+    """
+    预热工作进程池：工作进程常驻，执行达到指定次数（或子类的其它条件）后回收重建；
+    超时、取消或出错时整组终止工作进程，并在后台补充新的进程
+    """
+    
+    # 工作进程类（需要提供spawn、alive、runs、partial_output、kill）
+    worker_class = PythonWorker
+    label = "Python"
+    
+    def __init__(self, size: int, max_runs: int):
+        self.size = size
+        self.max_runs = max_runs
+        self._idle: List[Any] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._closed = False
+        # 后台补充工作进程的任务，关闭时等待完成
+        self._replenishing: Set[asyncio.Task] = set()
+        self._spawned = 0
+        self._recycled = 0
+        self._executions = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+    
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.size)
+        return self._semaphore
+    
+    async def start(self):
+        """预先启动全部工作进程"""
+        if not self.enabled:
+            return
+        self._closed = False
+        while len(self._idle) < self.size:
+            self._idle.append(await self._spawn())
+    
+    async def close(self):
+        """关闭所有空闲工作进程（等待后台补充任务结束，补充的进程随即被终止）"""
+        self._closed = True
+        if self._replenishing:
+            await asyncio.gather(*self._replenishing, return_exceptions=True)
+        while self._idle:
+            worker = self._idle.pop()
+            worker.kill()
+            # 回收进程，避免事件循环关闭后子进程监视器仍在等待
+            await worker.process.wait()
+    
+    async def _spawn(self):
+        self._spawned += 1
+        return await self.worker_class.spawn()
+    
+    async def _replenish(self, old_worker):
+        # 先回收被终止的工作进程，避免事件循环关闭后子进程监视器仍在等待
+        await old_worker.process.wait()
+        if self._closed:
+            return
+        try:
+            worker = await self._spawn()
+        except Exception as e:
+            print(f"✗ 启动{self.label}工作进程失败: {e}")
+            return
+        if self._closed or len(self._idle) >= self.size:
+            worker.kill()
+            await worker.process.wait()
+        else:
+            self._idle.append(worker)
+    
+    def _should_recycle(self, worker) -> bool:
+        if not worker.alive:
+            return True
+        return bool(self.max_runs and worker.runs >= self.max_runs)
+    
+    async def run(self, call: Callable[[Any], Awaitable[Any]], timeout: float,
+                  max_output_bytes: Optional[int] = None) -> Any:
+        """
+        取一个空闲工作进程执行call(worker)
+        超时抛出 ExecutionTimeout（带终止前的部分输出，最多max_output_bytes字节），并终止整个进程组
+        """
+        async with self.semaphore:
+            worker = self._idle.pop() if self._idle else await self._spawn()
+            healthy = False
+            try:
+                response = await asyncio.wait_for(call(worker), timeout=timeout)
+                healthy = True
+            except asyncio.TimeoutError:
+                raise ExecutionTimeout(*worker.partial_output(max_output_bytes))
+            finally:
+                # 超时、取消或异常时工作进程状态未知，直接终止
+                if healthy and not self._closed and not self._should_recycle(worker) and len(self._idle) < self.size:
+                    self._idle.append(worker)
+                else:
+                    if healthy:
+                        self._recycled += 1
+                    worker.kill()
+                    # 后台补充新的工作进程，保持进程池预热（保留任务引用，关闭时等待）
+                    if not self._closed:
+                        task = asyncio.create_task(self._replenish(worker))
+                        self._replenishing.add(task)
+                        task.add_done_callback(self._replenishing.discard)
+        
+        self._executions += 1
+        return response
+    
+    def stats(self) -> Dict[str, Any]:
+        """进程池统计信息"""
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "spawned": self._spawned,
+            "recycled": self._recycled,
+            "executions": self._executions,
+            "max_runs": self.max_runs
+        }
+
+class PythonWorkerPool(WorkerPool):
+    """
+    Python预热工作进程池
+    工作进程常驻并缓存编译后的代码，参数作为数据传入；
+    执行达到指定次数、内存增长超限或用户代码修改了已加载模块后回收重建
+    """
+    
+    def __init__(self, size: int, max_runs: int, max_rss_mb: int):
+        super().__init__(size, max_runs)
+        self.max_rss_mb = max_rss_mb
+    
+    def _should_recycle(self, worker: PythonWorker) -> bool:
+        if super()._should_recycle(worker) or worker.dirty:
+            return True
+        return bool(self.max_rss_mb and worker.maxrss_kb > self.max_rss_mb * 1024)
+    
+    async def execute(self, code: str, params: Dict[str, Any], timeout: float,
+                      key: Optional[str] = None, max_output_bytes: Optional[int] = None,
+                      usage: Optional[ResourceUsage] = None) -> Tuple[int, str, str]:
+        """
+        在工作进程中执行代码，输出最多保留max_output_bytes字节（保留开头和结尾）
+        usage记录本次执行的CPU时间（工作进程常驻，峰值内存无法按次统计）
+        返回: (返回码, 标准输出, 标准错误)，超时抛出 ExecutionTimeout（带部分输出）
+        """
+        response = await self.run(
+            lambda worker: worker.run(key or code_key(code), code, params, max_output_bytes),
+            timeout,
+            max_output_bytes
+        )
+        if usage is not None and "cpu_user" in response:
+            usage.record(response["cpu_user"], response["cpu_system"])
+        return response["returncode"], response["stdout"], response["stderr"]
+    
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["max_rss_mb"] = self.max_rss_mb
+        return stats
+
+# 全局Python工作进程池
+python_pool = PythonWorkerPool(
+    size=settings.PYTHON_POOL_SIZE,
+    max_runs=settings.PYTHON_POOL_MAX_RUNS,
+    max_rss_mb=settings.PYTHON_POOL_MAX_RSS_MB
+)
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""
+Python预热工作进程 - 由python_pool启动，循环接收代码和参数并执行
+
+协议（每行一个JSON请求，响应为"长度\\n" + JSON）:
+  请求: {"key": 代码缓存键, "code": 代码(已缓存时可省略), "params": {参数}, "max_output": 输出上限(字节，可省略)}
+  响应: {"returncode": 返回码, "stdout": 标准输出, "stderr": 标准错误, "maxrss_kb": 峰值内存,
+         "cpu_user"/"cpu_system": 本次执行的CPU时间(秒，含子进程), "code_cached": 代码是否已缓存,
+         "recycle": 用户代码修改了已加载的模块，工作进程需要回收}
+
+每次执行后恢复环境变量、sys.path和工作目录
+"""
+
+import builtins
+import importlib
+import json
+import os
+import resource
+import sys
+import tempfile
+import traceback
+
+# 截断标记（与result_store.TRUNCATION_MARKER一致）
+TRUNCATION_MARKER = "\n...[输出已截断，省略 {} 字节]...\n"
+
+# 协议使用的JSON函数（在用户代码执行前保存，用户代码替换json.dumps/json.loads不影响协议）
+_json_dumps = json.dumps
+_json_loads = json.loads
+
+def module_snapshot() -> dict:
+    """已加载模块及其全局变量的快照，用于检测用户代码是否修改了模块状态"""
+    return {
+        name: (module, dict(getattr(module, "__dict__", None) or {}))
+        for name, module in list(sys.modules.items())
+    }
+
+def modules_changed(snapshot: dict) -> bool:
+    """执行前已加载的模块是否被移除、替换，或全局变量被修改（新导入的模块不计入）"""
+    for name, (module, namespace) in snapshot.items():
+        if sys.modules.get(name) is not module:
+            return True
+        current = getattr(module, "__dict__", None) or {}
+        if len(current) != len(namespace):
+            return True
+        for key, value in namespace.items():
+            if current.get(key, namespace) is not value:
+                return True
+    return False
+
+def read_output(output_file, max_bytes):
+    """读取输出文件，超过上限时只读取开头和结尾各一半"""
+    size = output_file.seek(0, os.SEEK_END)
+    output_file.seek(0)
+    if not max_bytes or size <= max_bytes:
+        return output_file.read().decode("utf-8", errors="replace")
+    tail_bytes = max_bytes // 2
+    head = output_file.read(max_bytes - tail_bytes)
+    output_file.seek(size - tail_bytes)
+    tail = output_file.read()
+    return (
+        head.decode("utf-8", errors="ignore")
+        + TRUNCATION_MARKER.format(size - max_bytes)
+        + tail.decode("utf-8", errors="ignore")
+    )
+
+def main():
+    # 预加载常用模块，用户代码再次import时无需重新加载
+    for module in sys.argv[1:]:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+    
+    # 协议使用原始stdin/stdout，用户代码的输入改为/dev/null，输出（包括子进程）重定向到临时文件
+    protocol_out = os.fdopen(os.dup(1), "wb")
+    requests_in = os.fdopen(os.dup(0), "rb")
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    stdout_file = tempfile.TemporaryFile()
+    stderr_file = tempfile.TemporaryFile()
+    os.dup2(stdout_file.fileno(), 1)
+    os.dup2(stderr_file.fileno(), 2)
+    # 与直接执行临时脚本一致：脚本所在的临时目录作为sys.path[0]，而不是工作进程脚本所在目录
+    sys.path[0] = tempfile.gettempdir()
+    original_streams = (sys.stdout, sys.stderr)
+    code_cache = {}
+    
+    for line in requests_in:
+        if not line.strip():
+            continue
+        request = _json_loads(line)
+        key = request["key"]
+        
+        for output_file in (stdout_file, stderr_file):
+            output_file.seek(0)
+            output_file.truncate()
+        
+        # 执行前的环境变量、模块搜索路径和工作目录，执行后恢复，避免影响下一次执行
+        environ = dict(os.environ)
+        path = list(sys.path)
+        work_dir = os.getcwd()
+        modules = module_snapshot()
+        returncode = 0
+        times_before = os.times()
+        try:
+            if key not in code_cache:
+                code_cache[key] = compile(request["code"], "<api-python>", "exec")
+            # 参数作为数据注入全局变量，不拼接源码
+            scope = {"__name__": "__main__", "__builtins__": builtins}
+            scope.update(request.get("params") or {})
+            exec(code_cache[key], scope)
+        except SystemExit as e:
+            if e.code is None:
+                returncode = 0
+            elif isinstance(e.code, int):
+                returncode = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                returncode = 1
+        except BaseException:
+            traceback.print_exc()
+            returncode = 1
+        finally:
+            # 每次执行后恢复输出流、环境变量、模块搜索路径和工作目录
+            sys.stdout, sys.stderr = original_streams
+            sys.stdout.flush()
+            sys.stderr.flush()
+            if os.environ != environ:
+                os.environ.clear()
+                os.environ.update(environ)
+            sys.path[:] = path
+            os.chdir(work_dir)
+        times_after = os.times()
+        # 修改过已加载模块的状态无法恢复，工作进程需要回收
+        recycle = modules_changed(modules)
+        del modules
+        
+        output = {}
+        for name, output_file in (("stdout", stdout_file), ("stderr", stderr_file)):
+            output[name] = read_output(output_file, request.get("max_output"))
+        
+        response = _json_dumps({
+            "returncode": returncode,
+            "stdout": output["stdout"],
+            "stderr": output["stderr"],
+            "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "cpu_user": (times_after.user + times_after.children_user)
+                        - (times_before.user + times_before.children_user),
+            "cpu_system": (times_after.system + times_after.children_system)
+                          - (times_before.system + times_before.children_system),
+            "code_cached": key in code_cache,
+            "recycle": recycle
+        }).encode("utf-8")
+        protocol_out.write(str(len(response)).encode("ascii") + b"\n" + response)
+        protocol_out.flush()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from shared_backend import get_redis, redis_key
+
+# 令牌桶的Lua实现：读取、补充、扣减在Redis中原子完成，使用Redis服务器时间保证多实例一致
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+class RateLimited(Exception):
+    """请求频率超过限制"""
+    
+    def __init__(self, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+class MemoryTokenBuckets:
+    """进程内令牌桶：每个键只保存(令牌数, 上次时间)，检查为O(1)，超过容量时淘汰最久未使用的键"""
+    
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    async def take(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        """
+        取一个令牌
+        返回: (是否允许, 需要等待的秒数)
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [burst, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return True, 0.0
+            bucket[0] = tokens
+            return False, (1 - tokens) / rate
+    
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+class RedisTokenBuckets:
+    """Redis令牌桶：多个worker/副本共享限额"""
+    
+    def __init__(self, redis):
+        self.redis = redis
+        self._script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+    
+    async def take(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        allowed, retry_after = await self._script(keys=[redis_key("ratelimit", key)], args=[rate, burst])
+        return bool(int(allowed)), float(retry_after)
+
+class RateLimiter:
+    """
+    按API密钥和客户端IP限流（令牌桶）
+    限额来自API定义（每分钟请求数），配置了Redis时多实例共享，Redis不可用时退回进程内限流
+    """
+    
+    def __init__(self, backend: str, max_keys: int):
+        self.backend = backend
+        self._memory = MemoryTokenBuckets(max_keys)
+        self._redis_buckets: Optional[RedisTokenBuckets] = None
+        self._allowed = 0
+        self._rejected = 0
+        self._backend_errors = 0
+    
+    def _shared(self) -> Optional[RedisTokenBuckets]:
+        if self.backend == "memory":
+            return None
+        redis = get_redis()
+        if redis is None:
+            return None
+        if self._redis_buckets is None or self._redis_buckets.redis is not redis:
+            self._redis_buckets = RedisTokenBuckets(redis)
+        return self._redis_buckets
+    
+    async def _take(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        shared = self._shared()
+        if shared is not None:
+            try:
+                return await shared.take(key, rate, burst)
+            except Exception as e:
+                self._backend_errors += 1
+                if self._backend_errors == 1:
+                    print(f"⚠️ Redis限流失败，退回进程内限流: {e}")
+        return await self._memory.take(key, rate, burst)
+    
+    async def check(self, api_def, client_ip: str):
+        """检查请求是否超过限额，超过时抛出RateLimited（不访问数据库）"""
+        limits = (
+            ("key", api_def.api_key, api_def.key_rate_limit, "API密钥"),
+            ("ip", f"{api_def.id}:{client_ip}", api_def.ip_rate_limit, "客户端IP")
+        )
+        for scope, identity, per_minute, label in limits:
+            if not per_minute or per_minute <= 0:
+                continue
+            rate = per_minute / 60.0
+            burst = float(api_def.rate_limit_burst or max(1, int(per_minute)))
+            allowed, retry_after = await self._take(f"{scope}:{identity}", rate, burst)
+            if not allowed:
+                self._rejected += 1
+                raise RateLimited(f"{label}请求过于频繁，请稍后重试", retry_after)
+        self._allowed += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """限流统计信息"""
+        return {
+            "backend": "redis" if self._shared() is not None else "memory",
+            "allowed": self._allowed,
+            "rejected": self._rejected,
+            "backend_errors": self._backend_errors,
+            "memory_keys": len(self._memory)
+        }
+
+# 全局限流器
+rate_limiter = RateLimiter(backend=settings.RATE_LIMIT_BACKEND, max_keys=settings.RATE_LIMIT_MAX_KEYS)
\ No newline at end of file
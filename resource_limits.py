@@ -0,0 +1,94 @@
+import json
+import resource
+import sys
+from typing import Any, Dict, List, Optional
+
+from config import settings
+
+# 定义字段 -> (全局默认值设置, rlimit, 换算为rlimit单位的倍数)
+LIMIT_FIELDS = {
+    "cpu_limit_seconds": ("EXEC_CPU_LIMIT_SECONDS", resource.RLIMIT_CPU, 1),
+    "memory_limit_mb": ("EXEC_MEMORY_LIMIT_MB", resource.RLIMIT_AS, 1024 * 1024),
+    "max_open_files": ("EXEC_MAX_OPEN_FILES", resource.RLIMIT_NOFILE, 1),
+    "max_processes": ("EXEC_MAX_PROCESSES", resource.RLIMIT_NPROC, 1)
+}
+
+# 设置资源限制后exec目标命令的包装程序（参数: 限制列表JSON、命令及参数）
+# 不使用preexec_fn：fork后的子进程中执行Python代码，服务有其它线程时可能因锁死锁
+_LIMIT_WRAPPER = """
+import json, os, resource, sys
+try:
+    for limit, value, cpu in json.loads(sys.argv[1]):
+        _, hard = resource.getrlimit(limit)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        if cpu:
+            # 超过软限制时收到SIGXCPU，再多1秒仍未退出则被内核终止
+            resource.setrlimit(limit, (value, value + 1 if hard == resource.RLIM_INFINITY else hard))
+        else:
+            resource.setrlimit(limit, (value, value))
+except (OSError, ValueError) as e:
+    sys.stderr.write(f"设置资源限制失败: {e}\\n")
+    sys.exit(126)
+os.execvp(sys.argv[2], sys.argv[2:])
+"""
+
+class ResourceLimits:
+    """
+    Shell/Python子进程的资源限制（rlimit），由包装程序在exec目标命令之前设置，对其启动的所有进程同样生效
+    0或空表示不限制；进程数限制按用户计算（包括该用户的其它进程），以root运行时无效
+    """
+    
+    __slots__ = tuple(LIMIT_FIELDS)
+    
+    def __init__(self, **limits):
+        for name in LIMIT_FIELDS:
+            value = limits.get(name)
+            setattr(self, name, int(value) if value and value > 0 else None)
+    
+    @classmethod
+    def for_definition(cls, api_def) -> "ResourceLimits":
+        """API定义的资源限制，未设置的项使用全局默认值"""
+        limits = {}
+        for name, (setting, _, _) in LIMIT_FIELDS.items():
+            value = getattr(api_def, name, None)
+            limits[name] = value if value is not None else getattr(settings, setting)
+        return cls(**limits)
+    
+    @property
+    def enabled(self) -> bool:
+        return any(getattr(self, name) is not None for name in LIMIT_FIELDS)
+    
+    def wrap(self, args: List[str]) -> List[str]:
+        """返回先设置资源限制（不超过当前的硬限制）再exec args的命令"""
+        limits = [
+            [limit, getattr(self, name) * scale, limit == resource.RLIMIT_CPU]
+            for name, (_, limit, scale) in LIMIT_FIELDS.items()
+            if getattr(self, name) is not None
+        ]
+        return [sys.executable, "-I", "-S", "-c", _LIMIT_WRAPPER, json.dumps(limits), *args]
+    
+    def to_dict(self) -> Dict[str, Optional[int]]:
+        return {name: getattr(self, name) for name in LIMIT_FIELDS}
+
+class ResourceUsage:
+    """一次执行的资源使用：子进程（含其子进程）的用户态/内核态CPU时间和峰值内存，无法获取的项为None"""
+    
+    __slots__ = ("cpu_user_ms", "cpu_system_ms", "max_rss_kb")
+    
+    def __init__(self):
+        self.cpu_user_ms: Optional[int] = None
+        self.cpu_system_ms: Optional[int] = None
+        self.max_rss_kb: Optional[int] = None
+    
+    def record(self, user_seconds: float, system_seconds: float, max_rss_kb: Optional[int] = None):
+        self.cpu_user_ms = int(user_seconds * 1000)
+        self.cpu_system_ms = int(system_seconds * 1000)
+        self.max_rss_kb = max_rss_kb
+    
+    def fields(self) -> Dict[str, Any]:
+        """写入执行记录的字段"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+# 不限制资源
+NO_LIMITS = ResourceLimits()
\ No newline at end of file
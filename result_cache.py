@@ -0,0 +1,149 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from config import settings
+
+# 执行结果: (结果, 是否成功, 错误信息)
+ExecutionResult = Tuple[str, bool, str]
+
+class ResultCache:
+    """
+    执行结果缓存（按API定义开启）
+    以 (api_key, 规范化的参数) 为键，TTL过期，按条数和总字节数LRU淘汰；
+    相同请求并发时合并为一次执行，所有等待者共享同一个结果
+    """
+    
+    def __init__(self, max_size: int, max_bytes: int):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        # 键 -> (过期时间, 执行结果, 字节数)
+        self._entries: "OrderedDict[Tuple[str, str], tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        # 失效代数：执行期间发生失效时不缓存执行结果（全部清空时递增全局代数）
+        self._generations: Dict[str, int] = {}
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+    
+    @staticmethod
+    def make_key(api_key: str, parameters: Dict[str, Any]) -> Tuple[str, str]:
+        """缓存键：参数按名称排序后序列化，参数顺序不同的请求命中同一条缓存"""
+        return api_key, json.dumps(parameters, sort_keys=True, ensure_ascii=False)
+    
+    async def get_or_execute(self, api_def, parameters: Dict[str, Any],
+                             execute: Callable[[], Awaitable[ExecutionResult]]) -> Tuple[ExecutionResult, bool]:
+        """
+        读取缓存或执行
+        返回: (执行结果, 是否来自缓存/合并的执行)
+        """
+        ttl = api_def.result_cache_ttl
+        if not ttl or ttl <= 0:
+            return await execute(), False
+        
+        key = self.make_key(api_def.api_key, parameters)
+        cached = self._get(key)
+        if cached is not None:
+            return cached, True
+        
+        task = self._inflight.get(key)
+        if task is not None:
+            self._coalesced += 1
+            return await asyncio.shield(task), True
+        
+        self._misses += 1
+        # 执行放在独立任务中，发起请求的客户端断开不会影响其它等待者
+        task = asyncio.create_task(self._execute(key, ttl, execute, self._current_generation(key[0])))
+        self._inflight[key] = task
+        return await asyncio.shield(task), False
+    
+    async def _execute(self, key: Tuple[str, str], ttl: float,
+                       execute: Callable[[], Awaitable[ExecutionResult]], generation: tuple) -> ExecutionResult:
+        try:
+            result = await execute()
+            # 只缓存成功的结果
+            if result[1]:
+                self._put(key, ttl, result, generation)
+            return result
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                self._inflight.pop(key, None)
+    
+    def _current_generation(self, api_key: str) -> tuple:
+        with self._lock:
+            return self._generation, self._generations.get(api_key, 0)
+    
+    def _get(self, key: Tuple[str, str]):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+    
+    def _put(self, key: Tuple[str, str], ttl: float, result: ExecutionResult, generation: tuple):
+        size = len((result[0] or "").encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            # 执行期间定义已修改或删除，结果来自旧定义，不写入缓存
+            if generation != (self._generation, self._generations.get(key[0], 0)):
+                return
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, result, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_size or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+    
+    def _remove(self, key: Tuple[str, str]):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+    
+    def invalidate(self, api_key: Optional[str] = None):
+        """
+        清除某个API的全部缓存结果（定义修改或删除时调用），api_key为空时清空全部
+        正在执行的请求不再被新请求合并，其结果也不会写入缓存
+        """
+        with self._lock:
+            if api_key is None:
+                self._entries.clear()
+                self._bytes = 0
+                self._generations.clear()
+                self._generation += 1
+                self._inflight.clear()
+                return
+            for key in [key for key in self._entries if key[0] == api_key]:
+                self._remove(key)
+            self._generations[api_key] = self._generations.get(api_key, 0) + 1
+            for key in [key for key in self._inflight if key[0] == api_key]:
+                del self._inflight[key]
+    
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_size": self.max_size,
+                "max_bytes": self.max_bytes,
+                "inflight": len(self._inflight),
+                "hits": self._hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced,
+                "hit_rate": round(self._hits / lookups * 100, 2) if lookups else 0
+            }
+
+# 全局结果缓存
+result_cache = ResultCache(max_size=settings.RESULT_CACHE_SIZE, max_bytes=settings.RESULT_CACHE_MAX_BYTES)
\ No newline at end of file
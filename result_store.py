@@ -0,0 +1,145 @@
+import asyncio
+import gzip
+import os
+from typing import Any, Dict, Optional, Tuple, Union
+
+from config import settings
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 截断标记（python_worker.py 中有相同的格式）
+TRUNCATION_MARKER = "\n...[输出已截断，省略 {} 字节]...\n"
+
+class OutputBuffer:
+    """
+    有上限的输出缓冲：保留开头和结尾各一半，中间超出的部分只计数
+    内存占用与输出总量无关
+    """
+    
+    def __init__(self, max_bytes: int):
+        self.tail_limit = max_bytes // 2
+        self.head_limit = max_bytes - self.tail_limit
+        self._head = bytearray()
+        self._tail = bytearray()
+        self.dropped_bytes = 0
+    
+    def append(self, data: Union[str, bytes]):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        room = self.head_limit - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        if not data:
+            return
+        self._tail += data
+        excess = len(self._tail) - self.tail_limit
+        if excess > 0:
+            del self._tail[:excess]
+            self.dropped_bytes += excess
+    
+    @property
+    def truncated(self) -> bool:
+        return self.dropped_bytes > 0
+    
+    def getvalue(self, encoding: str = "utf-8") -> str:
+        if not self.truncated:
+            return bytes(self._head + self._tail).decode(encoding, errors="replace")
+        # 截断处可能切开多字节字符，忽略不完整的字节
+        return (
+            bytes(self._head).decode(encoding, errors="ignore")
+            + TRUNCATION_MARKER.format(self.dropped_bytes)
+            + bytes(self._tail).decode(encoding, errors="ignore")
+        )
+
+def truncate_output(text: str, max_bytes: int) -> str:
+    """按字节数截断文本，保留开头和结尾"""
+    if not text or len(text) * 4 <= max_bytes:
+        return text
+    buffer = OutputBuffer(max_bytes)
+    buffer.append(text)
+    return buffer.getvalue()
+
+def read_output_file(path: str, max_bytes: Optional[int]) -> str:
+    """读取输出文件，超过上限时只读取开头和结尾（不读取中间部分）"""
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(0)
+        if not max_bytes or size <= max_bytes:
+            return f.read().decode("utf-8", errors="replace")
+        tail_bytes = max_bytes // 2
+        head = f.read(max_bytes - tail_bytes)
+        f.seek(size - tail_bytes)
+        tail = f.read()
+    return (
+        head.decode("utf-8", errors="ignore")
+        + TRUNCATION_MARKER.format(size - max_bytes)
+        + tail.decode("utf-8", errors="ignore")
+    )
+
+class ExecutionTimeout(asyncio.TimeoutError):
+    """执行超时，带有终止前已产生的部分输出"""
+    
+    def __init__(self, stdout: str = "", stderr: str = ""):
+        super().__init__()
+        self.stdout = stdout
+        self.stderr = stderr
+
+def output_limit(max_output_bytes: Optional[int]) -> int:
+    """定义的输出上限，未设置时使用全局默认值"""
+    return max_output_bytes if max_output_bytes and max_output_bytes > 0 else settings.OUTPUT_MAX_BYTES
+
+def result_preview(text: Optional[str], max_bytes: Optional[int] = None) -> Tuple[Optional[str], bool]:
+    """
+    结果预览（只保留开头部分）
+    返回: (预览文本, 是否被截断)
+    """
+    max_bytes = max_bytes or settings.RESULT_PREVIEW_BYTES
+    if not text or len(text) * 4 <= max_bytes:
+        return text, False
+    data = text.encode("utf-8")
+    if len(data) <= max_bytes:
+        return text, False
+    return data[:max_bytes].decode("utf-8", errors="ignore") + "...", True
+
+def compress_result(text: str) -> Tuple[bytes, str]:
+    """压缩结果，优先使用zstd，未安装时使用gzip"""
+    data = text.encode("utf-8")
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(data), "zstd"
+    return gzip.compress(data, compresslevel=6), "gzip"
+
+def decompress_result(blob: bytes, encoding: str) -> str:
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("结果使用zstd压缩，但未安装zstandard")
+        data = zstandard.ZstdDecompressor().decompress(blob)
+    elif encoding == "gzip":
+        data = gzip.decompress(blob)
+    else:
+        raise ValueError(f"未知的结果压缩格式: {encoding}")
+    return data.decode("utf-8", errors="replace")
+
+def pack_result(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    写入数据库前处理执行结果：
+    超过压缩阈值的结果压缩后存入result_blob，result字段只保留预览
+    """
+    result = record.get("result")
+    if not result:
+        return record
+    size = len(result.encode("utf-8"))
+    packed = dict(record, result_size=size)
+    if size > settings.RESULT_COMPRESS_THRESHOLD:
+        packed["result_blob"], packed["result_encoding"] = compress_result(result)
+        packed["result"] = result_preview(result)[0]
+    return packed
+
+def unpack_result(execution) -> Optional[str]:
+    """读取执行记录的完整结果"""
+    if execution.result_blob is not None:
+        return decompress_result(execution.result_blob, execution.result_encoding)
+    return execution.result
\ No newline at end of file
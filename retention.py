@@ -0,0 +1,253 @@
+import asyncio
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, text
+
+from config import settings
+from database import SessionLocal, engine, APIDefinition, APIExecution, APIExecutionStat
+from executor import run_sync
+
+# 分区表名中的开始日期，如 api_executions_p20260101
+PARTITION_PREFIX = "api_executions_p"
+# 分区范围上界，如 FOR VALUES FROM ('2026-01-01 00:00:00') TO ('2026-02-01 00:00:00')
+PARTITION_BOUND_PATTERN = re.compile(r"TO \('([^']+)'\)")
+
+class LogRetention:
+    """
+    执行日志保留与清理
+    按API定义的保留天数（未设置时使用全局设置）定期分批删除过期日志，每批一个短事务，
+    批次之间让出时间，清理不会长时间锁表或阻塞执行请求；
+    PostgreSQL上api_executions为按时间分区的表时，提前创建后续分区并直接删除整个过期分区
+    """
+    
+    def __init__(self, interval: float, batch_size: int, batch_pause: float, default_days: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.default_days = default_days
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        self.last_run: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.deleted_logs = 0
+        self.deleted_stats = 0
+        self.dropped_partitions = 0
+    
+    def start(self):
+        """启动定期清理任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        # 首次清理延迟执行，避开服务启动时的负载
+        await asyncio.sleep(min(self.interval, 60))
+        while True:
+            await self.purge()
+            await asyncio.sleep(self.interval)
+    
+    async def purge(self) -> Dict[str, int]:
+        """执行一次清理，返回本次删除的数量"""
+        if self._running:
+            return {}
+        self._running = True
+        summary = {"logs": 0, "stats": 0, "partitions": 0}
+        try:
+            if engine.dialect.name == "postgresql" and await run_sync(self._is_partitioned):
+                summary["partitions"] = await run_sync(self._maintain_partitions)
+            
+            default_cutoff = self._cutoff(self.default_days)
+            if default_cutoff is not None:
+                # 未单独设置保留天数的定义（包括已删除定义的遗留日志）使用全局设置
+                overridden = select(APIDefinition.id).where(APIDefinition.retention_days.isnot(None))
+                summary["logs"] += await self.delete_in_batches(
+                    APIExecution.execution_time < default_cutoff,
+                    APIExecution.api_definition_id.notin_(overridden)
+                )
+            for definition_id, days in await run_sync(self._definition_retention):
+                cutoff = self._cutoff(days)
+                if cutoff is not None:
+                    summary["logs"] += await self.delete_in_batches(
+                        APIExecution.api_definition_id == definition_id,
+                        APIExecution.execution_time < cutoff
+                    )
+            
+            summary["stats"] = await run_sync(self._purge_stats)
+            self.deleted_logs += summary["logs"]
+            self.deleted_stats += summary["stats"]
+            self.dropped_partitions += summary["partitions"]
+            self.last_error = None
+            if any(summary.values()):
+                print(f"✓ 已清理过期日志 {summary['logs']} 条，统计汇总 {summary['stats']} 条，分区 {summary['partitions']} 个")
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"✗ 清理过期日志失败: {e}")
+        finally:
+            self.last_run = datetime.utcnow()
+            self._running = False
+        return summary
+    
+    async def delete_in_batches(self, *conditions) -> int:
+        """按条件分批删除执行日志（每批最多batch_size条），返回删除总数"""
+        deleted = 0
+        while True:
+            count = await run_sync(self._delete_batch, conditions)
+            deleted += count
+            if count < self.batch_size:
+                return deleted
+            await asyncio.sleep(self.batch_pause)
+    
+    def _delete_batch(self, conditions) -> int:
+        ids = select(APIExecution.id).where(*conditions).limit(self.batch_size)
+        db = SessionLocal()
+        try:
+            # 先选出一批ID再删除，借助 (api_definition_id, execution_time, id) 等索引定位
+            ids = [row[0] for row in db.execute(ids)]
+            if not ids:
+                return 0
+            db.query(APIExecution).filter(APIExecution.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+            return len(ids)
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _cutoff(days: Optional[int]) -> Optional[datetime]:
+        """保留天数对应的截止时间，0表示永久保留"""
+        if not days or days <= 0:
+            return None
+        return datetime.utcnow() - timedelta(days=days)
+    
+    @staticmethod
+    def _definition_retention() -> List[Tuple[int, int]]:
+        db = SessionLocal()
+        try:
+            return [
+                (definition_id, days)
+                for definition_id, days in db.query(APIDefinition.id, APIDefinition.retention_days)
+                .filter(APIDefinition.retention_days.isnot(None)).all()
+            ]
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _purge_stats() -> int:
+        """删除过期的分钟/小时统计汇总"""
+        now = datetime.utcnow()
+        cutoffs = {
+            "minute": now - timedelta(hours=settings.STATS_MINUTE_RETENTION_HOURS),
+            "hour": now - timedelta(days=settings.STATS_HOUR_RETENTION_DAYS)
+        }
+        db = SessionLocal()
+        try:
+            deleted = 0
+            for bucket_size, cutoff in cutoffs.items():
+                deleted += db.query(APIExecutionStat).filter(
+                    APIExecutionStat.bucket_size == bucket_size,
+                    APIExecutionStat.bucket_start < cutoff
+                ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _is_partitioned() -> bool:
+        with engine.connect() as conn:
+            return conn.execute(text(
+                "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+                "WHERE c.relname = 'api_executions'"
+            )).first() is not None
+    
+    def _maintain_partitions(self) -> int:
+        """提前创建后续分区，删除所有数据都已超过最长保留期的分区，返回删除的分区数"""
+        with engine.begin() as conn:
+            for start, end in self._upcoming_partitions():
+                try:
+                    with conn.begin_nested():
+                        conn.execute(text(
+                            f"CREATE TABLE IF NOT EXISTS {PARTITION_PREFIX}{start:%Y%m%d} PARTITION OF api_executions "
+                            f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+                        ))
+                except Exception as e:
+                    # 与已有分区范围重叠（如修改了分区间隔）时跳过
+                    print(f"⚠️ 创建分区 {PARTITION_PREFIX}{start:%Y%m%d} 失败: {e}")
+            
+            cutoff = self._cutoff(self._longest_retention(conn))
+            if cutoff is None:
+                return 0
+            partitions = conn.execute(text(
+                "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) FROM pg_inherits "
+                "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE parent.relname = 'api_executions'"
+            )).all()
+            dropped = 0
+            for name, bound in partitions:
+                match = PARTITION_BOUND_PATTERN.search(bound or "")
+                # 只删除本服务命名的分区，默认分区和其它分区保持不动
+                if not name.startswith(PARTITION_PREFIX) or match is None:
+                    continue
+                if datetime.fromisoformat(match.group(1)) <= cutoff:
+                    conn.execute(text(f'DROP TABLE "{name}"'))
+                    print(f"✓ 已删除过期分区 {name}")
+                    dropped += 1
+            return dropped
+    
+    def _longest_retention(self, conn) -> int:
+        """所有定义中最长的保留天数（任一为永久保留时返回0）"""
+        values = [row[0] for row in conn.execute(
+            select(APIDefinition.retention_days).distinct().where(APIDefinition.retention_days.isnot(None))
+        )]
+        values.append(self.default_days)
+        if any(not days or days <= 0 for days in values):
+            return 0
+        return max(values)
+    
+    @staticmethod
+    def _upcoming_partitions() -> List[Tuple[datetime, datetime]]:
+        """当前及之后LOG_PARTITIONS_AHEAD个分区的时间范围"""
+        ranges = []
+        start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        if settings.LOG_PARTITION_INTERVAL == "month":
+            start = start.replace(day=1)
+        for _ in range(settings.LOG_PARTITIONS_AHEAD + 1):
+            if settings.LOG_PARTITION_INTERVAL == "month":
+                end = (start + timedelta(days=32)).replace(day=1)
+            else:
+                end = start + timedelta(days=1)
+            ranges.append((start, end))
+            start = end
+        return ranges
+    
+    def stats(self) -> Dict[str, Any]:
+        """清理统计信息"""
+        return {
+            "default_retention_days": self.default_days,
+            "interval": self.interval,
+            "batch_size": self.batch_size,
+            "running": self._running,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "last_error": self.last_error,
+            "deleted_logs": self.deleted_logs,
+            "deleted_stats": self.deleted_stats,
+            "dropped_partitions": self.dropped_partitions
+        }
+
+# 全局日志清理任务
+log_retention = LogRetention(
+    interval=settings.LOG_PURGE_INTERVAL,
+    batch_size=settings.LOG_PURGE_BATCH_SIZE,
+    batch_pause=settings.LOG_PURGE_BATCH_PAUSE,
+    default_days=settings.LOG_RETENTION_DAYS
+)
\ No newline at end of file
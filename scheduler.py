@@ -0,0 +1,586 @@
+import asyncio
+import os
+import random
+import re
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Set
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+import metrics
+from admission import admission
+from config import settings
+from database import AsyncSessionLocal, APIDefinition, ScheduleState, SchedulerLease
+from definition_cache import CachedDefinition
+from execution_counters import execution_counters
+from executor import APIExecutor, cancel_tasks
+from log_writer import log_writer
+from resource_limits import ResourceUsage
+from shared_backend import get_redis, redis_key
+from templating import TemplateError
+
+# 错过执行时间的处理方式: skip(跳过，等待下一次), run_once(立即补执行一次)
+MISFIRE_POLICIES = ("skip", "run_once")
+
+# 常用表达式的简写
+CRON_MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *"
+}
+# cron字段: (名称, 最小值, 最大值, 可用的英文缩写)
+CRON_FIELDS = (
+    ("分钟", 0, 59, None),
+    ("小时", 0, 23, None),
+    ("日期", 1, 31, None),
+    ("月份", 1, 12, ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")),
+    ("星期", 0, 7, ("sun", "mon", "tue", "wed", "thu", "fri", "sat"))
+)
+# 间隔表达式，如 @every 30s、@every 1h30m
+INTERVAL_PATTERN = re.compile(r"(\d+)([smhd])")
+INTERVAL_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# 续期的Lua实现：租约属于自己时延长，不存在时获取，被其它实例持有时返回0
+LEASE_SCRIPT = """
+local owner = redis.call('GET', KEYS[1])
+if owner == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+if not owner then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+# 只释放自己持有的租约
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class ScheduleError(ValueError):
+    """调度表达式不合法"""
+
+class CronSchedule:
+    """
+    5字段cron表达式（分 时 日 月 周），支持 *、列表、范围、步长和英文缩写，按指定时区计算
+    日期和星期都有限制时满足其一即可（与cron一致）
+    """
+    
+    def __init__(self, expression: str, tz):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ScheduleError("cron表达式需要5个字段：分 时 日 月 周")
+        self.tz = tz
+        self.minutes, self.hours, self.days, self.months, weekdays = [
+            self._parse_field(text, *spec) for text, spec in zip(fields, CRON_FIELDS)
+        ]
+        # 星期的7与0都表示周日
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+        self.sorted_minutes = sorted(self.minutes)
+    
+    @staticmethod
+    def _parse_value(text: str, label: str, low: int, high: int, names) -> int:
+        text = text.lower()
+        if names and text in names:
+            return names.index(text) + (low if label == "月份" else 0)
+        try:
+            value = int(text)
+        except ValueError:
+            raise ScheduleError(f"{label}字段的值不合法: {text}")
+        if not low <= value <= high:
+            raise ScheduleError(f"{label}字段的值超出范围({low}-{high}): {value}")
+        return value
+    
+    @classmethod
+    def _parse_field(cls, text: str, label: str, low: int, high: int, names) -> Set[int]:
+        values = set()
+        for part in text.split(","):
+            step = 1
+            if "/" in part:
+                part, step_text = part.split("/", 1)
+                if not step_text.isdigit() or int(step_text) == 0:
+                    raise ScheduleError(f"{label}字段的步长不合法: {step_text}")
+                step = int(step_text)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start_text, end_text = part.split("-", 1)
+                start = cls._parse_value(start_text, label, low, high, names)
+                end = cls._parse_value(end_text, label, low, high, names)
+                if start > end:
+                    raise ScheduleError(f"{label}字段的范围不合法: {part}")
+            else:
+                start = cls._parse_value(part, label, low, high, names)
+                # a/n 表示从a开始到最大值
+                end = high if step > 1 else start
+            values.update(range(start, end + 1, step))
+        return values
+    
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if not self.any_day and not self.any_weekday:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+    
+    def _next_local(self, moment: datetime) -> datetime:
+        """本地时间moment之后的第一个匹配时间（不带时区）"""
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        end_year = moment.year + 5
+        while moment.year <= end_year:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            else:
+                minute = next((m for m in self.sorted_minutes if m >= moment.minute), None)
+                if minute is not None:
+                    return moment.replace(minute=minute)
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+        raise ScheduleError("cron表达式没有匹配的时间")
+    
+    def next_after(self, moment: datetime) -> datetime:
+        """UTC时间moment之后的下一次执行时间（UTC，不带时区）"""
+        local = moment.replace(tzinfo=timezone.utc).astimezone(self.tz).replace(tzinfo=None)
+        while True:
+            local = self._next_local(local)
+            result = local.replace(tzinfo=self.tz).astimezone(timezone.utc).replace(tzinfo=None)
+            # 夏令时回拨时同一本地时间出现两次，只取晚于moment的
+            if result > moment:
+                return result
+
+class IntervalSchedule:
+    """固定间隔（@every 30s），执行时间按间隔对齐，各实例计算的时间一致"""
+    
+    def __init__(self, seconds: int):
+        self.seconds = seconds
+    
+    def next_after(self, moment: datetime) -> datetime:
+        elapsed = (moment - datetime(1970, 1, 1)).total_seconds()
+        return datetime(1970, 1, 1) + timedelta(seconds=(elapsed // self.seconds + 1) * self.seconds)
+
+def get_timezone(name: str):
+    """调度使用的时区（IANA名称），为空或UTC时使用UTC"""
+    if not name or name.upper() == "UTC":
+        return timezone.utc
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(name)
+    except Exception as e:
+        raise ScheduleError(f"未知的时区 {name}: {e}")
+
+def parse_schedule(expression: str, tz=None):
+    """解析调度表达式：cron表达式、@daily等简写或 @every 间隔"""
+    expression = (expression or "").strip()
+    if not expression:
+        raise ScheduleError("调度表达式不能为空")
+    lowered = expression.lower()
+    if lowered.startswith("@every"):
+        text = lowered[len("@every"):].strip()
+        parts = INTERVAL_PATTERN.findall(text)
+        if not parts or "".join(number + unit for number, unit in parts) != text.replace(" ", ""):
+            raise ScheduleError("间隔格式不合法，例如: @every 30s、@every 5m、@every 1h30m")
+        seconds = sum(int(number) * INTERVAL_UNITS[unit] for number, unit in parts)
+        if seconds <= 0:
+            raise ScheduleError("间隔必须大于0")
+        return IntervalSchedule(seconds)
+    if lowered.startswith("@"):
+        if lowered not in CRON_MACROS:
+            raise ScheduleError(f"未知的简写: {expression}，可选: {', '.join(CRON_MACROS)}, @every")
+        expression = CRON_MACROS[lowered]
+    return CronSchedule(expression, tz or timezone.utc)
+
+class SchedulerLeaseManager:
+    """
+    调度主节点选举：只有持有租约的实例触发定时执行
+    配置了Redis时使用Redis键（SET NX + 过期时间），否则使用数据库租约表；租约到期未续期时由其它实例接管
+    """
+    
+    def __init__(self, name: str, ttl: float):
+        self.name = name
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.backend = "database"
+        self._scripts = None
+        self._error_shown = False
+    
+    async def acquire(self) -> bool:
+        """获取或续期租约，返回当前是否为主节点"""
+        redis = get_redis()
+        try:
+            if redis is not None:
+                self.backend = "redis"
+                return await self._acquire_redis(redis)
+            self.backend = "database"
+            return await self._acquire_database()
+        except Exception as e:
+            # 无法确认租约时不触发，避免多个实例同时执行
+            if not self._error_shown:
+                print(f"⚠️ 调度租约续期失败: {e}")
+                self._error_shown = True
+            return False
+    
+    async def _acquire_redis(self, redis) -> bool:
+        if self._scripts is None or self._scripts[0] is not redis:
+            self._scripts = (redis, redis.register_script(LEASE_SCRIPT), redis.register_script(RELEASE_SCRIPT))
+        acquired = await self._scripts[1](
+            keys=[redis_key("scheduler", self.name)],
+            args=[self.owner, int(self.ttl * 1000)]
+        )
+        return bool(acquired)
+    
+    async def _acquire_database(self) -> bool:
+        now = datetime.utcnow()
+        values = {"owner": self.owner, "expires_at": now + timedelta(seconds=self.ttl)}
+        async with AsyncSessionLocal() as db:
+            # 租约属于自己或已过期时更新为自己（一条UPDATE，多个实例同时更新时只有一个成功）
+            result = await db.execute(
+                update(SchedulerLease)
+                .where(
+                    SchedulerLease.name == self.name,
+                    or_(SchedulerLease.owner == self.owner, SchedulerLease.expires_at <= now)
+                )
+                .values(**values)
+            )
+            if result.rowcount:
+                await db.commit()
+                return True
+            try:
+                db.add(SchedulerLease(name=self.name, **values))
+                await db.commit()
+                return True
+            except IntegrityError:
+                # 租约由其它实例持有
+                await db.rollback()
+                return False
+    
+    async def release(self):
+        """释放租约，其它实例可以立即接管"""
+        try:
+            redis = get_redis()
+            if redis is not None:
+                if self._scripts is not None:
+                    await self._scripts[2](keys=[redis_key("scheduler", self.name)], args=[self.owner])
+                return
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(SchedulerLease)
+                    .where(SchedulerLease.name == self.name, SchedulerLease.owner == self.owner)
+                    .values(expires_at=datetime.utcnow())
+                )
+                await db.commit()
+        except Exception as e:
+            print(f"⚠️ 释放调度租约失败: {e}")
+
+class ScheduledDefinition:
+    """一个定时执行的API定义及其调度状态"""
+    
+    __slots__ = (
+        "definition", "expression", "schedule", "parameters", "jitter", "misfire",
+        "next_run", "task", "runs", "overlaps", "missed", "last_run", "last_status"
+    )
+    
+    def __init__(self, definition: CachedDefinition, expression: str, schedule, parameters: Dict[str, str],
+                 jitter: float, misfire: str):
+        self.definition = definition
+        self.expression = expression
+        self.schedule = schedule
+        self.parameters = parameters
+        self.jitter = jitter
+        self.misfire = misfire
+        self.next_run: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.overlaps = 0
+        self.missed = 0
+        self.last_run: Optional[datetime] = None
+        self.last_status: Optional[str] = None
+    
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "definition_id": self.definition.id,
+            "name": self.definition.name,
+            "schedule": self.expression,
+            "jitter": self.jitter,
+            "misfire": self.misfire,
+            "next_run": self.next_run.isoformat() if self.next_run else None,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "last_status": self.last_status,
+            "running": self.running,
+            "runs": self.runs,
+            "overlaps": self.overlaps,
+            "missed": self.missed
+        }
+
+class Scheduler:
+    """
+    定时执行：按API定义上的cron/间隔表达式直接调用APIExecutor，不经过HTTP、认证和定义查询
+    多个worker/副本通过租约选出一个主节点触发；上一次执行未结束时跳过本次（不重叠执行）；
+    每次触发的计划时间记录在数据库中，重启或主节点切换后按错过策略处理期间错过的执行
+    """
+    
+    def __init__(self, enabled: bool, timezone_name: str, poll_interval: float, reload_interval: float,
+                 lease_ttl: float, misfire_grace: float):
+        self.enabled = enabled
+        self.timezone_name = timezone_name
+        self.poll_interval = poll_interval
+        self.reload_interval = reload_interval
+        self.misfire_grace = timedelta(seconds=misfire_grace)
+        self.lease = SchedulerLeaseManager("default", lease_ttl)
+        self.is_leader = False
+        self._tz = None
+        self._entries: Dict[int, ScheduledDefinition] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._next_reload = 0.0
+        self._next_renew = 0.0
+        self._fired = 0
+        self._overlaps = 0
+        self._missed = 0
+        self._errors = 0
+        self.last_error: Optional[str] = None
+    
+    @property
+    def tz(self):
+        if self._tz is None:
+            try:
+                self._tz = get_timezone(self.timezone_name)
+            except ScheduleError as e:
+                print(f"⚠️ {e}，调度使用UTC")
+                self._tz = timezone.utc
+        return self._tz
+    
+    def validate(self, expression: Optional[str], misfire: Optional[str]):
+        """校验表单中的调度设置，不合法时抛出ScheduleError"""
+        if expression:
+            # 计算一次下次执行时间，排除永远不会触发的表达式（如2月31日）
+            parse_schedule(expression, self.tz).next_after(datetime.utcnow())
+        if misfire and misfire not in MISFIRE_POLICIES:
+            raise ScheduleError(f"错过执行的处理方式只能是: {', '.join(MISFIRE_POLICIES)}")
+    
+    def start(self):
+        """启动调度任务"""
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """停止调度，中断执行中的定时任务并释放租约"""
+        if self._task is not None:
+            await cancel_tasks([self._task])
+            self._task = None
+        await cancel_tasks([entry.task for entry in self._entries.values() if entry.task is not None])
+        if self.is_leader:
+            await self.lease.release()
+            self.is_leader = False
+    
+    def request_reload(self):
+        """定义变更后在下一轮重新加载（其它实例按reload_interval定期加载）"""
+        self._next_reload = 0.0
+    
+    async def _run(self):
+        while True:
+            try:
+                await self._tick()
+            except Exception as e:
+                self._errors += 1
+                self.last_error = str(e)
+                print(f"✗ 定时调度失败: {e}")
+            await asyncio.sleep(self.poll_interval)
+    
+    async def _tick(self):
+        now = time.monotonic()
+        if now >= self._next_renew:
+            leader = await self.lease.acquire()
+            # 续期失败时留出余量，在租约到期之前再试
+            self._next_renew = now + self.lease.ttl / 3
+            if leader != self.is_leader:
+                self.is_leader = leader
+                if leader:
+                    # 成为主节点时按数据库中的上次触发时间重新计算（期间可能由其它实例触发过）
+                    for entry in self._entries.values():
+                        entry.next_run = None
+                    self._next_reload = 0.0
+                print(f"{'👑 成为' if leader else '⚠️ 不再是'}定时调度主节点 ({self.lease.backend})")
+        if not self.is_leader:
+            return
+        if now >= self._next_reload:
+            await self._reload()
+            self._next_reload = now + self.reload_interval
+        await self._fire_due()
+    
+    async def _reload(self):
+        """加载设置了调度表达式的已启用定义，新加入的定义按上次触发时间处理错过的执行"""
+        async with AsyncSessionLocal() as db:
+            definitions = (await db.scalars(
+                select(APIDefinition).where(
+                    APIDefinition.is_active.is_(True),
+                    APIDefinition.schedule.isnot(None),
+                    APIDefinition.schedule != ""
+                )
+            )).all()
+            states = dict((await db.execute(
+                select(ScheduleState.api_definition_id, ScheduleState.last_tick)
+            )).all())
+        
+        now = datetime.utcnow()
+        entries: Dict[int, ScheduledDefinition] = {}
+        for api_def in definitions:
+            entry = self._entries.get(api_def.id)
+            try:
+                definition = CachedDefinition.from_model(api_def)
+                parameters = definition.template.validate(api_def.schedule_parameters or {}) \
+                    if definition.template is not None else {}
+                if entry is None or entry.expression != api_def.schedule:
+                    schedule = parse_schedule(api_def.schedule, self.tz)
+                else:
+                    schedule = entry.schedule
+            except (ScheduleError, TemplateError) as e:
+                print(f"⚠️ 定义 {api_def.id} 的定时调度无效: {e}")
+                continue
+            
+            misfire = api_def.schedule_misfire if api_def.schedule_misfire in MISFIRE_POLICIES else "skip"
+            jitter = max(api_def.schedule_jitter or 0, 0)
+            if entry is not None and entry.expression == api_def.schedule:
+                entry.definition, entry.parameters, entry.jitter, entry.misfire = definition, parameters, jitter, misfire
+            else:
+                previous = entry
+                entry = ScheduledDefinition(definition, api_def.schedule, schedule, parameters, jitter, misfire)
+                if previous is not None:
+                    # 修改表达式时保留执行中的任务，避免重叠执行
+                    entry.task = previous.task
+            if entry.next_run is None:
+                last_tick = states.get(api_def.id)
+                entry.next_run = schedule.next_after(last_tick if last_tick is not None else now)
+            entries[api_def.id] = entry
+        self._entries = entries
+    
+    async def _fire_due(self):
+        now = datetime.utcnow()
+        for entry in list(self._entries.values()):
+            if entry.next_run is None or entry.next_run > now:
+                continue
+            tick = entry.next_run
+            entry.next_run = entry.schedule.next_after(now)
+            if now - tick > self.misfire_grace and entry.misfire == "skip":
+                # 错过的执行（服务停止、主节点切换或事件循环阻塞）直接跳过；run_once时立即补执行一次
+                entry.missed += 1
+                self._missed += 1
+                print(f"⚠️ 定义 {entry.definition.id} 错过了 {tick.isoformat()} 的定时执行，已跳过")
+            elif entry.running:
+                entry.overlaps += 1
+                self._overlaps += 1
+                print(f"⚠️ 定义 {entry.definition.id} 的上一次定时执行尚未结束，跳过 {tick.isoformat()}")
+            else:
+                entry.runs += 1
+                self._fired += 1
+                entry.last_run = tick
+                entry.task = asyncio.create_task(self._execute(entry))
+            # 先记录再执行：主节点切换时新的主节点不会重复触发同一时间点
+            await self._save_tick(entry.definition.id, tick)
+    
+    @staticmethod
+    async def _save_tick(definition_id: int, tick: datetime):
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(ScheduleState)
+                .where(ScheduleState.api_definition_id == definition_id)
+                .values(last_tick=tick)
+            )
+            if not result.rowcount:
+                db.add(ScheduleState(api_definition_id=definition_id, last_tick=tick))
+            await db.commit()
+    
+    async def _execute(self, entry: ScheduledDefinition):
+        """执行一次定时任务：随机延迟后在执行名额内执行，结果写入执行日志"""
+        api_def = entry.definition
+        if entry.jitter:
+            # 分散同一时间点触发的任务
+            await asyncio.sleep(random.uniform(0, entry.jitter))
+        
+        start_time = time.time()
+        running_id = log_writer.track_running({
+            "api_definition_id": api_def.id,
+            "api_key": api_def.api_key,
+            "parameters": entry.parameters,
+            "status": "running",
+            "execution_time": datetime.utcnow(),
+            "request_ip": "scheduler"
+        }) if api_def.enable_logging else None
+        usage = ResourceUsage()
+        result, success, error_msg = "", False, "服务关闭，定时执行被中断"
+        try:
+            async with admission.slot(api_def, wait=True):
+                result, success, error_msg = await APIExecutor.execute_action(
+                    api_def.action_type,
+                    api_def.action_content,
+                    entry.parameters,
+                    template=api_def.template,
+                    max_output_bytes=api_def.max_output_bytes,
+                    timeout_seconds=api_def.timeout_seconds,
+                    limits=api_def.limits,
+                    usage=usage
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error_msg = f"执行错误: {str(e)}"
+        finally:
+            duration_ms = int((time.time() - start_time) * 1000)
+            entry.last_status = "success" if success else "error"
+            execution_counters.record(api_def.id, success, duration_ms)
+            metrics.record_execution(api_def.action_type, api_def.id, success)
+            if running_id is not None:
+                await log_writer.finish(
+                    running_id,
+                    result=result,
+                    status=entry.last_status,
+                    error_message=error_msg,
+                    duration_ms=duration_ms,
+                    **usage.fields()
+                )
+    
+    def counters(self) -> Dict[str, int]:
+        return {"fired": self._fired, "overlap": self._overlaps, "missed": self._missed}
+    
+    def stats(self) -> Dict[str, Any]:
+        """调度统计信息（定义列表只在主节点上有内容）"""
+        return {
+            "enabled": self.enabled,
+            "leader": self.is_leader,
+            "owner": self.lease.owner,
+            "lease_backend": self.lease.backend,
+            "timezone": self.timezone_name,
+            **self.counters(),
+            "errors": self._errors,
+            "last_error": self.last_error,
+            "schedules": [entry.stats() for entry in self._entries.values()]
+        }
+
+# 全局定时调度
+scheduler = Scheduler(
+    enabled=settings.SCHEDULER_ENABLED,
+    timezone_name=settings.SCHEDULER_TIMEZONE,
+    poll_interval=settings.SCHEDULER_POLL_INTERVAL,
+    reload_interval=settings.SCHEDULER_RELOAD_INTERVAL,
+    lease_ttl=settings.SCHEDULER_LEASE_TTL,
+    misfire_grace=settings.SCHEDULER_MISFIRE_GRACE
+)
\ No newline at end of file
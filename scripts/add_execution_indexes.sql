@@ -0,0 +1,16 @@
+-- 🗂️ 为已有的 api_executions 表在线创建执行记录分页/筛选使用的复合索引（PostgreSQL）
+-- ================================
+-- 新建的数据库由服务启动时直接创建这些索引；从旧版本升级时服务启动只提示缺少索引，
+-- 不在启动时锁表建索引。可在服务运行时执行（CONCURRENTLY不阻塞写入，不能放在事务中）：
+--   psql "$DATABASE_URL" -f scripts/add_execution_indexes.sql
+-- 建索引中断会留下无效索引（\d api_executions 中显示INVALID），先 DROP INDEX CONCURRENTLY 再重新执行
+-- 已转换为分区表的 api_executions 不支持 CONCURRENTLY，分区脚本 partition_executions.sql 已创建这些索引
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_api_executions_time_id
+    ON api_executions (execution_time, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_api_executions_definition_time_id
+    ON api_executions (api_definition_id, execution_time, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_api_executions_key_time_id
+    ON api_executions (api_key, execution_time, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_api_executions_status_time_id
+    ON api_executions (status, execution_time, id);
@@ -0,0 +1,55 @@
+-- 🗂️ 将 api_executions 转换为按月分区的表（PostgreSQL 11+）
+-- ================================
+-- 执行前请停止服务并备份数据库：
+--   psql "$DATABASE_URL" -f scripts/partition_executions.sql
+-- 脚本会在分区表上重建索引，之后重启服务：后台清理任务按 LOG_PARTITION_INTERVAL
+-- 提前创建后续分区，并直接删除所有数据都超过保留期的分区（表名以 api_executions_p 开头）
+
+BEGIN;
+
+ALTER TABLE api_executions RENAME TO api_executions_old;
+-- 序列继续使用，旧表删除时不能一起删除
+ALTER SEQUENCE api_executions_id_seq OWNED BY NONE;
+
+CREATE TABLE api_executions (LIKE api_executions_old INCLUDING DEFAULTS)
+    PARTITION BY RANGE (execution_time);
+ALTER TABLE api_executions ALTER COLUMN execution_time SET NOT NULL;
+-- 分区表的主键必须包含分区键
+ALTER TABLE api_executions ADD PRIMARY KEY (id, execution_time);
+ALTER SEQUENCE api_executions_id_seq OWNED BY api_executions.id;
+
+-- 按月创建分区：从最早的执行记录到两个月之后
+DO $$
+DECLARE
+    month_start date := date_trunc('month', COALESCE((SELECT min(execution_time) FROM api_executions_old), now()));
+    last_month date := date_trunc('month', now() + interval '2 months');
+BEGIN
+    WHILE month_start <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF api_executions FOR VALUES FROM (%L) TO (%L)',
+            'api_executions_p' || to_char(month_start, 'YYYYMMDD'),
+            month_start,
+            (month_start + interval '1 month')::date
+        );
+        month_start := (month_start + interval '1 month')::date;
+    END LOOP;
+END $$;
+
+-- 超出已有分区范围的记录写入默认分区（清理任务不会删除默认分区）
+CREATE TABLE api_executions_default PARTITION OF api_executions DEFAULT;
+
+INSERT INTO api_executions
+SELECT * FROM api_executions_old WHERE execution_time IS NOT NULL;
+
+DROP TABLE api_executions_old;
+
+-- 重建索引（服务已停止，直接在事务中创建）
+CREATE INDEX IF NOT EXISTS ix_api_executions_id ON api_executions (id);
+CREATE INDEX IF NOT EXISTS ix_api_executions_api_definition_id ON api_executions (api_definition_id);
+CREATE INDEX IF NOT EXISTS ix_api_executions_api_key ON api_executions (api_key);
+CREATE INDEX IF NOT EXISTS ix_api_executions_time_id ON api_executions (execution_time, id);
+CREATE INDEX IF NOT EXISTS ix_api_executions_definition_time_id ON api_executions (api_definition_id, execution_time, id);
+CREATE INDEX IF NOT EXISTS ix_api_executions_key_time_id ON api_executions (api_key, execution_time, id);
+CREATE INDEX IF NOT EXISTS ix_api_executions_status_time_id ON api_executions (status, execution_time, id);
+
+COMMIT;
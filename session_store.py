@@ -0,0 +1,268 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+
+from config import settings
+from database import AsyncSessionLocal, AdminSession
+from shared_backend import get_redis, redis_key
+
+# 会话中保存的字段
+SESSION_FIELDS = ("username", "created_at", "last_activity", "ip_address", "user_agent")
+DATETIME_FIELDS = ("created_at", "last_activity")
+
+# 续期的Lua实现：会话存在时更新最后活动时间并延长过期时间，返回全部字段（不存在时返回空）
+TOUCH_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return {}
+end
+redis.call('HSET', KEYS[1], 'last_activity', ARGV[1])
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+return redis.call('HGETALL', KEYS[1])
+"""
+
+class MemorySessionBackend:
+    """
+    进程内会话：按最后活动时间排序（过期时间固定，排在前面的最先过期）
+    查找和续期为O(1)，清理只访问已过期的会话
+    """
+    
+    name = "memory"
+    
+    def __init__(self):
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    async def create(self, session_id: str, session: Dict[str, Any], ttl: timedelta):
+        with self._lock:
+            self._sessions[session_id] = dict(session)
+    
+    async def touch(self, session_id: str, now: datetime, ttl: timedelta) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if now - session["last_activity"] > ttl:
+                del self._sessions[session_id]
+                return None
+            session["last_activity"] = now
+            self._sessions.move_to_end(session_id)
+            return dict(session)
+    
+    async def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+    
+    async def purge(self, now: datetime, ttl: timedelta) -> int:
+        purged = 0
+        with self._lock:
+            while self._sessions:
+                session_id, session = next(iter(self._sessions.items()))
+                if now - session["last_activity"] <= ttl:
+                    break
+                del self._sessions[session_id]
+                purged += 1
+        return purged
+    
+    async def count(self) -> int:
+        return len(self._sessions)
+
+class DatabaseSessionBackend:
+    """数据库会话表：按主键查找，续期为一条UPDATE，清理借助expires_at索引"""
+    
+    name = "database"
+    
+    async def create(self, session_id: str, session: Dict[str, Any], ttl: timedelta):
+        async with AsyncSessionLocal() as db:
+            db.add(AdminSession(
+                session_id=session_id,
+                expires_at=session["last_activity"] + ttl,
+                **session
+            ))
+            await db.commit()
+    
+    async def touch(self, session_id: str, now: datetime, ttl: timedelta) -> Optional[Dict[str, Any]]:
+        async with AsyncSessionLocal() as db:
+            # 续期和读取在同一条语句中完成（PostgreSQL和SQLite 3.35+支持RETURNING）
+            row = (await db.execute(
+                update(AdminSession)
+                .where(AdminSession.session_id == session_id, AdminSession.expires_at > now)
+                .values(last_activity=now, expires_at=now + ttl)
+                .returning(*[getattr(AdminSession, field) for field in SESSION_FIELDS])
+            )).first()
+            await db.commit()
+        return dict(zip(SESSION_FIELDS, row)) if row is not None else None
+    
+    async def delete(self, session_id: str):
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(AdminSession).where(AdminSession.session_id == session_id))
+            await db.commit()
+    
+    async def purge(self, now: datetime, ttl: timedelta) -> int:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(delete(AdminSession).where(AdminSession.expires_at <= now))
+            await db.commit()
+            return result.rowcount or 0
+    
+    async def count(self) -> int:
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(select(func.count()).select_from(AdminSession))
+
+class RedisSessionBackend:
+    """Redis会话：每个会话一个哈希，由Redis按TTL自动过期，不需要清理"""
+    
+    name = "redis"
+    
+    def __init__(self, redis):
+        self.redis = redis
+        self._touch = redis.register_script(TOUCH_SCRIPT)
+    
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return redis_key("session", session_id)
+    
+    async def create(self, session_id: str, session: Dict[str, Any], ttl: timedelta):
+        mapping = {
+            field: value.isoformat() if field in DATETIME_FIELDS else value
+            for field, value in session.items()
+        }
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(session_id), mapping=mapping)
+            pipe.pexpire(self._key(session_id), int(ttl.total_seconds() * 1000))
+            await pipe.execute()
+    
+    async def touch(self, session_id: str, now: datetime, ttl: timedelta) -> Optional[Dict[str, Any]]:
+        values = await self._touch(
+            keys=[self._key(session_id)],
+            args=[now.isoformat(), int(ttl.total_seconds() * 1000)]
+        )
+        if not values:
+            return None
+        session = dict(zip(values[::2], values[1::2]))
+        for field in DATETIME_FIELDS:
+            session[field] = datetime.fromisoformat(session[field])
+        return session
+    
+    async def delete(self, session_id: str):
+        await self.redis.delete(self._key(session_id))
+    
+    async def purge(self, now: datetime, ttl: timedelta) -> int:
+        return 0
+    
+    async def count(self) -> int:
+        count = 0
+        async for _ in self.redis.scan_iter(match=self._key("*"), count=1000):
+            count += 1
+        return count
+
+class SessionStore:
+    """
+    管理员会话存储
+    后端: memory(仅进程内), database(会话表), redis(配置了REDIS_URL时), auto(有Redis时使用Redis，否则使用数据库)
+    使用共享后端时在本地缓存验证结果cache_ttl秒，期间的管理请求不访问后端；Redis不可用时退回进程内存储
+    """
+    
+    def __init__(self, backend: str, ttl_minutes: int, cache_ttl: float, cache_size: int):
+        self.backend = backend
+        self.ttl = timedelta(minutes=ttl_minutes)
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._memory = MemorySessionBackend()
+        self._database = DatabaseSessionBackend()
+        self._redis_backend: Optional[RedisSessionBackend] = None
+        # 会话ID -> (会话, 上次向后端确认的时间)
+        self._cache: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._cache_hits = 0
+        self._backend_errors = 0
+    
+    def _shared(self):
+        """当前使用的后端"""
+        if self.backend == "memory":
+            return self._memory
+        if self.backend in ("auto", "redis"):
+            redis = get_redis()
+            if redis is not None:
+                if self._redis_backend is None or self._redis_backend.redis is not redis:
+                    self._redis_backend = RedisSessionBackend(redis)
+                return self._redis_backend
+            if self.backend == "redis":
+                return self._memory
+        return self._database
+    
+    async def _call(self, method: str, *args):
+        backend = self._shared()
+        try:
+            return await getattr(backend, method)(*args)
+        except Exception as e:
+            if backend is not self._redis_backend:
+                raise
+            self._backend_errors += 1
+            if self._backend_errors == 1:
+                print(f"⚠️ Redis会话存储失败，退回进程内存储: {e}")
+            return await getattr(self._memory, method)(*args)
+    
+    def _cache_put(self, session_id: str, session: Dict[str, Any]):
+        if self.cache_ttl <= 0 or self._shared() is self._memory:
+            return
+        self._cache[session_id] = (session, time.monotonic())
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+    
+    async def create(self, session_id: str, session: Dict[str, Any]):
+        await self._call("create", session_id, session, self.ttl)
+        self._cache_put(session_id, dict(session))
+    
+    async def touch(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """验证会话并延长有效期，会话不存在或已过期时返回None"""
+        now = datetime.utcnow()
+        cached = self._cache.get(session_id)
+        if cached is not None:
+            session, checked_at = cached
+            # 最近确认过的会话在后端的过期时间至少还有 ttl - cache_ttl，无需再访问后端
+            if time.monotonic() - checked_at < self.cache_ttl:
+                self._cache_hits += 1
+                session["last_activity"] = now
+                return dict(session)
+            del self._cache[session_id]
+        
+        session = await self._call("touch", session_id, now, self.ttl)
+        if session is not None:
+            self._cache_put(session_id, dict(session))
+        return session
+    
+    async def delete(self, session_id: str):
+        # 其它进程的本地缓存最多在cache_ttl秒后失效
+        self._cache.pop(session_id, None)
+        await self._call("delete", session_id)
+    
+    async def purge_expired(self) -> int:
+        """清理过期会话（Redis由TTL自动过期）"""
+        now = datetime.utcnow()
+        for session_id, (session, _) in list(self._cache.items()):
+            if now - session["last_activity"] > self.ttl:
+                self._cache.pop(session_id, None)
+        return await self._call("purge", now, self.ttl)
+    
+    async def stats(self) -> Dict[str, Any]:
+        """会话存储统计信息"""
+        return {
+            "backend": self._shared().name,
+            "sessions": await self._call("count"),
+            "ttl_minutes": int(self.ttl.total_seconds() // 60),
+            "cache_ttl": self.cache_ttl,
+            "cached": len(self._cache),
+            "cache_hits": self._cache_hits,
+            "backend_errors": self._backend_errors
+        }
+
+# 全局会话存储
+session_store = SessionStore(
+    backend=settings.SESSION_BACKEND,
+    ttl_minutes=settings.SESSION_TTL_MINUTES,
+    cache_ttl=settings.SESSION_CACHE_TTL,
+    cache_size=settings.SESSION_CACHE_SIZE
+)
\ No newline at end of file
@@ -0,0 +1,34 @@
+from config import settings
+
+# 共享Redis客户端（多worker/多副本之间共享状态），未配置REDIS_URL时为单进程模式
+_redis_client = None
+_redis_warning_shown = False
+
+def get_redis():
+    """获取共享Redis客户端，未配置或未安装redis时返回None"""
+    global _redis_client, _redis_warning_shown
+    if not settings.REDIS_URL:
+        return None
+    
+    if _redis_client is None:
+        try:
+            import redis.asyncio as aioredis
+        except ImportError:
+            if not _redis_warning_shown:
+                print("⚠️ 已配置REDIS_URL但未安装redis，跨进程功能已禁用 (pip install redis)")
+                _redis_warning_shown = True
+            return None
+        _redis_client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+    
+    return _redis_client
+
+async def close_redis():
+    """关闭共享Redis客户端"""
+    global _redis_client
+    if _redis_client is not None:
+        await _redis_client.close()
+        _redis_client = None
+
+def redis_key(*parts: str) -> str:
+    """生成带统一前缀的Redis键"""
+    return ":".join((settings.REDIS_KEY_PREFIX,) + tuple(str(part) for part in parts))
\ No newline at end of file
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import shutil
+import signal
+import tempfile
+from typing import Optional, Tuple
+
+import metrics
+from config import settings
+from python_pool import WorkerPool, sandbox_env
+from resource_limits import ResourceUsage
+from result_store import read_output_file
+
+# 工作进程循环：从标准输入读取以空字符结尾的 (模式, 脚本)，在子shell中执行后输出返回码（$1、$2为输出文件）
+# 子shell隔离每次执行：工作目录重置、环境变量/函数/选项的修改不会带到下一次执行，标准输入为/dev/null
+WORKER_SCRIPT = r"""
+work_dir="$PWD"
+while IFS= read -r -d '' mode && IFS= read -r -d '' script; do
+    (
+        cd "$work_dir" || exit 126
+        if [ "$mode" = errexit ]; then set -e; fi
+        set --
+        unset mode work_dir
+        eval "$script"
+    ) >"$1" 2>"$2" </dev/null
+    printf '%d\n' "$?"
+    times
+done
+"""
+
+def parse_times(line: bytes) -> Tuple[float, float]:
+    """解析bash times的一行输出（如 "0m0.012s 0m0.004s"），返回 (用户态秒数, 内核态秒数)"""
+    result = []
+    for part in line.decode("ascii").split():
+        minutes, seconds = part.rstrip("s").replace(",", ".").split("m")
+        result.append(int(minutes) * 60 + float(seconds))
+    return result[0], result[1]
+
+class ShellWorker:
+    """单个常驻的bash工作进程，脚本通过管道传入，不写临时文件、不重新启动bash"""
+    
+    def __init__(self, process: asyncio.subprocess.Process, base_dir: str):
+        self.process = process
+        self.base_dir = base_dir
+        self.work_dir = os.path.join(base_dir, "work")
+        self.stdout_file = os.path.join(base_dir, "stdout")
+        self.stderr_file = os.path.join(base_dir, "stderr")
+        self.runs = 0
+        # 已结束子进程的累计CPU时间（用户态, 内核态），用于计算每次执行的增量
+        self.children_times = (0.0, 0.0)
+    
+    @classmethod
+    async def spawn(cls) -> "ShellWorker":
+        """启动工作进程（独立会话，超时时可以整组终止）"""
+        base_dir = tempfile.mkdtemp(prefix="api-shell-")
+        os.mkdir(os.path.join(base_dir, "work"))
+        with metrics.SUBPROCESS_SPAWN.time("shell_worker"):
+            process = await asyncio.create_subprocess_exec(
+                "/bin/bash", "--noprofile", "--norc", "-c", WORKER_SCRIPT, "api-shell-worker",
+                os.path.join(base_dir, "stdout"), os.path.join(base_dir, "stderr"),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                cwd=os.path.join(base_dir, "work"),
+                env=sandbox_env(),
+                start_new_session=True
+            )
+        return cls(process, base_dir)
+    
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+    
+    async def run(self, command: str, errexit: bool, max_output_bytes: int,
+                  usage: Optional[ResourceUsage] = None) -> Tuple[int, str, str]:
+        """执行一次脚本，返回: (返回码, 标准输出, 标准错误)"""
+        mode = "errexit" if errexit else "plain"
+        self.process.stdin.write(f"{mode}\0{command}\0".encode("utf-8"))
+        await self.process.stdin.drain()
+        
+        line = await self.process.stdout.readline()
+        # times输出两行：bash自身、已结束子进程的累计CPU时间
+        await self.process.stdout.readline()
+        children_line = await self.process.stdout.readline()
+        if not children_line:
+            raise RuntimeError("Shell工作进程异常退出")
+        self.runs += 1
+        children_times = parse_times(children_line)
+        if usage is not None:
+            usage.record(
+                children_times[0] - self.children_times[0],
+                children_times[1] - self.children_times[1]
+            )
+        self.children_times = children_times
+        self._reset_work_dir()
+        return (
+            int(line),
+            read_output_file(self.stdout_file, max_output_bytes),
+            read_output_file(self.stderr_file, max_output_bytes)
+        )
+    
+    def partial_output(self, max_output_bytes: Optional[int]) -> Tuple[str, str]:
+        """超时终止前已产生的输出"""
+        try:
+            return (
+                read_output_file(self.stdout_file, max_output_bytes),
+                read_output_file(self.stderr_file, max_output_bytes)
+            )
+        except OSError:
+            return "", ""
+    
+    def _reset_work_dir(self):
+        """清空脚本留下的文件，下一次执行从空目录开始（没有文件时只做一次目录扫描）"""
+        with os.scandir(self.work_dir) as entries:
+            leftovers = [entry.path for entry in entries]
+        for path in leftovers:
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+    
+    def kill(self):
+        """终止工作进程及脚本启动的所有子进程"""
+        if self.alive:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+class ShellWorkerPool(WorkerPool):
+    """
+    Shell预热工作进程池
+    每次执行在常驻bash的子shell中运行（fork，不再exec新的shell），多行脚本开启 set -e，与独立执行时一致；
+    超时时整组终止工作进程（包括脚本启动的子进程），执行达到指定次数后回收重建
+    """
+    
+    worker_class = ShellWorker
+    label = "Shell"
+    
+    @staticmethod
+    def supports(command: str) -> bool:
+        """脚本通过空字符分隔传入，包含空字符的命令仍然独立执行"""
+        return "\0" not in command
+    
+    async def execute(self, command: str, timeout: float, max_output_bytes: Optional[int] = None,
+                      usage: Optional[ResourceUsage] = None) -> Tuple[int, str, str]:
+        """
+        在工作进程中执行命令，输出最多保留max_output_bytes字节（保留开头和结尾）
+        usage记录本次执行的CPU时间（工作进程常驻，峰值内存无法按次统计）
+        返回: (返回码, 标准输出, 标准错误)，超时抛出 ExecutionTimeout（带部分输出）
+        """
+        errexit = "\n" in command.strip()
+        return await self.run(
+            lambda worker: worker.run(command, errexit, max_output_bytes, usage),
+            timeout,
+            max_output_bytes
+        )
+
+# 全局Shell工作进程池
+shell_pool = ShellWorkerPool(
+    size=settings.SHELL_POOL_SIZE,
+    max_runs=settings.SHELL_POOL_MAX_RUNS
+)
\ No newline at end of file
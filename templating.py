@@ -0,0 +1,629 @@
+import hashlib
+import json
+import re
+import shlex
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+from urllib.parse import quote
+
+# 占位符格式 {name}；${name} 是shell变量语法，不作为占位符
+PLACEHOLDER_PATTERN = re.compile(r"(?<!\$)\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+class TemplateError(ValueError):
+    """模板编译或参数校验失败"""
+
+# ---------- 转义函数 ----------
+
+def _escape_raw(value: str) -> str:
+    return value
+
+def _escape_shell_bare(value: str) -> str:
+    """未加引号的位置：整体加单引号（安全字符原样保留）"""
+    return shlex.quote(value)
+
+def _escape_shell_double(value: str) -> str:
+    """双引号内：转义 \\ " $ `"""
+    return re.sub(r'([\\"$`])', r"\\\1", value)
+
+def _escape_shell_single(value: str) -> str:
+    """单引号内：' 需要先闭合引号再转义"""
+    return value.replace("'", "'\\''")
+
+def _escape_heredoc(value: str) -> str:
+    """未加引号的heredoc正文：转义 \\ $ `（双引号在正文中不是特殊字符）"""
+    return re.sub(r'([\\$`])', r"\\\1", value)
+
+def _escape_url_path(value: str) -> str:
+    return quote(value, safe="/")
+
+def _escape_url_query(value: str) -> str:
+    return quote(value, safe="")
+
+# ---------- 模板 ----------
+
+class Template:
+    """
+    预编译的字符串模板
+    片段列表由字面量和 (参数名, 转义函数) 交替组成，渲染时单次拼接
+    """
+    
+    __slots__ = ("segments", "names")
+    
+    def __init__(self, segments: List[Union[str, Tuple[str, Callable[[str], str]]]]):
+        self.segments = segments
+        self.names = {segment[0] for segment in segments if isinstance(segment, tuple)}
+    
+    def render(self, values: Dict[str, str]) -> str:
+        """渲染模板，未提供的参数保留原占位符"""
+        parts = []
+        for segment in self.segments:
+            if isinstance(segment, str):
+                parts.append(segment)
+            else:
+                name, escape = segment
+                value = values.get(name)
+                parts.append("{" + name + "}" if value is None else escape(value))
+        return "".join(parts)
+
+def _find_placeholders(text: str, names: Optional[Set[str]]) -> List[re.Match]:
+    """查找占位符，names为空时任意标识符都视为占位符"""
+    return [
+        match for match in PLACEHOLDER_PATTERN.finditer(text)
+        if names is None or match.group(1) in names
+    ]
+
+def compile_template(text: str, names: Optional[Set[str]] = None,
+                     escaper: Callable[[re.Match, str], Callable[[str], str]] = None) -> Template:
+    """编译字符串模板，escaper根据占位符位置选择转义函数"""
+    segments = []
+    position = 0
+    for match in _find_placeholders(text, names):
+        if match.start() > position:
+            segments.append(text[position:match.start()])
+        escape = escaper(match, text) if escaper else _escape_raw
+        segments.append((match.group(1), escape))
+        position = match.end()
+    if position < len(text):
+        segments.append(text[position:])
+    return Template(segments)
+
+# ---------- 各类型的上下文转义 ----------
+
+# 占位符所处的shell上下文 -> 转义函数；不在其中的上下文（反引号、${...}、$((...))、$'...'、反斜杠之后）无法安全转义
+_SHELL_ESCAPES = {
+    "bare": _escape_shell_bare,
+    "double": _escape_shell_double,
+    "single": _escape_shell_single,
+    "heredoc": _escape_heredoc,
+    "heredoc_literal": _escape_raw
+}
+
+# 不能放置占位符的上下文说明
+_SHELL_UNSAFE_CONTEXTS = {
+    "backtick": "反引号命令替换中（请改用 $(...)）",
+    "param": "${...} 参数展开中",
+    "arith": "$((...)) 算术展开中",
+    "ansi": "$'...' 字符串中",
+    "escaped": "反斜杠之后",
+    "heredoc_delimiter": "heredoc结束标记中"
+}
+
+# 结束一个单词的字符（用于识别 case/esac 关键字、注释和heredoc结束标记）
+_SHELL_WORD_BREAKS = " \t\n;&|()<>"
+
+class _ShellFrame:
+    """扫描shell脚本时的嵌套上下文"""
+    
+    __slots__ = ("kind", "depth", "cases", "heredoc")
+    
+    def __init__(self, kind: str, heredoc: Optional[Tuple[str, bool, bool]] = None):
+        # cmd: 命令（顶层或 $(...) 内）, dq: 双引号, sq: 单引号, ansi: $'...', backtick: 反引号,
+        # param: ${...}, arith: $((...)), heredoc: heredoc正文
+        self.kind = kind
+        self.depth = 0  # 未闭合的 ( 或 { 数量
+        self.cases = 0  # $(...) 中未结束的case语句（case的模式以 ) 结尾，不是命令替换的结束）
+        self.heredoc = heredoc  # (结束标记, 结束标记是否加了引号, 是否去掉行首制表符)
+
+class ShellHeredoc:
+    """模板中包含占位符的heredoc正文，渲染后检查参数值没有提前结束heredoc"""
+    
+    __slots__ = ("body", "delimiter", "strip_tabs")
+    
+    def __init__(self, body: Template, delimiter: str, strip_tabs: bool):
+        self.body = body
+        self.delimiter = delimiter
+        self.strip_tabs = strip_tabs
+    
+    def check(self, values: Dict[str, str]):
+        for line in self.body.render(values).split("\n"):
+            if (line.lstrip("\t") if self.strip_tabs else line) == self.delimiter:
+                raise TemplateError(f"参数值不能包含heredoc结束标记行: {self.delimiter}")
+
+class ShellTemplate(Template):
+    """shell命令模板：渲染前检查heredoc正文中的参数值"""
+    
+    __slots__ = ("heredocs",)
+    
+    def __init__(self, segments, heredocs: List[ShellHeredoc]):
+        super().__init__(segments)
+        self.heredocs = heredocs
+    
+    def render(self, values: Dict[str, str]) -> str:
+        for heredoc in self.heredocs:
+            heredoc.check(values)
+        return super().render(values)
+
+def _read_heredoc_word(text: str, index: int) -> Tuple[str, bool, int]:
+    """读取 << 之后的结束标记，返回: (去掉引号后的标记, 是否加了引号, 结束位置)"""
+    length = len(text)
+    while index < length and text[index] in " \t":
+        index += 1
+    word = []
+    quoted = False
+    quote = None
+    while index < length:
+        char = text[index]
+        if quote:
+            if char == quote:
+                quote = None
+            else:
+                word.append(char)
+        elif char in "'\"":
+            quote = char
+            quoted = True
+        elif char == "\\" and index + 1 < length:
+            quoted = True
+            index += 1
+            word.append(text[index])
+        elif char in _SHELL_WORD_BREAKS:
+            break
+        else:
+            word.append(char)
+        index += 1
+    return "".join(word), quoted, index
+
+def _shell_contexts(text: str, positions: Iterable[int]) -> Tuple[Dict[int, str], List[Tuple[int, int, str, bool, bool]]]:
+    """
+    扫描shell脚本，返回各位置所处的上下文，以及heredoc正文的范围
+    跟踪引号、$(...)/反引号命令替换、${...}、$((...))的嵌套和heredoc正文
+    返回: ({位置: 上下文}, [(正文开始, 正文结束, 结束标记, 标记是否加了引号, 是否去掉行首制表符)])
+    """
+    targets = set(positions)
+    contexts: Dict[int, str] = {}
+    heredocs = []
+    stack = [_ShellFrame("cmd")]
+    pending: List[Tuple[str, bool, bool]] = []  # 当前行声明、尚未开始正文的heredoc
+    body_start = 0
+    index = 0
+    length = len(text)
+    
+    def context_of(frame: _ShellFrame) -> str:
+        if frame.kind == "cmd":
+            return "bare"
+        if frame.kind == "dq":
+            return "double"
+        if frame.kind == "sq":
+            return "single"
+        if frame.kind == "heredoc":
+            return "heredoc_literal" if frame.heredoc[1] else "heredoc"
+        return frame.kind
+    
+    def word_start(position: int) -> bool:
+        return position == 0 or text[position - 1] in _SHELL_WORD_BREAKS
+    
+    def start_heredoc(position: int):
+        nonlocal body_start
+        stack.append(_ShellFrame("heredoc", pending.pop(0)))
+        body_start = position
+    
+    at_line_start = False
+    while index < length:
+        frame = stack[-1]
+        
+        # heredoc正文的每一行开头检查是否为结束标记
+        if frame.kind == "heredoc" and at_line_start:
+            at_line_start = False
+            delimiter, _, strip_tabs = frame.heredoc
+            line_end = text.find("\n", index)
+            line_end = length if line_end == -1 else line_end
+            line = text[index:line_end]
+            if (line.lstrip("\t") if strip_tabs else line) == delimiter:
+                heredocs.append((body_start, index, *frame.heredoc))
+                stack.pop()
+                index = line_end + 1
+                if pending:
+                    start_heredoc(index)
+                    at_line_start = True
+                continue
+        
+        if index in targets:
+            contexts[index] = context_of(frame)
+        char = text[index]
+        kind = frame.kind
+        
+        if kind == "sq":
+            if char == "'":
+                stack.pop()
+            index += 1
+            continue
+        if kind == "heredoc" and frame.heredoc[1]:
+            # 加引号的heredoc正文不做任何展开
+            if char == "\n":
+                at_line_start = True
+            index += 1
+            continue
+        
+        if char == "\\":
+            if index + 1 in targets:
+                # 反斜杠会与转义后参数值开头的字符组合（如 \ 加上转义的 \$ 变成 \\$），无法安全转义
+                contexts[index + 1] = "escaped"
+            index += 2
+            continue
+        if kind == "ansi":
+            if char == "'":
+                stack.pop()
+            index += 1
+            continue
+        if kind == "backtick" and char == "`":
+            stack.pop()
+            index += 1
+            continue
+        
+        # 各种可以嵌套的展开（引号内和heredoc正文中同样生效）
+        if char == "$" and text.startswith("$((", index):
+            stack.append(_ShellFrame("arith"))
+            index += 3
+            continue
+        if char == "$" and text.startswith("$(", index):
+            stack.append(_ShellFrame("cmd"))
+            index += 2
+            continue
+        if char == "$" and text.startswith("${", index):
+            stack.append(_ShellFrame("param"))
+            index += 2
+            continue
+        if char == "`":
+            stack.append(_ShellFrame("backtick"))
+            index += 1
+            continue
+        
+        if kind == "dq":
+            if char == '"':
+                stack.pop()
+        elif kind == "heredoc":
+            if char == "\n":
+                at_line_start = True
+        elif kind == "param":
+            if char == "{":
+                frame.depth += 1
+            elif char == "}":
+                if frame.depth:
+                    frame.depth -= 1
+                else:
+                    stack.pop()
+            elif char == '"':
+                stack.append(_ShellFrame("dq"))
+            elif char == "'" and stack[-2].kind != "dq":
+                stack.append(_ShellFrame("sq"))
+        elif kind == "arith":
+            if char == "(":
+                frame.depth += 1
+            elif char == ")":
+                if frame.depth:
+                    frame.depth -= 1
+                elif text.startswith("))", index):
+                    stack.pop()
+                    index += 2
+                    continue
+        elif kind == "backtick":
+            pass
+        else:
+            # 命令上下文
+            if char == "'":
+                stack.append(_ShellFrame("sq"))
+            elif char == "$" and text.startswith("$'", index):
+                stack.append(_ShellFrame("ansi"))
+                index += 2
+                continue
+            elif char == "$" and text.startswith('$"', index):
+                stack.append(_ShellFrame("dq"))
+                index += 2
+                continue
+            elif char == '"':
+                stack.append(_ShellFrame("dq"))
+            elif char == "(" and text.startswith("((", index) and word_start(index):
+                # (( ... )) 算术命令（其中的 << 是移位运算，不是heredoc）
+                stack.append(_ShellFrame("arith"))
+                index += 2
+                continue
+            elif char == "#" and word_start(index):
+                # 注释：跳到行尾（注释中的引号不影响状态，占位符按未加引号处理）
+                end = text.find("\n", index)
+                end = length if end == -1 else end
+                for target in targets:
+                    if index <= target < end:
+                        contexts[target] = "bare"
+                index = end
+                continue
+            elif char == "<" and text.startswith("<<", index) and not text.startswith("<<<", index):
+                strip_tabs = text.startswith("<<-", index)
+                word_begin = index + (3 if strip_tabs else 2)
+                delimiter, quoted, word_end = _read_heredoc_word(text, word_begin)
+                for target in targets:
+                    if word_begin <= target < word_end:
+                        contexts[target] = "heredoc_delimiter"
+                if delimiter:
+                    pending.append((delimiter, quoted, strip_tabs))
+                index = word_end
+                continue
+            elif char == "\n" and pending:
+                start_heredoc(index + 1)
+                at_line_start = True
+            elif char in "ce" and word_start(index) and len(stack) > 1:
+                word = text[index:index + 4]
+                if word in ("case", "esac") and (index + 4 == length or text[index + 4] in _SHELL_WORD_BREAKS):
+                    frame.cases += 1 if word == "case" else -1 if frame.cases else 0
+                    index += 4
+                    continue
+            elif char == "(" and len(stack) > 1:
+                frame.depth += 1
+            elif char == ")" and len(stack) > 1:
+                if frame.depth:
+                    frame.depth -= 1
+                elif not frame.cases:
+                    stack.pop()
+        index += 1
+    
+    # 没有结束标记的heredoc正文到脚本末尾
+    for frame in stack:
+        if frame.kind == "heredoc":
+            heredocs.append((body_start, length, *frame.heredoc))
+    return contexts, heredocs
+
+def compile_shell(command: str, names: Optional[Set[str]] = None) -> Template:
+    """
+    编译shell命令：按占位符所在的上下文（未加引号、双引号、单引号、heredoc正文）选择转义方式
+    占位符位于无法安全转义的位置时抛出TemplateError
+    """
+    matches = _find_placeholders(command, names)
+    contexts, heredoc_ranges = _shell_contexts(command, [match.start() for match in matches])
+    
+    for match in matches:
+        context = contexts.get(match.start(), "bare")
+        if context in _SHELL_UNSAFE_CONTEXTS:
+            raise TemplateError(f"参数 {{{match.group(1)}}} 不能放在{_SHELL_UNSAFE_CONTEXTS[context]}")
+    
+    def escaper(match: re.Match, text: str) -> Callable[[str], str]:
+        return _SHELL_ESCAPES[contexts.get(match.start(), "bare")]
+    
+    heredocs = []
+    for start, end, delimiter, _, strip_tabs in heredoc_ranges:
+        if any(start <= match.start() < end for match in matches):
+            body = compile_template(command[start:end], names, lambda match, text, offset=start:
+                                    _SHELL_ESCAPES[contexts.get(offset + match.start(), "bare")])
+            heredocs.append(ShellHeredoc(body, delimiter, strip_tabs))
+    return ShellTemplate(compile_template(command, names, escaper).segments, heredocs)
+
+def _url_escaper(match: re.Match, text: str) -> Callable[[str], str]:
+    """URL中的占位符：协议/主机部分原样替换，路径和查询参数部分进行URL编码"""
+    prefix = text[:match.start()]
+    if "?" in prefix or "#" in prefix:
+        return _escape_url_query
+    authority_start = prefix.find("://")
+    if prefix.startswith("/") or (authority_start != -1 and "/" in prefix[authority_start + 3:]):
+        return _escape_url_path
+    return _escape_raw
+
+def compile_url(url: str, names: Optional[Set[str]] = None) -> Template:
+    return compile_template(url, names, _url_escaper)
+
+class JSONTemplate:
+    """
+    预编译的JSON结构模板
+    字符串（包括键）中的占位符在结构层面替换，序列化时自动完成JSON转义
+    """
+    
+    __slots__ = ("root", "names")
+    
+    def __init__(self, value: Any, names: Optional[Set[str]] = None):
+        self.names: Set[str] = set()
+        self.root = self._compile(value, names)
+    
+    def _compile(self, value: Any, names: Optional[Set[str]]):
+        if isinstance(value, str):
+            template = compile_template(value, names)
+            if not template.names:
+                return value
+            self.names |= template.names
+            return template
+        if isinstance(value, dict):
+            return {self._compile(key, names): self._compile(item, names) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._compile(item, names) for item in value]
+        return value
+    
+    def render(self, values: Dict[str, str]) -> Any:
+        return self._render(self.root, values)
+    
+    def _render(self, node: Any, values: Dict[str, str]) -> Any:
+        if isinstance(node, Template):
+            return node.render(values)
+        if isinstance(node, dict):
+            return {
+                (key.render(values) if isinstance(key, Template) else key): self._render(item, values)
+                for key, item in node.items()
+            }
+        if isinstance(node, list):
+            return [self._render(item, values) for item in node]
+        return node
+
+# ---------- 操作模板 ----------
+
+# 参数类型 -> (说明, 校验并规范化参数值的函数)
+def _parse_integer(value: Any) -> str:
+    if isinstance(value, bool) or isinstance(value, float):
+        raise ValueError
+    return str(int(str(value).strip()))
+
+def _parse_number(value: Any) -> str:
+    if isinstance(value, bool):
+        raise ValueError
+    number = float(str(value).strip())
+    if number != number or number in (float("inf"), float("-inf")):
+        raise ValueError
+    return str(value).strip()
+
+def _parse_boolean(value: Any) -> str:
+    text = str(value).strip().lower()
+    if text in ("true", "1", "yes", "on"):
+        return "true"
+    if text in ("false", "0", "no", "off"):
+        return "false"
+    raise ValueError
+
+PARAMETER_TYPES: Dict[str, Tuple[str, Callable[[Any], str]]] = {
+    "string": ("字符串", str),
+    "integer": ("整数", _parse_integer),
+    "number": ("数字", _parse_number),
+    "boolean": ("布尔值(true/false)", _parse_boolean)
+}
+
+class ParameterSpec:
+    """
+    声明的参数
+    定义中的写法: "参数名": "说明"（必填字符串），或
+    "参数名": {"type": "string/integer/number/boolean", "required": true, "default": 默认值, "description": "说明"}
+    设置了默认值的参数默认为可选；可选参数未提供且没有默认值时按空字符串替换
+    """
+    
+    __slots__ = ("name", "type", "required", "default")
+    
+    def __init__(self, name: str, spec: Any):
+        self.name = name
+        self.type = "string"
+        self.default: Optional[str] = None
+        if isinstance(spec, dict):
+            self.type = spec.get("type") or "string"
+            if self.type not in PARAMETER_TYPES:
+                raise TemplateError(f"参数 {name} 的类型无效: {self.type}（可选: {', '.join(PARAMETER_TYPES)}）")
+            if spec.get("default") is not None:
+                try:
+                    self.default = self.parse(spec["default"])
+                except TemplateError:
+                    raise TemplateError(f"参数 {name} 的默认值不是{PARAMETER_TYPES[self.type][0]}")
+            self.required = bool(spec.get("required", self.default is None))
+        else:
+            self.required = True
+    
+    def parse(self, value: Any) -> str:
+        """校验参数值的类型，返回规范化后的字符串"""
+        label, parser = PARAMETER_TYPES[self.type]
+        try:
+            return parser(value)
+        except (TypeError, ValueError):
+            raise TemplateError(f"{self.name}(应为{label})")
+
+class ActionTemplate:
+    """编译后的操作内容，按操作类型保存各部分模板"""
+    
+    def __init__(self, action_type: str, specs: Optional[Dict[str, ParameterSpec]], parts: Dict[str, Any]):
+        self.action_type = action_type
+        # 声明的参数，为空表示未声明参数（兼容旧定义，不做校验）
+        self.specs = specs
+        self.declared: Optional[Set[str]] = set(specs) if specs else None
+        self.parts = parts
+        self.names: Set[str] = set()
+        for part in parts.values():
+            if isinstance(part, (Template, JSONTemplate)):
+                self.names |= part.names
+    
+    def validate(self, parameters: Dict[str, Any]) -> Dict[str, str]:
+        """
+        按声明的参数校验请求参数：不允许未声明的参数，必填参数必须提供，参数值符合声明的类型
+        返回规范化后的字符串参数值（包括默认值）；有问题时抛出TemplateError列出全部问题参数
+        """
+        if not self.specs:
+            return {key: str(value) for key, value in parameters.items()}
+        
+        unknown = sorted(set(parameters) - self.declared)
+        missing = []
+        invalid = []
+        values = {}
+        for name, spec in self.specs.items():
+            value = parameters.get(name)
+            if value is None or value == "":
+                if spec.required and spec.default is None:
+                    missing.append(name)
+                else:
+                    values[name] = spec.default if spec.default is not None else ""
+                continue
+            try:
+                values[name] = spec.parse(value)
+            except TemplateError as e:
+                invalid.append(str(e))
+        
+        problems = []
+        if unknown:
+            problems.append(f"未声明的参数: {', '.join(unknown)}")
+        if missing:
+            problems.append(f"缺少必填参数: {', '.join(missing)}")
+        if invalid:
+            problems.append(f"参数类型错误: {', '.join(invalid)}")
+        if problems:
+            raise TemplateError("；".join(problems))
+        return values
+
+def _parameter_specs(parameters: Optional[Dict[str, Any]]) -> Optional[Dict[str, ParameterSpec]]:
+    if not parameters:
+        return None
+    if not isinstance(parameters, dict):
+        raise TemplateError("参数定义必须是JSON对象")
+    invalid = [name for name in parameters if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", str(name))]
+    if invalid:
+        raise TemplateError(f"参数名只能包含字母、数字和下划线，且不能以数字开头: {', '.join(map(str, invalid))}")
+    return {name: ParameterSpec(name, spec) for name, spec in parameters.items()}
+
+def compile_action(action_type: str, action_content: str,
+                   parameters: Optional[Dict[str, Any]] = None) -> ActionTemplate:
+    """
+    编译操作内容（保存定义或加载缓存时调用一次）
+    声明了参数时只替换声明过的占位符；内容格式错误时抛出TemplateError
+    """
+    specs = _parameter_specs(parameters)
+    declared = set(specs) if specs else None
+    
+    if action_type == "shell":
+        parts = {"command": compile_shell(action_content, declared)}
+    elif action_type == "python":
+        # 代码缓存键：Python工作进程按该键缓存编译后的代码
+        parts = {"code": action_content, "code_key": hashlib.sha1(action_content.encode("utf-8")).hexdigest()}
+    elif action_type == "http":
+        config = _load_json_config(action_content, "HTTP")
+        parts = {
+            "config": config,
+            "url": compile_url(config.get("url", ""), declared),
+            "data": JSONTemplate(config.get("data", {}), declared)
+        }
+    elif action_type == "webhook":
+        config = _load_json_config(action_content, "Webhook")
+        parts = {
+            "config": config,
+            "url": compile_url(config.get("url", ""), declared),
+            "payload": JSONTemplate(config.get("payload", {}), declared)
+        }
+    else:
+        parts = {}
+    
+    return ActionTemplate(action_type, specs, parts)
+
+def _load_json_config(content: str, label: str) -> Dict[str, Any]:
+    try:
+        config = json.loads(content)
+    except json.JSONDecodeError:
+        raise TemplateError(f"{label}配置格式错误，请使用有效的JSON格式")
+    if not isinstance(config, dict):
+        raise TemplateError(f"{label}配置格式错误，请使用JSON对象")
+    return config
+
+def python_literal(value: Any) -> str:
+    """将参数值转为Python字面量源码"""
+    return repr(value)
\ No newline at end of file
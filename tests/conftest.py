@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+# 应用模块读取环境变量，必须在导入之前设置（使用临时SQLite数据库）
+_temp_dir = tempfile.mkdtemp(prefix="api-executor-tests-")
+os.environ["SUPABASE_URL"] = f"sqlite:///{os.path.join(_temp_dir, 'test.db')}"
+os.environ["LOG_SPILL_PATH"] = os.path.join(_temp_dir, "spill.jsonl")
+os.environ["LOG_RETENTION_DAYS"] = "0"
+os.environ["PYTHON_POOL_SIZE"] = "0"
+os.environ["SHELL_POOL_SIZE"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import create_tables
+
+create_tables()
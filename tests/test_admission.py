@@ -0,0 +1,28 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+def test_queue_timeout_covers_both_gates():
+    controller = AdmissionController(global_limit=1, global_queue=10, default_queue=10, default_timeout=0.4)
+    first = SimpleNamespace(id=1, max_concurrency=1, max_queue=None, queue_timeout=None)
+    second = SimpleNamespace(id=2, max_concurrency=1, max_queue=None, queue_timeout=None)
+    
+    async def run():
+        # 全局名额被另一个API占用，该API的名额0.3秒后释放
+        held_global = await controller.acquire(second)
+        gate = controller._gate(first)
+        await gate.acquire(None, 429, "该API")
+        asyncio.get_running_loop().call_later(0.3, gate.release)
+        started = time.monotonic()
+        with pytest.raises(AdmissionRejected) as error:
+            await controller.acquire(first)
+        held_global.release()
+        return time.monotonic() - started, error.value.status_code
+    
+    elapsed, status_code = asyncio.run(run())
+    assert status_code == 503
+    assert elapsed < 0.6
@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+from database import SessionLocal, APIDefinition, APIExecution, generate_api_key
+from log_writer import log_writer
+import main
+
+def create_definition(action_content: str) -> str:
+    api_key = generate_api_key()
+    db = SessionLocal()
+    try:
+        db.add(APIDefinition(
+            name="batch-test",
+            description="",
+            api_key=api_key,
+            endpoint_path="/batch-test",
+            action_type="shell",
+            action_content=action_content,
+            parameters={}
+        ))
+        db.commit()
+    finally:
+        db.close()
+    return api_key
+
+def execution_count(api_key: str) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(APIExecution).filter(APIExecution.api_key == api_key).count()
+    finally:
+        db.close()
+
+async def post_then_disconnect(api_key: str, items: int, disconnect_after: float):
+    """调用 /execute/batch，在disconnect_after秒后模拟客户端断开"""
+    body = json.dumps({"items": [{"parameters": {}} for _ in range(items)]}).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/execute/batch",
+        "raw_path": b"/execute/batch",
+        "root_path": "",
+        "query_string": f"key={api_key}".encode(),
+        "headers": [(b"content-type", b"application/json"), (b"host", b"test")],
+        "client": ("127.0.0.1", 12345),
+        "server": ("test", 80)
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(disconnect_after)
+        return {"type": "http.disconnect"}
+    
+    sent = []
+    
+    async def send(message):
+        sent.append(message)
+    
+    await main.app(scope, receive, send)
+    return sent
+
+def test_batch_disconnect_writes_interrupted_logs():
+    api_key = create_definition("sleep 2")
+    
+    async def run():
+        await asyncio.wait_for(post_then_disconnect(api_key, items=2, disconnect_after=0.7), timeout=10)
+        await log_writer.stop()
+    
+    asyncio.run(run())
+    
+    assert not [record for record in log_writer.running() if record["api_key"] == api_key]
+    assert execution_count(api_key) == 2
+    db = SessionLocal()
+    try:
+        statuses = {row.status for row in db.query(APIExecution).filter(APIExecution.api_key == api_key)}
+    finally:
+        db.close()
+    assert statuses == {"error"}
+
+def test_batch_writes_logs_when_complete():
+    api_key = create_definition("echo ok")
+    
+    async def run():
+        await asyncio.wait_for(post_then_disconnect(api_key, items=3, disconnect_after=5), timeout=10)
+        await log_writer.stop()
+    
+    asyncio.run(run())
+    
+    assert execution_count(api_key) == 3
@@ -0,0 +1,16 @@
+from starlette.requests import Request
+
+from main import client_ip
+
+def make_request(peer: str, forwarded: str = None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 50000)})
+
+def test_forwarded_for_used_only_from_trusted_proxy():
+    assert client_ip(make_request("127.0.0.1", "203.0.113.7")) == "203.0.113.7"
+    assert client_ip(make_request("198.51.100.1", "203.0.113.7")) == "198.51.100.1"
+
+def test_forwarded_for_skips_trusted_hops_not_spoofed_prefix():
+    # 客户端自己伪造的地址在最左侧，代理追加的真实地址在右侧
+    assert client_ip(make_request("127.0.0.1", "10.9.9.9, 203.0.113.7, 127.0.0.1")) == "203.0.113.7"
+    assert client_ip(make_request("127.0.0.1")) == "127.0.0.1"
@@ -0,0 +1,42 @@
+import asyncio
+from types import SimpleNamespace
+
+from definition_cache import DefinitionCache
+
+def definition_row(is_active: bool):
+    return SimpleNamespace(
+        id=1, name="cache-test", api_key="key", action_type="shell", action_content="echo ok",
+        parameters={}, is_active=is_active, enable_logging=True, max_output_bytes=None,
+        timeout_seconds=None, job_priority=0, max_concurrency=None, max_queue=None, queue_timeout=None,
+        key_rate_limit=None, ip_rate_limit=None, rate_limit_burst=None, result_cache_ttl=None,
+        cpu_limit_seconds=None, memory_limit_mb=None, max_open_files=None, max_processes=None
+    )
+
+def test_load_racing_invalidate_is_not_cached():
+    cache = DefinitionCache(max_size=10, ttl=300)
+    
+    async def run():
+        loading = asyncio.Event()
+        release = asyncio.Event()
+        
+        async def stale_loader():
+            loading.set()
+            await release.wait()
+            return definition_row(is_active=True)
+        
+        load = asyncio.create_task(cache.get_or_load("key", stale_loader))
+        await loading.wait()
+        # 加载期间定义被禁用
+        await cache.invalidate("key")
+        release.set()
+        stale = await load
+        
+        async def fresh_loader():
+            return definition_row(is_active=False)
+        
+        return stale, await cache.get_or_load("key", fresh_loader)
+    
+    stale, fresh = asyncio.run(run())
+    
+    assert stale.is_active
+    assert not fresh.is_active
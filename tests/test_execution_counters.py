@@ -0,0 +1,44 @@
+import asyncio
+import threading
+
+from execution_counters import ExecutionCounters
+
+def test_pending_includes_deltas_while_flushing():
+    counters = ExecutionCounters(flush_interval=60)
+    applying = threading.Event()
+    release = threading.Event()
+    
+    def slow_apply(deltas, buckets):
+        applying.set()
+        release.wait(5)
+    
+    counters._apply = slow_apply
+    counters.record(1, True, 5)
+    counters.record(1, False, 7)
+    
+    async def run():
+        flush = asyncio.create_task(counters.flush())
+        await asyncio.get_running_loop().run_in_executor(None, applying.wait, 5)
+        during = counters.pending(1)
+        release.set()
+        await flush
+        return during
+    
+    during = asyncio.run(run())
+    
+    assert during["execution_count"] == 2
+    assert during["total_duration_ms"] == 12
+    assert counters.pending(1)["execution_count"] == 0
+
+def test_failed_flush_keeps_deltas():
+    counters = ExecutionCounters(flush_interval=60)
+    
+    def failing_apply(deltas, buckets):
+        raise RuntimeError("database unavailable")
+    
+    counters._apply = failing_apply
+    counters.record(1, True, 5)
+    asyncio.run(counters.flush())
+    
+    assert counters.pending(1)["execution_count"] == 1
+    assert counters.pending_totals()["success_count"] == 1
@@ -0,0 +1,59 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from executor import APIExecutor
+from http_pool import http_pool
+
+class RedirectHandler(BaseHTTPRequestHandler):
+    """/redirect 重定向到 /target，/target 返回200"""
+    
+    def do_GET(self):
+        if self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/target")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+def test_http_action_follows_redirects():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RedirectHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/redirect"
+    
+    async def run():
+        try:
+            return await APIExecutor.execute_action("http", json.dumps({"url": url, "method": "GET"}), {})
+        finally:
+            await http_pool.close()
+    
+    try:
+        result, success, error_msg = asyncio.run(run())
+    finally:
+        server.shutdown()
+    
+    assert success, error_msg
+    assert json.loads(result)["status_code"] == 200
+
+def test_host_stats_are_bounded(monkeypatch):
+    from config import settings
+    from http_pool import HTTPClientPool
+    
+    monkeypatch.setattr(settings, "HTTP_POOL_STATS_MAX_HOSTS", 3)
+    pool = HTTPClientPool()
+    for index in range(10):
+        pool._record(f"host-{index}", "requests")
+    pool._record("host-7", "requests")
+    pool._record("host-10", "requests")
+    
+    assert list(pool.stats()["hosts"]) == ["host-9", "host-7", "host-10"]
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+from database import SessionLocal, APIExecution
+from job_queue import JobQueue
+
+def insert_job(status, owner, heartbeat, execution_time=None):
+    db = SessionLocal()
+    try:
+        execution = APIExecution(
+            api_definition_id=1, api_key="job-test", parameters={}, status=status,
+            execution_time=execution_time or datetime.utcnow(), job_owner=owner, job_heartbeat=heartbeat
+        )
+        db.add(execution)
+        db.commit()
+        return execution.id
+    finally:
+        db.close()
+
+def job_status(job_id):
+    db = SessionLocal()
+    try:
+        return db.get(APIExecution, job_id).status
+    finally:
+        db.close()
+
+def test_jobs_left_by_dead_process_are_failed():
+    queue = JobQueue(workers=1, max_size=10, heartbeat_interval=30)
+    stale = datetime.utcnow() - timedelta(minutes=10)
+    crashed = insert_job("running", "crashed-host:1:dead", stale)
+    legacy = insert_job("queued", None, None, execution_time=stale)
+    alive = insert_job("queued", "other-host:2:live", datetime.utcnow())
+    own = insert_job("running", queue.owner, stale)
+    
+    assert JobQueue._beat_and_recover(queue.owner, 90) == 2
+    assert job_status(crashed) == "error"
+    assert job_status(legacy) == "error"
+    # 其它存活进程和本进程的任务不受影响，本进程任务的心跳被刷新
+    assert job_status(alive) == "queued"
+    assert job_status(own) == "running"
+    assert JobQueue._beat_and_recover("another-process", 90) == 0
@@ -0,0 +1,31 @@
+import asyncio
+
+from python_pool import PythonWorkerPool
+
+def test_worker_state_does_not_leak_between_runs():
+    leaking = (
+        "import os, datetime, json\n"
+        "os.environ['LEAK'] = 'from-A'\n"
+        "datetime.LEAK_MARK = 1\n"
+        "json.dumps = lambda *args, **kwargs: 'broken'\n"
+        "json.loads = lambda *args, **kwargs: 'broken'\n"
+        "print('A')"
+    )
+    reading = "import os, datetime\nprint(os.environ.get('LEAK'), getattr(datetime, 'LEAK_MARK', None))"
+    
+    async def run():
+        pool = PythonWorkerPool(size=1, max_runs=200, max_rss_mb=0)
+        await pool.start()
+        try:
+            first = await pool.execute(leaking, {}, timeout=10)
+            second = await pool.execute(reading, {}, timeout=10)
+            # 等待后台补充工作进程的任务完成
+            await asyncio.gather(*pool._replenishing)
+        finally:
+            await pool.close()
+        return first, second
+    
+    first, second = asyncio.run(run())
+    
+    assert first == (0, "A\n", "")
+    assert second == (0, "None None\n", "")
@@ -0,0 +1,25 @@
+import asyncio
+
+from executor import _run_process, _stream_process
+from resource_limits import ResourceLimits
+
+def test_limits_are_applied_without_preexec_fn():
+    limits = ResourceLimits(max_open_files=64, cpu_limit_seconds=30)
+    returncode, stdout, stderr = asyncio.run(
+        _run_process(["ulimit -n; ulimit -t; echo \"$0\" 'a b'"], timeout=10, shell=True, limits=limits)
+    )
+    assert (returncode, stderr) == (0, "")
+    assert stdout.split("\n")[:3] == ["64", "30", "/bin/sh a b"]
+
+def test_limits_apply_to_exec_and_stream():
+    limits = ResourceLimits(max_open_files=32)
+    script = "import resource; print(resource.getrlimit(resource.RLIMIT_NOFILE)[0])"
+    returncode, stdout, _ = asyncio.run(_run_process(["python3", "-c", script], timeout=10, limits=limits))
+    assert (returncode, stdout.strip()) == (0, "32")
+    
+    async def stream():
+        state = {}
+        lines = [line async for line in _stream_process(["ulimit -n"], 10, state, shell=True, limits=limits)]
+        return state["returncode"], lines
+    
+    assert asyncio.run(stream()) == (0, ["32\n"])
@@ -0,0 +1,48 @@
+import asyncio
+from types import SimpleNamespace
+
+from definition_cache import DefinitionCache
+from result_cache import ResultCache, result_cache
+
+def test_execution_racing_invalidate_is_not_cached():
+    cache = ResultCache(max_size=10, max_bytes=1024)
+    api_def = SimpleNamespace(api_key="key", result_cache_ttl=60)
+    
+    async def run():
+        started = asyncio.Event()
+        release = asyncio.Event()
+        
+        async def stale_execute():
+            started.set()
+            await release.wait()
+            return "old", True, ""
+        
+        async def fresh_execute():
+            return "new", True, ""
+        
+        stale = asyncio.create_task(cache.get_or_execute(api_def, {}, stale_execute))
+        await started.wait()
+        # 执行期间定义被修改
+        cache.invalidate("key")
+        # 失效后的请求不与旧执行合并
+        assert await cache.get_or_execute(api_def, {}, fresh_execute) == (("new", True, ""), False)
+        release.set()
+        assert await stale == (("old", True, ""), False)
+        # 旧执行结束后不会覆盖缓存中的新结果
+        return await cache.get_or_execute(api_def, {}, stale_execute)
+    
+    assert asyncio.run(run()) == (("new", True, ""), True)
+
+def test_definition_invalidation_clears_results():
+    api_def = SimpleNamespace(api_key="shared-key", result_cache_ttl=60)
+    
+    async def execute():
+        return "ok", True, ""
+    
+    async def run():
+        await result_cache.get_or_execute(api_def, {}, execute)
+        # 其它进程的失效通知只调用invalidate_local
+        DefinitionCache(max_size=10, ttl=300).invalidate_local("shared-key")
+        return await result_cache.get_or_execute(api_def, {}, execute)
+    
+    assert asyncio.run(run())[1] is False
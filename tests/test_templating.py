@@ -0,0 +1,123 @@
+import json
+import subprocess
+
+import pytest
+
+from templating import TemplateError, compile_action, compile_shell, compile_url, JSONTemplate
+
+# 含有各种shell特殊字符的参数值
+HOSTILE = "a b'; id -un; echo \"$(id -un)\" `id -un` $HOME \\ \\\" end"
+
+def run_shell(command: str) -> str:
+    return subprocess.run(["bash", "-c", command], capture_output=True, text=True, timeout=10).stdout
+
+@pytest.mark.parametrize("command", [
+    "printf '%s\\n' {x}",
+    "printf '%s\\n' \"{x}\"",
+    "printf '%s\\n' '{x}'",
+    "printf '%s\\n' pre{x}post",
+    "printf '%s\\n' \"$(printf '%s' {x})\"",
+    "printf '%s\\n' \"$(printf '%s' \"{x}\")\"",
+    "printf '%s\\n' \"$(printf '%s' '{x}')\"",
+    "printf '%s\\n' \"$(case a in a) printf '%s' {x};; esac)\"",
+    "(( 1 << 2 )); printf '%s\\n' {x}",
+])
+def test_shell_contexts_keep_value_literal(command):
+    rendered = compile_shell(command).render({"x": HOSTILE})
+    output = run_shell(rendered)
+    assert output.splitlines()[-1].replace("pre", "").replace("post", "") == HOSTILE
+
+def test_command_substitution_inside_double_quotes_is_not_injectable():
+    rendered = compile_shell('echo "$(echo {x})"').render({"x": "hi; id -un"})
+    assert run_shell(rendered) == "hi; id -un\n"
+
+def test_nested_double_quotes_inside_command_substitution():
+    rendered = compile_shell('echo "$(basename "{x}")"').render({"x": "a b"})
+    assert run_shell(rendered) == "a b\n"
+
+def test_unquoted_heredoc_body_is_escaped():
+    rendered = compile_shell("cat <<EOF\n{x}\nEOF").render({"x": HOSTILE})
+    assert run_shell(rendered) == HOSTILE + "\n"
+
+def test_quoted_heredoc_body_is_literal():
+    for delimiter in ("'EOF'", '"EOF"', "\\EOF"):
+        rendered = compile_shell(f"cat <<{delimiter}\n{{x}}\nEOF").render({"x": HOSTILE})
+        assert run_shell(rendered) == HOSTILE + "\n"
+
+def test_heredoc_with_tab_stripping_and_following_commands():
+    rendered = compile_shell("cat <<-EOF\n\t{x}\n\tEOF\necho {y}").render({"x": "v", "y": "; id -un"})
+    assert run_shell(rendered) == "v\n; id -un\n"
+
+def test_value_cannot_terminate_heredoc():
+    template = compile_shell("cat <<'EOF'\n{x}\nEOF")
+    with pytest.raises(TemplateError):
+        template.render({"x": "a\nEOF\nid -un"})
+
+@pytest.mark.parametrize("command", [
+    "echo `echo {x}`",
+    "echo \"`echo {x}`\"",
+    "echo ${v:-{x}}",
+    "echo \"${v:-{x}}\"",
+    "echo $(( {x} + 1 ))",
+    "echo $'{x}'",
+    "echo \\{x}",
+    "echo \"\\{x}\"",
+    "cat <<{x}\nbody\n{x}",
+])
+def test_unclassifiable_contexts_are_rejected(command):
+    with pytest.raises(TemplateError):
+        compile_shell(command)
+
+def test_comment_placeholder_and_shell_variables():
+    template = compile_shell("echo ${HOME:+set} {x} # {x}")
+    assert template.render({"x": "a b"}) == "echo ${HOME:+set} 'a b' # 'a b'"
+
+def test_url_escaping_by_position():
+    template = compile_url("https://{host}/items/{path}?q={query}")
+    assert template.render({"host": "example.com", "path": "a b/c", "query": "x&y=z"}) == \
+        "https://example.com/items/a%20b/c?q=x%26y%3Dz"
+
+def test_json_template_escapes_strings_structurally():
+    template = JSONTemplate({"text": "hi {name}", "{name}": ["{name}"]})
+    value = 'quote " and \\ backslash'
+    rendered = template.render({"name": value})
+    assert json.loads(json.dumps(rendered)) == {"text": f"hi {value}", value: [value]}
+
+def test_compile_action_shell_rejects_unsafe_placeholder():
+    with pytest.raises(TemplateError):
+        compile_action("shell", "echo `echo {x}`", {"x": "value"})
+
+def test_validate_reports_missing_and_mistyped_parameters():
+    template = compile_action("shell", "echo {name} {count} {verbose}", {
+        "name": "名称",
+        "count": {"type": "integer"},
+        "verbose": {"type": "boolean", "default": False}
+    })
+    with pytest.raises(TemplateError) as error:
+        template.validate({"count": "abc", "extra": "1"})
+    message = str(error.value)
+    assert "extra" in message
+    assert "缺少必填参数: name" in message
+    assert "count(应为整数)" in message
+
+def test_validate_normalizes_values_and_fills_defaults():
+    template = compile_action("shell", "echo {name} {count} {verbose} {note}", {
+        "name": "名称",
+        "count": {"type": "integer"},
+        "verbose": {"type": "boolean", "default": False},
+        "note": {"required": False}
+    })
+    assert template.validate({"name": "a", "count": 3}) == {
+        "name": "a", "count": "3", "verbose": "false", "note": ""
+    }
+    assert template.validate({"name": "a", "count": " 7 ", "verbose": "YES"})["verbose"] == "true"
+
+def test_invalid_parameter_declarations_are_rejected():
+    with pytest.raises(TemplateError):
+        compile_action("shell", "echo {x}", {"x": {"type": "date"}})
+    with pytest.raises(TemplateError):
+        compile_action("shell", "echo {x}", {"x": {"type": "integer", "default": "abc"}})
+
+def test_undeclared_definitions_accept_any_parameters():
+    template = compile_action("shell", "echo {x}")
+    assert template.validate({"x": 1, "y": "z"}) == {"x": "1", "y": "z"}